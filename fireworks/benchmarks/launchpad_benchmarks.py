@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+"""
+Benchmarks for the LaunchPad on the different storage backends. The in-memory backend has no database latency, \
+so comparing it with MongoDB shows how much of the time goes to the database. Run this module directly to print \
+timings, e.g.:
+
+python -m fireworks.benchmarks.launchpad_benchmarks
+"""
+
+import multiprocessing
+import time
+from fireworks.core.firework import FireWork, FWAction
+from fireworks.core.fworker import FWorker
+from fireworks.core.launchpad import LaunchPad
+from fireworks.storage.storage_backend import WRITE_CONCERN_TIERS
+from fw_tutorials.firetask.addition_task import AdditionTask
+
+__author__ = 'Anubhav Jain'
+__copyright__ = 'Copyright 2013, The Materials Project'
+__version__ = '0.1'
+__maintainer__ = 'Anubhav Jain'
+__email__ = 'ajain@lbl.gov'
+__date__ = 'Oct 18, 2026'
+
+BENCHMARK_DB_NAME = 'fireworks_benchmark'
+
+
+def get_benchmark_launchpad(backend, write_concerns=None):
+    """
+    :param backend: name of the storage backend
+    :param write_concerns: the write concerns of the LaunchPad
+    :return: an empty LaunchPad, or None if the backend is not available (e.g. MongoDB is not running)
+    """
+    try:
+        lp = LaunchPad(name=BENCHMARK_DB_NAME, strm_lvl='ERROR', backend=backend, write_concerns=write_concerns)
+        lp.reset(password=None, require_password=False)
+        return lp
+    except Exception:
+        return None
+
+
+def run_fws(lp):
+    """
+    Check out and complete FireWorks until none are left to run (the DB traffic of running Rockets, without \
+    running the FireTasks).
+
+    :param lp: a LaunchPad, or the name of the storage backend of the benchmark LaunchPad
+    :return: the number of FireWorks that were run
+    """
+    if isinstance(lp, basestring):
+        lp = LaunchPad(name=BENCHMARK_DB_NAME, strm_lvl='ERROR', backend=lp)
+    fworker = FWorker()
+    n = 0
+    while True:
+        m_fw, launch_id = lp._checkout_fw(fworker, '.')
+        if not m_fw:
+            return n
+        lp._complete_launch(launch_id, FWAction('CONTINUE', {'sum': sum(m_fw.spec['input_array'])}))
+        n += 1
+
+
+def time_launches(lp, n, n_procs=1):
+    """
+    Add n independent FireWorks, then run them with run_fws().
+
+    :param lp: an empty benchmark LaunchPad
+    :param n: number of FireWorks
+    :param n_procs: number of processes running FireWorks at the same time
+    :return: (add_secs, run_secs) the time to add the FireWorks, and the time to run them
+    """
+    t_start = time.time()
+    lp.add_wfs([FireWork(AdditionTask(), {'input_array': [i, i]}) for i in range(n)])
+    add_secs = time.time() - t_start
+
+    t_start = time.time()
+    if n_procs == 1:
+        run_fws(lp)
+    else:
+        pool = multiprocessing.Pool(n_procs)
+        pool.map(run_fws, [lp.backend_name] * n_procs)
+        pool.close()
+    return add_secs, time.time() - t_start
+
+
+def time_write_classes(lp, n):
+    """
+    Time the LaunchPad operations whose writes belong to each write class.
+
+    :param lp: an empty benchmark LaunchPad
+    :param n: number of operations of each class
+    :return: a dict of write class to the average latency (secs) of its operation
+    """
+    lp.add_wfs([FireWork(AdditionTask(), {'input_array': [i, i]}) for i in range(n)])
+    launch_ids = [lp._checkout_fw(FWorker(), '.')[1] for _ in range(n)]
+    latencies = {}
+    for (write_class, operation) in [('heartbeat', lambda l_id: lp._ping_launch(l_id)),
+                                     ('history', lambda l_id: lp._set_reservation_id(l_id, 'job_{}'.format(l_id))),
+                                     ('state', lambda l_id: lp._complete_launch(l_id, FWAction('CONTINUE')))]:
+        t_start = time.time()
+        for launch_id in launch_ids:
+            operation(launch_id)
+        latencies[write_class] = (time.time() - t_start) / n
+    return latencies
+
+
+def run_launchpad_benchmarks(backends=('memory', 'sqlite', 'mongo'), n=500):
+    for backend in backends:
+        lp = get_benchmark_launchpad(backend)
+        if not lp:
+            print 'The {} backend is not available, skipping its LaunchPad benchmarks'.format(backend)
+            continue
+        add_secs, run_secs = time_launches(lp, n)
+        print '{:<8} add {} FireWorks: {:8.3f} s, run: {:8.3f} s ({:8.1f} FW/s)'.format(backend, n, add_secs,
+                                                                                        run_secs, n / run_secs)
+        lp.backend.drop()
+
+
+def run_parallel_benchmarks(backends=('sqlite', 'mongo'), n=500, n_procs=4):
+    for backend in backends:
+        lp = get_benchmark_launchpad(backend)
+        if not lp:
+            print 'The {} backend is not available, skipping its parallel LaunchPad benchmarks'.format(backend)
+            continue
+        add_secs, run_secs = time_launches(lp, n, n_procs)
+        print '{:<8} run {} FireWorks with {} processes: {:8.3f} s ({:8.1f} FW/s)'.format(backend, n, n_procs,
+                                                                                          run_secs, n / run_secs)
+        lp.backend.drop()
+
+
+def run_write_concern_benchmarks(backends=('sqlite', 'mongo'), n=200):
+    for backend in backends:
+        for tier in sorted(WRITE_CONCERN_TIERS):
+            lp = get_benchmark_launchpad(backend, dict([(c, tier) for c in ['state', 'heartbeat', 'history']]))
+            if not lp:
+                print 'The {} backend is not available, skipping its write concern benchmarks'.format(backend)
+                break
+            latencies = time_write_classes(lp, n)
+            print '{:<8} {:<15} ms/op: {}'.format(backend, tier, ', '.join(
+                ['{} {:6.2f}'.format(c, 1000 * latencies[c]) for c in sorted(latencies)]))
+            lp.backend.drop()
+
+
+if __name__ == '__main__':
+    run_launchpad_benchmarks()
+    run_parallel_benchmarks()
+    run_write_concern_benchmarks()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+
+"""
+Benchmarks for in-memory Workflow operations. Run this module directly to print timings, e.g.:
+
+python -m fireworks.benchmarks.workflow_benchmarks
+"""
+
+import sys
+import time
+from fireworks.core.compact_workflow import CompactWorkflow, np
+from fireworks.core.firework import FireWork, Launch, FWAction
+from fireworks.core.workflow import Workflow
+from fw_tutorials.firetask.addition_task import AdditionTask
+
+__author__ = 'Anubhav Jain'
+__copyright__ = 'Copyright 2013, The Materials Project'
+__version__ = '0.1'
+__maintainer__ = 'Anubhav Jain'
+__email__ = 'ajain@lbl.gov'
+__date__ = 'Oct 18, 2026'
+
+
+def _completed_fws(n):
+    """
+    FireWorks that all have a COMPLETED Launch but are still WAITING, i.e. a refresh from the root will cascade \
+    through the entire Workflow.
+    """
+    fws = []
+    for fw_id in range(1, n + 1):
+        launch = Launch('COMPLETED', '.', host='localhost', ip='127.0.0.1', action=FWAction('CONTINUE'),
+                        launch_id=fw_id, fw_id=fw_id)
+        fws.append(FireWork(AdditionTask(), {'input_array': [fw_id]}, [launch], fw_id=fw_id))
+    return fws
+
+
+def chain_wf(n):
+    """
+    :param n: number of FireWorks
+    :return: a Workflow where every FireWork has exactly one child
+    """
+    links = dict([(fw_id, [fw_id + 1]) for fw_id in range(1, n)])
+    return Workflow(_completed_fws(n), links)
+
+
+def fan_out_wf(n):
+    """
+    :param n: number of FireWorks
+    :return: a Workflow where a single root is the parent of all other FireWorks
+    """
+    return Workflow(_completed_fws(n), {1: range(2, n + 1)})
+
+
+def diamond_wf(n_layers, width):
+    """
+    :param n_layers: number of layers
+    :param width: number of FireWorks per layer
+    :return: a Workflow with a single root and a single leaf, where every FireWork of a layer is linked to every \
+    FireWork of the next layer
+    """
+    layers = [[1]] + [range(2 + i * width, 2 + (i + 1) * width) for i in range(n_layers)]
+    layers.append([layers[-1][-1] + 1])
+    links = {}
+    for parents, children in zip(layers[:-1], layers[1:]):
+        for parent in parents:
+            links[parent] = list(children)
+    return Workflow(_completed_fws(layers[-1][0]), links)
+
+
+def time_refresh(wf):
+    """
+    :param wf: a Workflow
+    :return: (secs, n_updated) the time to refresh the Workflow from its root, and the number of FireWorks updated
+    """
+    t_start = time.time()
+    updated_ids = wf.refresh(wf.root_fw_ids[0])
+    return time.time() - t_start, len(updated_ids)
+
+
+def time_chain_completion(n):
+    """
+    Complete the FireWorks of a chain one at a time, refreshing after each completion as the LaunchPad does. \
+    Each refresh should only touch the completed FireWork and its child, so the time per completion should not \
+    grow with the length of the chain.
+
+    :param n: number of FireWorks
+    :return: (secs, compact_secs) the time to complete the whole chain, as a Workflow and as a CompactWorkflow
+    """
+    fws = [FireWork(AdditionTask(), {'input_array': [fw_id]}, fw_id=fw_id) for fw_id in range(1, n + 1)]
+    wf = Workflow(fws, dict([(fw_id, [fw_id + 1]) for fw_id in range(1, n)]))
+    compact_wf = CompactWorkflow.from_workflow(wf)
+    wf.refresh(1)
+    compact_wf.refresh(1)
+
+    t_start = time.time()
+    for fw_id in range(1, n + 1):
+        wf.id_fw[fw_id].launches.append(Launch('COMPLETED', '.', host='localhost', ip='127.0.0.1',
+                                               action=FWAction('CONTINUE'), launch_id=fw_id, fw_id=fw_id))
+        wf.refresh(fw_id)
+    secs = time.time() - t_start
+
+    t_start = time.time()
+    for fw_id in range(1, n + 1):
+        compact_wf.set_launch_state(fw_id, 'COMPLETED')
+        compact_wf.refresh(fw_id)
+    return secs, time.time() - t_start
+
+
+def deep_getsizeof(obj, seen=None):
+    """
+    :param obj: any object
+    :return: (int) approximate number of bytes used by the object and everything it refers to
+    """
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum([deep_getsizeof(k, seen) + deep_getsizeof(v, seen) for (k, v) in obj.iteritems()])
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum([deep_getsizeof(v, seen) for v in obj])
+    if hasattr(obj, '__dict__'):
+        size += deep_getsizeof(obj.__dict__, seen)
+    return size
+
+
+BENCHMARK_WFS = [('chain (10000)', lambda: chain_wf(10000)),
+                 ('fan-out (10000)', lambda: fan_out_wf(10000)),
+                 ('diamond (20 x 20)', lambda: diamond_wf(20, 20)),
+                 ('diamond (5 x 200)', lambda: diamond_wf(5, 200))]
+
+
+def run_refresh_benchmarks():
+    for name, wf_builder in BENCHMARK_WFS:
+        secs, n_updated = time_refresh(wf_builder())
+        print '{:<20} refresh: {:8.3f} s, {} FireWorks updated'.format(name, secs, n_updated)
+        secs, n_updated = time_refresh(CompactWorkflow.from_workflow(wf_builder()))
+        print '{:<20} compact refresh: {:8.3f} s, {} FireWorks updated'.format(name, secs, n_updated)
+    for n in [1000, 10000]:
+        secs, compact_secs = time_chain_completion(n)
+        print '{:<20} complete one at a time: {:8.3f} s ({:.1f} us each), compact: {:8.3f} s ({:.1f} us each)'.format(
+            'chain ({})'.format(n), secs, secs / n * 1e6, compact_secs, compact_secs / n * 1e6)
+
+
+def run_vectorized_benchmarks():
+    if np is None:
+        print 'NumPy is not installed, skipping vectorized refresh benchmarks'
+        return
+    for name, wf_builder in [('fan-out (100000)', lambda: fan_out_wf(100000)),
+                             ('diamond (20 x 100)', lambda: diamond_wf(20, 100))]:
+        compact_wf = CompactWorkflow.from_workflow(wf_builder())
+        vectorized_wf = CompactWorkflow(compact_wf.to_links(), dict([(fw_id, 'WAITING') for fw_id in
+                                                                    compact_wf.fw_ids]),
+                                        dict([(fw_id, 'COMPLETED') for fw_id in compact_wf.fw_ids]))
+        secs, n_updated = time_refresh(compact_wf)
+        t_start = time.time()
+        vectorized_wf.vectorized_refresh(vectorized_wf.root_fw_ids)
+        print '{:<20} compact refresh: {:8.3f} s, vectorized refresh: {:8.3f} s ({} FireWorks updated)'.format(
+            name, secs, time.time() - t_start, n_updated)
+
+
+def run_memory_benchmarks():
+    for name, wf_builder in BENCHMARK_WFS:
+        wf = wf_builder()
+        n = len(wf.id_fw)
+        compact_wf = CompactWorkflow.from_workflow(wf)
+        print '{:<20} bytes/FireWork: Workflow {:8.0f}, Workflow.Links {:6.0f}, CompactWorkflow {:4.0f}'.format(
+            name, deep_getsizeof(wf) / float(n), deep_getsizeof(wf.links) / float(n),
+            deep_getsizeof(compact_wf) / float(n))
+
+
+if __name__ == '__main__':
+    run_refresh_benchmarks()
+    run_vectorized_benchmarks()
+    run_memory_benchmarks()
@@ -0,0 +1,432 @@
+#!/usr/bin/env python
+
+"""
+This module contains a compact, array-backed representation of a Workflow (CompactWorkflow), intended for very large \
+Workflows such as parameter sweeps with 100k+ FireWorks.
+
+Only the structure and the states of the Workflow are kept: the links are stored as CSR-style integer arrays \
+(for both children and parents), and the states are stored as an array of codes given by FireWork.STATE_RANKS. \
+This allows refreshing states, finding roots and counting states without instantiating any FireWork objects.
+
+If NumPy is installed, vectorized_refresh() can recompute the states of whole topological levels at once, which is \
+much faster for wide Workflows (e.g. after bulk repairs).
+"""
+
+from array import array
+from bisect import bisect_left
+from collections import deque
+from heapq import heappush, heappop
+from fireworks.core.firework import FireWork
+from fireworks.core.workflow import Workflow
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__author__ = 'Anubhav Jain'
+__copyright__ = 'Copyright 2013, The Materials Project'
+__version__ = '0.1'
+__maintainer__ = 'Anubhav Jain'
+__email__ = 'ajain@lbl.gov'
+__date__ = 'Oct 18, 2026'
+
+STATE_CODES = FireWork.STATE_RANKS
+CODE_STATES = dict([(v, k) for (k, v) in STATE_CODES.iteritems()])
+
+
+class CompactWorkflow(object):
+    """
+    A CompactWorkflow holds the links and states of a Workflow in flat arrays, where FireWork i (the i-th smallest \
+    fw_id) has children child_idx[child_ptr[i]:child_ptr[i+1]] and parents parent_idx[parent_ptr[i]:parent_ptr[i+1]].
+
+    For each FireWork, the state implied by its Launches (used once all parents are COMPLETED) and a code for the \
+    FWAction of its COMPLETED Launch are stored as well. DEFUSE actions are applied directly on the arrays; actions \
+    that modify specs or create new FireWorks cannot be, and the ids of such FireWorks are collected in \
+    unapplied_action_ids so the caller can apply them through the full Workflow.
+    """
+
+    ACTION_NONE = 0
+    ACTION_DEFUSE = 1
+    ACTION_OTHER = 2
+
+    def __init__(self, links, states, launch_states=None, action_codes=None, metadata=None):
+        """
+        :param links: a dict of parent id to a list of child ids (e.g. a Workflow.Links). Every FireWork must be a key.
+        :param states: a dict of fw_id to the state of the FireWork
+        :param launch_states: a dict of fw_id to the state given by the FireWork's Launches (default READY)
+        :param action_codes: a dict of fw_id to the action code of the FireWork's COMPLETED Launch (default \
+        ACTION_NONE)
+        :param metadata: metadata of the Workflow
+        """
+        launch_states = launch_states if launch_states else {}
+        action_codes = action_codes if action_codes else {}
+        self.metadata = metadata if metadata else {}
+
+        fw_ids = sorted(links)
+        index = dict([(fw_id, i) for (i, fw_id) in enumerate(fw_ids)])  # only needed during construction
+        self.fw_ids = array('l', fw_ids)
+
+        self.child_ptr = array('l', [0])
+        self.child_idx = array('l')
+        n_parents = [0] * len(fw_ids)
+        for fw_id in fw_ids:
+            for child in links[fw_id]:
+                self.child_idx.append(index[child])
+                n_parents[index[child]] += 1
+            self.child_ptr.append(len(self.child_idx))
+
+        self.parent_ptr = array('l', [0])
+        for n in n_parents:
+            self.parent_ptr.append(self.parent_ptr[-1] + n)
+        self.parent_idx = array('l', [0]) * len(self.child_idx)
+        next_slot = list(self.parent_ptr[:-1])
+        for i in range(len(fw_ids)):
+            for child_i in self.child_idx[self.child_ptr[i]:self.child_ptr[i + 1]]:
+                self.parent_idx[next_slot[child_i]] = i
+                next_slot[child_i] += 1
+
+        self.states = array('b', [STATE_CODES[states[fw_id]] for fw_id in fw_ids])
+        self.launch_states = array('b', [STATE_CODES[launch_states.get(fw_id, 'READY')] for fw_id in fw_ids])
+        self.action_codes = array('b', [action_codes.get(fw_id, self.ACTION_NONE) for fw_id in fw_ids])
+
+        self.unapplied_action_ids = []
+        self._levels = None  # topological level of each FireWork, computed when needed
+
+    def __len__(self):
+        return len(self.fw_ids)
+
+    @property
+    def nbytes(self):
+        """
+        :return: (int) number of bytes used by the arrays of this CompactWorkflow
+        """
+        return sum([a.itemsize * len(a) for a in [self.fw_ids, self.child_ptr, self.child_idx, self.parent_ptr,
+                                                  self.parent_idx, self.states, self.launch_states,
+                                                  self.action_codes]])
+
+    @property
+    def root_fw_ids(self):
+        return [self.fw_ids[i] for i in range(len(self)) if self.parent_ptr[i] == self.parent_ptr[i + 1]]
+
+    def get_state(self, fw_id):
+        return CODE_STATES[self.states[self._index(fw_id)]]
+
+    def get_children(self, fw_id):
+        i = self._index(fw_id)
+        return [self.fw_ids[c] for c in self.child_idx[self.child_ptr[i]:self.child_ptr[i + 1]]]
+
+    def get_parents(self, fw_id):
+        i = self._index(fw_id)
+        return [self.fw_ids[p] for p in self.parent_idx[self.parent_ptr[i]:self.parent_ptr[i + 1]]]
+
+    def get_fw_ids_by_state(self, state):
+        code = STATE_CODES[state]
+        return [self.fw_ids[i] for i in range(len(self)) if self.states[i] == code]
+
+    def state_counts(self):
+        """
+        :return: a dict of state to the number of FireWorks in that state
+        """
+        counts = {}
+        for code in self.states:
+            counts[CODE_STATES[code]] = counts.get(CODE_STATES[code], 0) + 1
+        return counts
+
+    def set_launch_state(self, fw_id, state, action_code=ACTION_NONE):
+        """
+        Record the state given by the Launches of a FireWork (e.g. after a Launch completes). Call refresh() \
+        afterwards to update the Workflow states.
+
+        :param fw_id: the id of the FireWork
+        :param state: the new state given by its Launches
+        :param action_code: the action code of the COMPLETED Launch
+        """
+        i = self._index(fw_id)
+        self.launch_states[i] = STATE_CODES[state]
+        self.action_codes[i] = action_code
+
+    def refresh(self, fw_id):
+        """
+        Refresh the state of a FireWork and, if its state changed, of its descendants. Only the children of \
+        FireWorks whose state changed are refreshed, in order of their topological level, so the cost depends on \
+        the number of FireWorks that change rather than on the size of the Workflow. This gives the same states as \
+        Workflow.refresh().
+
+        :param fw_id: the id of the FireWork to start refreshing from
+        :return: (set) ids of all the FireWorks that were updated
+        """
+        levels = self._get_levels()
+        updated = set()
+        start = self._index(fw_id)
+        queue = [(levels[start], start)]
+        queued = set([start])
+        while queue:
+            parent = heappop(queue)[1]
+            if self._refresh_index(parent, updated):
+                for child in self.child_idx[self.child_ptr[parent]:self.child_ptr[parent + 1]]:
+                    if child not in queued:
+                        queued.add(child)
+                        heappush(queue, (levels[child], child))
+
+        return set([self.fw_ids[i] for i in updated])
+
+    def vectorized_refresh(self, fw_ids=None):
+        """
+        Refresh the states of FireWorks and of their descendants using NumPy, computing the pending FireWorks of a \
+        topological level in a single batch. As in refresh(), only the children of FireWorks whose state changed \
+        become pending. The resulting states are identical to calling refresh() on each of the given FireWorks. \
+        Requires NumPy.
+
+        :param fw_ids: ids of the FireWorks to start refreshing from (default: all FireWorks)
+        :return: (set) ids of all the FireWorks that were updated
+        """
+        if np is None:
+            raise ImportError('vectorized_refresh() requires NumPy!')
+
+        n = len(self)
+        if n == 0:
+            return set()
+        child_ptr = np.frombuffer(self.child_ptr, dtype=self.child_ptr.typecode)
+        child_idx = np.frombuffer(self.child_idx, dtype=self.child_idx.typecode)
+        parent_ptr = np.frombuffer(self.parent_ptr, dtype=self.parent_ptr.typecode)
+        parent_idx = np.frombuffer(self.parent_idx, dtype=self.parent_idx.typecode)
+        launch_states = np.frombuffer(self.launch_states, dtype=np.int8)
+        action_codes = np.frombuffer(self.action_codes, dtype=np.int8)
+        states = np.frombuffer(self.states, dtype=np.int8).copy()
+
+        levels = self._get_levels(use_numpy=True)
+        pending = {}  # level to a list of arrays of FireWorks to refresh
+        pending_levels = []  # heap of the keys of pending
+
+        def add_pending(nodes):
+            node_levels = levels[nodes]
+            order = np.argsort(node_levels, kind='mergesort')
+            unique_levels, starts = np.unique(node_levels[order], return_index=True)
+            for level, level_nodes in zip(unique_levels.tolist(), np.split(nodes[order], starts[1:])):
+                if level not in pending:
+                    pending[level] = []
+                    heappush(pending_levels, level)
+                pending[level].append(level_nodes)
+
+        if fw_ids is None:
+            add_pending(np.arange(n))
+        elif fw_ids:
+            add_pending(np.array([self._index(fw_id) for fw_id in fw_ids]))
+        updated = np.zeros(n, dtype=bool)
+
+        while pending_levels:
+            nodes = np.unique(np.concatenate(pending.pop(heappop(pending_levels))))
+            nodes = nodes[states[nodes] != STATE_CODES['DEFUSED']]
+            if len(nodes) == 0:
+                continue
+
+            # WAITING if any parent is not COMPLETED, otherwise the state given by the Launches
+            owner, parents = _gather(parent_ptr, parent_idx, nodes)
+            blocked = np.bincount(owner[states[parents] != STATE_CODES['COMPLETED']], minlength=len(nodes)) > 0
+            new_states = np.where(blocked, STATE_CODES['WAITING'], launch_states[nodes]).astype(np.int8)
+
+            is_changed = new_states != states[nodes]
+            states[nodes] = new_states
+            changed = nodes[is_changed]
+            if len(changed) == 0:
+                continue
+            updated[changed] = True
+
+            completed = changed[new_states[is_changed] == STATE_CODES['COMPLETED']]
+            defusers = completed[action_codes[completed] == self.ACTION_DEFUSE]
+            if len(defusers):
+                defused = _gather(child_ptr, child_idx, defusers)[1]
+                states[defused] = STATE_CODES['DEFUSED']
+                updated[defused] = True
+            for i in completed[action_codes[completed] == self.ACTION_OTHER]:
+                self.unapplied_action_ids.append(self.fw_ids[i])
+
+            children = _gather(child_ptr, child_idx, changed)[1]
+            if len(children):
+                add_pending(children)
+
+        self.states = array('b', states.tostring())
+        return set([self.fw_ids[i] for i in np.nonzero(updated)[0]])
+
+    def to_links(self):
+        """
+        :return: a Workflow.Links object with the links of this CompactWorkflow
+        """
+        return Workflow.Links(dict([(self.fw_ids[i], [self.fw_ids[c] for c in
+                                                      self.child_idx[self.child_ptr[i]:self.child_ptr[i + 1]]])
+                                    for i in range(len(self))]))
+
+    def update_workflow(self, wf):
+        """
+        Copy the states of this CompactWorkflow onto the FireWorks of a Workflow with the same structure.
+
+        :param wf: a Workflow object
+        """
+        for i in range(len(self)):
+            wf.id_fw[self.fw_ids[i]].state = CODE_STATES[self.states[i]]
+
+    @classmethod
+    def from_workflow(cls, wf):
+        """
+        :param wf: a Workflow object
+        :return: a CompactWorkflow with the links and states of the Workflow
+        """
+        states = {}
+        launch_states = {}
+        action_codes = {}
+        for (fw_id, fw) in wf.id_fw.iteritems():
+            states[fw_id] = fw.state
+            launch_states[fw_id], action = cls._get_launch_state([(l.state, l.action) for l in fw.launches])
+            if action:
+                action_codes[fw_id] = cls.get_action_code(action.command, action.mod_spec)
+        return CompactWorkflow(wf.links, states, launch_states, action_codes, wf.metadata)
+
+    @classmethod
+    def from_db_dicts(cls, links_dict, fw_dicts, launch_dicts):
+        """
+        Create a CompactWorkflow from (projections of) the database documents, without creating FireWork objects.
+
+        :param links_dict: the links document of the Workflow (needs 'links' and optionally 'metadata')
+        :param fw_dicts: FireWork documents of the Workflow (needs 'fw_id', 'state' and 'launches')
+        :param launch_dicts: Launch documents of the Workflow (needs 'launch_id', 'state' and 'action')
+        :return: a CompactWorkflow
+        """
+        launch_data = dict([(l['launch_id'], (l['state'], l.get('action'))) for l in launch_dicts])
+        states = {}
+        launch_states = {}
+        action_codes = {}
+        for fw_dict in fw_dicts:
+            fw_id = fw_dict['fw_id']
+            states[fw_id] = fw_dict['state']
+            launch_states[fw_id], action = cls._get_launch_state([launch_data[l_id] for l_id in fw_dict['launches']])
+            if action:
+                action_codes[fw_id] = cls.get_action_code(action['action'], action.get('mod_spec'))
+        links = Workflow.Links.from_dict(links_dict['links'])
+        return CompactWorkflow(links, states, launch_states, action_codes, links_dict.get('metadata'))
+
+    @classmethod
+    def get_action_code(cls, command, mod_spec=None):
+        """
+        :param command: the command of a FWAction
+        :param mod_spec: the mod_spec of a FWAction
+        :return: the code describing how the FWAction affects the Workflow
+        """
+        if command == 'CREATE' or (mod_spec and mod_spec.get('dict_mods')):
+            return cls.ACTION_OTHER
+        if command == 'DEFUSE':
+            return cls.ACTION_DEFUSE
+        return cls.ACTION_NONE
+
+    @staticmethod
+    def _get_launch_state(launches):
+        """
+        (internal method) Get the state implied by a list of Launches (same rules as Workflow.refresh())
+
+        :param launches: a list of (state, action) tuples
+        :return: (state, action) tuple, where action is the action of the COMPLETED Launch (if any)
+        """
+        max_score = 0
+        m_state = 'READY'
+        m_action = None
+        for (state, action) in launches:
+            if STATE_CODES[state] > max_score:
+                max_score = STATE_CODES[state]
+                m_state = state
+                if m_state == 'COMPLETED':
+                    m_action = action
+        return m_state, m_action
+
+    def _index(self, fw_id):
+        i = bisect_left(self.fw_ids, fw_id)
+        if i == len(self.fw_ids) or self.fw_ids[i] != fw_id:
+            raise ValueError('No FireWork exists with id: {}'.format(fw_id))
+        return i
+
+    def _refresh_index(self, i, updated):
+        """
+        (internal method) Recompute the state of a single FireWork, applying a DEFUSE action if it just COMPLETED.
+
+        :param i: the index of the FireWork
+        :param updated: (set) indices of updated FireWorks, modified in place
+        :return: (bool) whether the state of the FireWork changed
+        """
+        prev_state = self.states[i]
+        if prev_state == STATE_CODES['DEFUSED']:
+            return False
+
+        m_state = self.launch_states[i]
+        for p in self.parent_idx[self.parent_ptr[i]:self.parent_ptr[i + 1]]:
+            if self.states[p] != STATE_CODES['COMPLETED']:
+                m_state = STATE_CODES['WAITING']
+                break
+
+        self.states[i] = m_state
+        if m_state == prev_state:
+            return False
+
+        if m_state == STATE_CODES['COMPLETED']:
+            if self.action_codes[i] == self.ACTION_DEFUSE:
+                for child in self.child_idx[self.child_ptr[i]:self.child_ptr[i + 1]]:
+                    self.states[child] = STATE_CODES['DEFUSED']
+                    updated.add(child)
+            elif self.action_codes[i] == self.ACTION_OTHER:
+                self.unapplied_action_ids.append(self.fw_ids[i])
+
+        updated.add(i)
+        return True
+
+    def _get_levels(self, use_numpy=False):
+        """
+        (internal method) Get the topological level (length of the longest path from a root) of every FireWork. \
+        The levels are computed once, one level at a time with NumPy (fastest for wide Workflows) or one FireWork \
+        at a time in pure Python (fastest for deep Workflows).
+
+        :param use_numpy: whether to compute the levels with NumPy, and return them as a numpy array
+        :return: (array or numpy array) the level of each FireWork
+        """
+        if self._levels is None and not use_numpy:
+            n_pending = [self.parent_ptr[i + 1] - self.parent_ptr[i] for i in range(len(self))]
+            levels = array('l', [0] * len(self))
+            queue = deque([i for i in range(len(self)) if not n_pending[i]])
+            while queue:
+                i = queue.popleft()
+                for child in self.child_idx[self.child_ptr[i]:self.child_ptr[i + 1]]:
+                    levels[child] = max(levels[child], levels[i] + 1)
+                    n_pending[child] -= 1
+                    if not n_pending[child]:
+                        queue.append(child)
+            self._levels = levels
+        elif self._levels is None:
+            child_ptr = np.frombuffer(self.child_ptr, dtype=self.child_ptr.typecode)
+            child_idx = np.frombuffer(self.child_idx, dtype=self.child_idx.typecode)
+            n_pending = np.diff(np.frombuffer(self.parent_ptr, dtype=self.parent_ptr.typecode))
+            levels = np.zeros(len(self), dtype=np.int64)
+            frontier = np.nonzero(n_pending == 0)[0]
+            level = 0
+            while len(frontier):
+                levels[frontier] = level
+                level += 1
+                children = _gather(child_ptr, child_idx, frontier)[1]
+                np.subtract.at(n_pending, children, 1)
+                frontier = np.unique(children[n_pending[children] == 0])
+            self._levels = levels
+        if use_numpy and isinstance(self._levels, array):
+            return np.frombuffer(self._levels, dtype=self._levels.typecode)
+        return self._levels
+
+
+def _gather(ptr, idx, nodes):
+    """
+    (internal method) Gather the CSR rows of many nodes at once.
+
+    :param ptr: (numpy array) row pointers
+    :param idx: (numpy array) column indices
+    :param nodes: (numpy array) the rows to gather
+    :return: (owner, values) arrays, where values[k] belongs to row nodes[owner[k]]
+    """
+    starts = ptr[nodes]
+    lengths = ptr[nodes + 1] - starts
+    owner = np.repeat(np.arange(len(nodes)), lengths)
+    offsets = np.arange(len(owner)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return owner, idx[starts[owner] + offsets]
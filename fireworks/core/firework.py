@@ -11,6 +11,7 @@ This module contains some of the most central FireWorks classes:
 
 import datetime
 from fireworks.core.fworker import FWorker
+from fireworks.storage.lazy_blobs import is_blob_ref
 from fireworks.utilities.fw_serializers import FWSerializable, recursive_serialize, recursive_deserialize, serialize_fw
 from fireworks.utilities.fw_utilities import get_my_host, get_my_ip
 
@@ -85,10 +86,24 @@ class FWAction():
     @classmethod
     @recursive_deserialize
     def from_dict(cls, m_dict):
-        if 'create_fw' in m_dict['mod_spec']:
+        # (a large FireWork may have been replaced by a reference to a blob, see LaunchPad._load_blobs_lazily())
+        if 'create_fw' in m_dict['mod_spec'] and not is_blob_ref(m_dict['mod_spec']['create_fw']):
             m_dict['mod_spec']['create_fw'] = FireWork.from_dict(m_dict['mod_spec']['create_fw'])
         return FWAction(m_dict['action'], m_dict['stored_data'], m_dict['mod_spec'])
 
+    @classmethod
+    def decode_value(cls, field, key, value):
+        """
+        Deserialize a single value of the stored_data or mod_spec of a serialized FWAction, like from_dict() does.
+
+        :param field: 'stored_data' or 'mod_spec'
+        :param key: the key of the value
+        :param value: the serialized value
+        """
+        m_dict = {'action': 'CONTINUE', 'stored_data': {}, 'mod_spec': {}}
+        m_dict[field] = {key: value}
+        return getattr(cls.from_dict(m_dict), field)[key]
+
 
 class FireWork(FWSerializable):
     # 'Canceled' is the dominant spelling over 'cancelled' in the US starting around 1985...(Google n-grams)
@@ -268,6 +283,9 @@ class Launch(FWSerializable, object):
     def to_db_dict(self):
         m_d = self.to_dict()
         m_d['runtime_secs'] = self.runtime_secs
+        # native datetimes (for index range scans); heartbeats only update last_pinged, see LaunchPad._ping_launch()
+        m_d['last_pinged'] = self.last_pinged
+        m_d['time_reserved'] = self.time_reserved
         return m_d
 
     @classmethod
@@ -275,8 +293,13 @@ class Launch(FWSerializable, object):
     def from_dict(cls, m_dict):
         fworker = FWorker.from_dict(m_dict['fworker'])
         action = FWAction.from_dict(m_dict['action']) if m_dict.get('action') else None
-        return Launch(m_dict['state'], m_dict['launch_dir'], fworker, m_dict['host'], m_dict['ip'], action,
-                      m_dict['state_history'], m_dict['launch_id'], m_dict['fw_id'])
+        m_launch = Launch(m_dict['state'], m_dict['launch_dir'], fworker, m_dict['host'], m_dict['ip'], action,
+                          m_dict['state_history'], m_dict['launch_id'], m_dict['fw_id'])
+        if m_dict.get('last_pinged'):
+            for data in m_launch.state_history:
+                if data['state'] == 'RUNNING':
+                    data['updated_on'] = m_dict['last_pinged']
+        return m_launch
 
     def _update_state_history(self, state):
         """
@@ -52,10 +52,38 @@ class FWConfig(object):
 
         self.PING_TIME_SECS = 3600  # while Running a job, how often to ping back the server that we're still alive
         self.RUN_EXPIRATION_SECS = self.PING_TIME_SECS * 4  # if a job is not pinged in this much time,
-        # we mark it FIZZLED
+        # we mark it FIZZLED (and its FireWork can be checked out again)
 
         self.RESERVATION_EXPIRATION_SECS = 60 * 60 * 24 * 14  # a job can stay in a queue for 14 days before we
-        # cancel its reservation
+        # cancel its reservation (and its FireWork can be checked out again)
+
+        self.LEASE_EXPIRATION_SECS = 60 * 60  # FireWorks leased by a rapidfire Rocket launcher are released after
+        # this much time if they have not been run
+
+        self.EVENT_LOG_SIZE = 16 * 1024 * 1024  # bytes of FireWork state transitions kept in the events collection
+        self.EVENT_GAP_SECS = 10  # LaunchPad.events_since() waits this long for events that are still being written
+
+        self.ITER_BATCH_SIZE = 1000  # number of FireWorks fetched per query by LaunchPad.iter_fw_ids() and iter_fws()
+
+        self.ARCHIVE_AFTER_SECS = 60 * 60 * 24 * 30  # LaunchPad.archive_completed() archives the Workflows that
+        # finished more than 30 days ago
+
+        self.BLOB_THRESHOLD_BYTES = 1024 * 1024  # values of the stored_data and mod_spec of a FWAction with more
+        # JSON than this are stored in blobs (GridFS for MongoDB) instead of the Launch document, and only loaded
+        # when they are accessed
+
+        self.LAUNCH_ID_BLOCK_SIZE = 10  # number of launch ids a LaunchPad reserves from the DB at once
+
+        # durability of each class of LaunchPad writes: 'state' (state transitions, new FireWorks and Launches),
+        # 'heartbeat' (pings of running Launches) and 'history' (other updates of the Launch history). The tiers
+        # are 'unacknowledged', 'acknowledged', 'journaled' and 'majority' (see fireworks.storage.storage_backend)
+        self.WRITE_CONCERNS = {'state': 'journaled', 'heartbeat': 'acknowledged', 'history': 'acknowledged'}
+
+        # LaunchPads of a process that connect to the same MongoDB server (with the same credentials) share one
+        # client; its connection pool holds up to MONGO_POOL_SIZE connections. A client that is no longer used by
+        # any LaunchPad is closed after MONGO_IDLE_TIMEOUT_SECS
+        self.MONGO_POOL_SIZE = 100
+        self.MONGO_IDLE_TIMEOUT_SECS = 300
 
         self.override_user_settings()
 
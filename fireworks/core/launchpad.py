@@ -4,12 +4,20 @@
 The LaunchPad manages the FireWorks database.
 """
 import datetime
+import json
+import time
+import uuid
+from collections import OrderedDict
 from fireworks.core.fw_config import FWConfig
 from fireworks.core.workflow import Workflow
+from fireworks.core.compact_workflow import CompactWorkflow
+from fireworks.features.dupefinder import DupeFinderBase
+from fireworks.storage.lazy_blobs import offload_values, is_blob_ref, LazyBlobDict
+from fireworks.storage.storage_backend import get_storage_backend, ASCENDING, DESCENDING, \
+    WRITE_CONCERN_TIERS
 from fireworks.utilities.fw_serializers import FWSerializable, load_object
-from pymongo.mongo_client import MongoClient
-from fireworks.core.firework import FireWork, Launch
-from pymongo import DESCENDING
+from fireworks.core.firework import FireWork, Launch, FWAction
+from fireworks.core.fworker import FWorker
 from fireworks.utilities.fw_utilities import get_fw_logger
 
 __author__ = 'Anubhav Jain'
@@ -29,8 +37,12 @@ class LaunchPad(FWSerializable):
     The LaunchPad manages the FireWorks database.
     """
 
+    LEASE_FIELDS = {'lease_owner': 1, 'lease_expires': 1}  # fields of FireWorks leased with checkout_many()
+    EVENT_KEYS = ['fw_id', 'launch_id', 'old_state', 'state', 'worker']  # of state transitions, see events_since()
+    LEASED_STATES = ['RESERVED', 'RUNNING']  # FireWorks in these states are READY again once their lease expires
+
     def __init__(self, host='localhost', port=27017, name='fireworks', username=None, password=None,
-                 logdir=None, strm_lvl=None):
+                 logdir=None, strm_lvl=None, backend='mongo', write_concerns=None):
         """
         
         :param host:
@@ -40,6 +52,9 @@ class LaunchPad(FWSerializable):
         :param password:
         :param logdir:
         :param strm_lvl:
+        :param backend: the storage backend: 'mongo' (default), 'memory' or 'sqlite' (see fireworks.storage)
+        :param write_concerns: a dict of write class ('state', 'heartbeat' or 'history') to durability tier (e.g. \
+        'acknowledged'), overriding FWConfig().WRITE_CONCERNS
         """
         self.host = host
         self.port = port
@@ -52,29 +67,54 @@ class LaunchPad(FWSerializable):
         self.strm_lvl = strm_lvl if strm_lvl else 'INFO'
         self.m_logger = get_fw_logger('launchpad', l_dir=self.logdir, stream_level=self.strm_lvl)
 
-        self.connection = MongoClient(host, port, j=True)
-        self.database = self.connection[name]
-        if username:
-            self.database.authenticate(username, password)
-
-        self.fireworks = self.database.fireworks
-        self.launches = self.database.launches
-        self.fw_id_assigner = self.database.fw_id_assigner
-        self.links = self.database.links
+        self.backend_name = backend
+        self.backend = get_storage_backend(backend, host=host, port=port, name=name, username=username,
+                                           password=password)
+
+        self.write_concerns = write_concerns
+        self._write_options = {}  # write class to keyword arguments of its writes
+        for (write_class, tier) in dict(FWConfig().WRITE_CONCERNS, **(write_concerns or {})).iteritems():
+            if tier not in WRITE_CONCERN_TIERS:
+                raise ValueError('Invalid write concern for {} writes: {}; choose from {}'.format(
+                    write_class, tier, sorted(WRITE_CONCERN_TIERS)))
+            self._write_options[write_class] = WRITE_CONCERN_TIERS[tier]
+
+        self.fireworks = self.backend.get_collection('fireworks')
+        self.launches = self.backend.get_collection('launches')
+        self.fw_id_assigner = self.backend.get_collection('fw_id_assigner')
+        self.links = self.backend.get_collection('links')
+        # finished Workflows, moved out of the collections above by archive_completed()
+        self.archived_fireworks = self.backend.get_collection('archived_fireworks')
+        self.archived_launches = self.backend.get_collection('archived_launches')
+        self.archived_links = self.backend.get_collection('archived_links')
+        # log of FireWork and Launch state transitions, see events_since()
+        self.events = self.backend.get_capped_collection('events', FWConfig().EVENT_LOG_SIZE)
+
+        self.load_round_trips = 0  # number of DB queries made to load FireWorks, Launches and Workflows
+
+        # block of launch ids reserved by this LaunchPad, see _get_launch_id()
+        self._next_launch_id = None
+        self._launch_id_block_end = None
+
+        self._lease_owner = uuid.uuid4().hex  # identifies the FireWorks leased by this LaunchPad
 
     def to_dict(self):
         """
         Note: usernames/passwords are exported as unencrypted Strings!
         """
         d = {'host': self.host, 'port': self.port, 'name': self.name, 'username': self.username,
-             'password': self.password, 'logdir': self.logdir, 'strm_lvl': self.strm_lvl}
+             'password': self.password, 'logdir': self.logdir, 'strm_lvl': self.strm_lvl,
+             'backend': self.backend_name, 'write_concerns': self.write_concerns}
         return d
 
     @classmethod
     def from_dict(cls, d):
         logdir = d.get('logdir', None)
         strm_lvl = d.get('strm_lvl', None)
-        return LaunchPad(d['host'], d['port'], d['name'], d['username'], d['password'], logdir, strm_lvl)
+        backend = d.get('backend', 'mongo')
+        write_concerns = d.get('write_concerns', None)
+        return LaunchPad(d['host'], d['port'], d['name'], d['username'], d['password'], logdir, strm_lvl, backend,
+                         write_concerns)
 
     def reset(self, password, require_password=True):
         """
@@ -89,49 +129,130 @@ class LaunchPad(FWSerializable):
         m_password = datetime.datetime.now().strftime('%Y-%m-%d')
 
         if password == m_password or not require_password:
-            self.fireworks.remove()
-            self.launches.remove()
-            self.links.remove()
+            self.fireworks.remove(**self._write_options['state'])
+            self.launches.remove(**self._write_options['state'])
+            self.links.remove(**self._write_options['state'])
+            for collection in [self.archived_fireworks, self.archived_launches, self.archived_links]:
+                collection.remove(**self._write_options['state'])
+            self.backend.remove_blobs()
+            self.events.drop()  # documents cannot be removed from capped collections
+            self.events = self.backend.get_capped_collection('events', FWConfig().EVENT_LOG_SIZE)
             self._restart_ids(1, 1)
             self._update_indices()
             self.m_logger.info('LaunchPad was RESET.')
         else:
             raise ValueError("Invalid password! Password is today's date: {}".format(m_password))
 
-    def maintain(self):
-        # TODO: compact the database / collections
+    def maintain(self, fworkers=None):
+        """
+        Create the indexes, migrate documents written by older versions of FireWorks and report the queries that \
+        are not backed by an index (see check_indexes()).
+
+        :param fworkers: the FWorkers whose queries to check (default: the FWorkers that have run Launches)
+        :return: a list of (collection name, query) tuples of the queries that scan a whole collection
+        """
+        # TODO: compact the database / collections (finished Workflows can be moved away with archive_completed())
         # TODO: track down launches that have not pinged the server in awhile...
         # TODO: update FIZZLED and long RESERVED states...
 
         self.m_logger.info('Performing maintenance on Launchpad, please wait....')
         self._update_indices()
+        self._update_launch_times()
+        self._update_wf_states()
+        scans = self.check_indexes(fworkers)
         self.m_logger.info('LaunchPad was MAINTAINED.')
+        return scans
 
-    def add_wf(self, wf):
+    def check_indexes(self, fworkers=None):
         """
+        Explain the queries of the hot paths (the checkout query of each FWorker, and the lookups of FireWorks, \
+        Launches and Workflows by id) and log a warning for each query that scans a whole collection. A FWorker \
+        query on a key without an index, for example, makes every checkout scan the READY FireWorks.
 
-        :param wf: a Workflow object.
+        :param fworkers: the FWorkers whose checkout queries to explain (default: the FWorkers that have run Launches)
+        :return: a list of (collection name, query) tuples of the queries that scan a whole collection
         """
+        if fworkers is None:
+            fworkers = [FWorker(query=json.loads(group['_id'])) for group in self._aggregate(
+                self.launches, [{'$group': {'_id': '$fworker.query'}}]) if group['_id'] not in [None, '{}']]
+        now = datetime.datetime.utcnow()
+        queries = [(self.fireworks, {'fw_id': 0}), (self.fireworks, {'launches': 0}),
+                   (self.launches, {'launch_id': 0}), (self.launches, {'fw_id': {'$in': [0]}}),
+                   (self.links, {'nodes': 0}),
+                   (self.launches, {'state': 'RUNNING', 'last_pinged': {'$lte': now}}),
+                   (self.launches, {'state': 'RESERVED', 'time_reserved': {'$lte': now}})]
+        queries.extend([(self.fireworks, self._get_run_query(fworker)) for fworker in [FWorker()] + fworkers])
+
+        scans = []
+        for (collection, query) in queries:
+            if self._is_collection_scan(collection.find(query).explain()):
+                self.m_logger.warning('Query on {} scans the whole collection: {}'.format(collection.name, query))
+                scans.append((collection.name, query))
+        return scans
+
+    @staticmethod
+    def _is_collection_scan(plan):
+        """
+        (internal method) whether an explain() plan (of MongoDB 2.x, or the queryPlanner of later versions) scans a \
+        whole collection
+        """
+        if isinstance(plan, list):
+            return any([LaunchPad._is_collection_scan(p) for p in plan])
+        if not isinstance(plan, dict):
+            return False
+        if plan.get('stage') == 'COLLSCAN' or str(plan.get('cursor', '')).startswith('BasicCursor'):
+            return True
+        # plans that were considered but not chosen do not matter
+        return any([LaunchPad._is_collection_scan(v) for (k, v) in plan.iteritems()
+                    if k not in ['allPlans', 'rejectedPlans', 'allPlansExecution', 'oldPlan']])
 
-        if isinstance(wf, FireWork):
-            wf = Workflow.from_FireWork(wf)
-
-        # insert the FireWorks and get back mapping of old to new ids
-        old_new = self._upsert_fws(wf.id_fw.values())
-
-        # TODO: refresh_workflow probably takes care of this now
-        # redo the Workflow based on new mappings
-        wf._reassign_ids(old_new)
+    def add_wf(self, wf):
+        """
 
-        # insert the WFLinks
-        self.links.insert(wf.to_db_dict())
+        :param wf: a Workflow object.
+        :return: a dict mapping old to new FireWork ids
+        """
+        return self.add_wfs([wf])[0]
 
-        # refresh WF states, starting from all roots
-        for fw_id in wf.root_fw_ids:
-            self._refresh_wf(wf, fw_id)
+    def add_wfs(self, wfs):
+        """
+        Add many Workflows at once. The ids of all new FireWorks are reserved as a single contiguous block, and the \
+        FireWorks and links documents are each written in one bulk insert, so the number of DB calls does not \
+        grow with the number of FireWorks.
 
-        self.m_logger.info('Added a workflow. id_map: {}'.format(old_new))
-        return old_new
+        :param wfs: a list of Workflow (or FireWork) objects
+        :return: a list of dicts mapping old to new FireWork ids, one per Workflow
+        """
+        wfs = [Workflow.from_FireWork(wf) if isinstance(wf, FireWork) else wf for wf in wfs]
+
+        # refresh WF states in memory, starting from all roots
+        for wf in wfs:
+            for fw_id in wf.root_fw_ids:
+                wf.refresh(fw_id)
+
+        # reserve a block of ids for all the new FireWorks and remap them in memory
+        n_new = sum([len([fw_id for fw_id in wf.id_fw if fw_id < 0]) for wf in wfs])
+        next_id = self.get_new_fw_id(n_new) if n_new else None
+        all_old_new = []
+        for wf in wfs:
+            old_new = {}  # mapping between old and new FireWork ids
+            for old_id in sorted([fw_id for fw_id in wf.id_fw if fw_id < 0], reverse=True):
+                old_new[old_id] = next_id
+                wf.id_fw[old_id].fw_id = next_id
+                next_id += 1
+            wf._reassign_ids(old_new)
+            all_old_new.append(old_new)
+
+        # insert the FireWorks and the WFLinks
+        fw_dicts = [fw.to_db_dict() for wf in wfs for fw in wf.id_fw.itervalues()]
+        if fw_dicts:
+            self.fireworks.insert(fw_dicts, **self._write_options['state'])
+            self.links.insert([wf.to_db_dict() for wf in wfs], **self._write_options['state'])
+            self._log_events([{'fw_id': fw_dict['fw_id'], 'state': fw_dict['state']} for fw_dict in fw_dicts])
+
+        for old_new in all_old_new:
+            self.m_logger.info('Added a workflow. id_map: {}'.format(old_new))
+        return all_old_new
 
     def get_launch_by_id(self, launch_id):
         """
@@ -140,9 +261,13 @@ class LaunchPad(FWSerializable):
         :param launch_id: launch id
         :return: Launch object
         """
+        self.load_round_trips += 1
         m_launch = self.launches.find_one({'launch_id': launch_id})
+        if not m_launch:
+            self.load_round_trips += 1
+            m_launch = self.archived_launches.find_one({'launch_id': launch_id})
         if m_launch:
-            return Launch.from_dict(m_launch)
+            return self._load_blobs_lazily(Launch.from_dict(m_launch))
         raise ValueError('No Launch exists with launch_id: {}'.format(launch_id))
 
     def get_fw_by_id(self, fw_id):
@@ -152,17 +277,11 @@ class LaunchPad(FWSerializable):
         :param fw_id: FireWork id (int)
         :return: FireWork object
         """
-        fw_dict = self.fireworks.find_one({'fw_id': fw_id})
-
-        if not fw_dict:
+        fws = self._get_fws_by_ids([fw_id])
+        if not fws:
             raise ValueError('No FireWork exists with id: {}'.format(fw_id))
-            # recreate launches from the launch collection
-        launches = []
-        for launch_id in fw_dict['launches']:
-            launches.append(self.get_launch_by_id(launch_id).to_dict())
-        fw_dict['launches'] = launches
 
-        return FireWork.from_dict(fw_dict)
+        return fws[0]
 
     def get_wf_by_fw_id(self, fw_id):
 
@@ -172,14 +291,177 @@ class LaunchPad(FWSerializable):
         :return: A Workflow object
         """
 
+        self.load_round_trips += 1
         links_dict = self.links.find_one({'nodes': fw_id})
-        fws = []
-        for fw_id in links_dict['nodes']:
-            fws.append(self.get_fw_by_id(fw_id))
+        if not links_dict:
+            self.load_round_trips += 1
+            links_dict = self.archived_links.find_one({'nodes': fw_id})
+            if not links_dict:
+                raise ValueError('No Workflow exists with FireWork id: {}'.format(fw_id))
+        fws = self._get_fws_by_ids(links_dict['nodes'])
         links = Workflow.Links.from_dict(links_dict['links']).to_dict()  # necessary because Mongo no like int keys
 
         return Workflow(fws, links, links_dict['metadata'])
 
+    def get_compact_wf_by_fw_id(self, fw_id):
+        """
+        Given a FireWork id, give back the CompactWorkflow containing that FireWork. Only ids, states and Launch \
+        states are loaded from the DB; no FireWork or Launch objects are created.
+
+        :param fw_id: FireWork id (int)
+        :return: A CompactWorkflow object
+        """
+        self.load_round_trips += 1
+        links_dict = self.links.find_one({'nodes': fw_id}, {'links': 1, 'nodes': 1, 'metadata': 1})
+        if not links_dict:
+            raise ValueError('No Workflow exists with FireWork id: {}'.format(fw_id))
+
+        self.load_round_trips += 1
+        fw_dicts = list(self.fireworks.find({'fw_id': {'$in': links_dict['nodes']}},
+                                            {'fw_id': 1, 'state': 1, 'launches': 1}))
+
+        launch_ids = [l_id for fw_dict in fw_dicts for l_id in fw_dict['launches']]
+        launch_dicts = []
+        if launch_ids:
+            self.load_round_trips += 1
+            launch_dicts = self.launches.find({'launch_id': {'$in': launch_ids}},
+                                              {'launch_id': 1, 'state': 1, 'action.action': 1,
+                                               'action.mod_spec.dict_mods': 1})
+
+        return CompactWorkflow.from_db_dicts(links_dict, fw_dicts, launch_dicts)
+
+    def get_wf_ids(self, query=None):
+        """
+        Return the Workflows whose links documents match a query. Besides the links, each links document holds the \
+        overall 'state' of its Workflow (see Workflow.state), the 'state_counts' of its FireWorks and its \
+        'updated_on' time, as of the last time the Workflow was refreshed (i.e. a Launch completed): FireWorks that \
+        were only reserved or checked out since then are still counted as READY. For example, \
+        get_wf_ids({'state': 'COMPLETED'}) is a single (indexed) query that does not load any FireWorks.
+
+        :param query: a dict representing a Mongo query on the links documents
+        :return: a list with the smallest fw id of each Workflow (which can be passed to get_wf_by_fw_id())
+        """
+        return [min(links_dict['nodes']) for links_dict in self.links.find(query if query else {}, {'nodes': 1})]
+
+    def get_wf_summary(self, fw_id):
+        """
+        Given a FireWork id, summarize the Workflow containing that FireWork. The summary is aggregated on the \
+        database server; no FireWork or Launch objects are created.
+
+        :param fw_id: FireWork id (int)
+        :return: a dict with the 'metadata', number of 'nodes', 'state' and 'updated_on' time of the Workflow (see \
+        get_wf_ids()), the 'fireworks' by state with their ids (see \
+        get_state_counts()) and the 'launches' by state, with their 'count' and the 'total', 'avg' and 'max' \
+        runtime_secs
+        """
+        self.load_round_trips += 1
+        links_dict = self.links.find_one({'nodes': fw_id}, {'nodes': 1, 'metadata': 1, 'state': 1, 'updated_on': 1})
+        if not links_dict:
+            raise ValueError('No Workflow exists with FireWork id: {}'.format(fw_id))
+
+        launches = {}
+        self.load_round_trips += 1
+        for group in self._aggregate(self.launches, [
+                {'$match': {'fw_id': {'$in': links_dict['nodes']}}},
+                {'$group': {'_id': '$state', 'count': {'$sum': 1}, 'total_runtime_secs': {'$sum': '$runtime_secs'},
+                            'avg_runtime_secs': {'$avg': '$runtime_secs'},
+                            'max_runtime_secs': {'$max': '$runtime_secs'}}}]):
+            launches[group.pop('_id')] = group
+
+        return {'fw_id': fw_id, 'metadata': links_dict['metadata'], 'nodes': len(links_dict['nodes']),
+                'state': links_dict.get('state'), 'updated_on': links_dict.get('updated_on'),
+                'fireworks': self.get_state_counts({'fw_id': {'$in': links_dict['nodes']}}, include_fw_ids=True),
+                'launches': launches}
+
+    def get_state_counts(self, query=None, include_fw_ids=False):
+        """
+        Count the FireWorks that match a query, by state. The counts are aggregated on the database server; no \
+        FireWork objects are created.
+
+        :param query: a dict representing a Mongo query
+        :param include_fw_ids: also list the (sorted) 'fw_ids' of the FireWorks in each state. Only use this for \
+        queries that match a limited number of FireWorks (e.g. a Workflow), since the result of an aggregation is \
+        limited in size (16MB with MongoDB 2.x); see iter_fw_ids() otherwise.
+        :return: a dict of state to a dict with the 'count', the 'first_created_on' and 'last_created_on' times \
+        and, if include_fw_ids is set, the 'fw_ids'
+        """
+        group = {'_id': '$state', 'count': {'$sum': 1}, 'first_created_on': {'$min': '$created_on'},
+                 'last_created_on': {'$max': '$created_on'}}
+        pipeline = [{'$group': group}]
+        if include_fw_ids:
+            group['fw_ids'] = {'$push': '$fw_id'}
+        if query:
+            pipeline.insert(0, {'$match': query})
+
+        counts = {}
+        self.load_round_trips += 1
+        for group in self._aggregate(self.fireworks, pipeline):
+            if 'fw_ids' in group:
+                group['fw_ids'].sort()
+            counts[group.pop('_id')] = group
+        return counts
+
+    def _aggregate(self, collection, pipeline):
+        """
+        (internal method) run an aggregation pipeline
+
+        :return: the list of output documents
+        """
+        result = collection.aggregate(pipeline)
+        # pymongo 2.x returns a dict, later versions a cursor
+        return result['result'] if isinstance(result, dict) else list(result)
+
+    def _get_fws_by_ids(self, fw_ids):
+        """
+        (internal method) Load many FireWorks at once. Uses one query for the FireWorks and one query for all of \
+        their Launches, regardless of the number of FireWorks.
+
+        :param fw_ids: a list of FireWork ids
+        :return: a list of FireWork objects (FireWorks that don't exist are omitted)
+        """
+        self.load_round_trips += 1
+        fw_dicts = list(self.fireworks.find({'fw_id': {'$in': list(fw_ids)}}))
+        missing_ids = set(fw_ids) - set([fw_dict['fw_id'] for fw_dict in fw_dicts])
+        if missing_ids:
+            self.load_round_trips += 1
+            fw_dicts.extend(self.archived_fireworks.find({'fw_id': {'$in': list(missing_ids)}}))
+        return self._hydrate_fws(fw_dicts)
+
+    def _hydrate_fws(self, fw_dicts):
+        """
+        (internal method) Create FireWork objects from FireWork documents, loading all of their Launches with a \
+        single query.
+
+        :param fw_dicts: a list of FireWork documents (the 'launches' key holds launch ids)
+        :return: a list of FireWork objects
+        """
+        # recreate launches from the launch collection
+        launch_ids = [l_id for fw_dict in fw_dicts for l_id in fw_dict['launches']]
+        launch_dicts = {}
+        if launch_ids:
+            self.load_round_trips += 1
+            for launch_dict in self.launches.find({'launch_id': {'$in': launch_ids}}):
+                launch_dicts[launch_dict['launch_id']] = launch_dict
+            # e.g. Launches stolen (see _steal_launches()) from FireWorks that were archived since
+            missing_ids = [l_id for l_id in launch_ids if l_id not in launch_dicts]
+            if missing_ids:
+                self.load_round_trips += 1
+                for launch_dict in self.archived_launches.find({'launch_id': {'$in': missing_ids}}):
+                    launch_dicts[launch_dict['launch_id']] = launch_dict
+
+        fws = []
+        for fw_dict in fw_dicts:
+            for l_id in fw_dict['launches']:
+                if l_id not in launch_dicts:
+                    # a Rocket died between checking out the FireWork and inserting its Launch (see _checkout_fw())
+                    self.m_logger.debug('No Launch exists with launch_id: {}, skipping it'.format(l_id))
+            fw_dict['launches'] = [launch_dicts[l_id] for l_id in fw_dict['launches'] if l_id in launch_dicts]
+            fws.append(FireWork.from_dict(fw_dict))
+            for m_launch in fws[-1].launches:
+                self._load_blobs_lazily(m_launch)
+
+        return fws
+
     def get_fw_ids(self, query=None, sort=False):
         """
         Return all the fw ids that match a query,
@@ -193,23 +475,204 @@ class LaunchPad(FWSerializable):
 
         return fw_ids
 
-    def run_exists(self):
+    def iter_fw_ids(self, query=None, batch_size=FWConfig().ITER_BATCH_SIZE):
+        """
+        Iterate over the fw ids that match a query, in increasing order. Unlike get_fw_ids(), the ids are fetched \
+        batch by batch (see iter_fws()), so that memory use does not grow with the number of results.
+
+        :param query: a dict representing a Mongo query
+        :param batch_size: the number of ids fetched per query
+        :return: a generator of fw ids
+        """
+        for batch in self._iter_fw_batches(query, {'fw_id': 1}, batch_size):
+            for fw_dict in batch:
+                yield fw_dict['fw_id']
+
+    def iter_fws(self, query=None, fields=None, batch_size=FWConfig().ITER_BATCH_SIZE):
+        """
+        Iterate over the FireWorks that match a query, in order of fw_id. Each batch is fetched with a range query \
+        on the fw_id index (fw_id greater than the last one returned) rather than with skip(), so every batch \
+        costs the same however far the iteration has gone.
+
+        :param query: a dict representing a Mongo query
+        :param fields: a projection (e.g. {'spec': 1}). If given, the matching FireWork documents are returned \
+        rather than FireWork objects
+        :param batch_size: the number of FireWorks fetched per query (FireWork objects also take one query for the \
+        Launches of each batch)
+        :return: a generator of FireWork objects (or of dicts, if fields is given)
+        """
+        if fields and any(fields.values()):
+            fields = dict(fields, fw_id=1)  # needed for the range queries
+        for batch in self._iter_fw_batches(query, fields, batch_size):
+            if fields:
+                for fw_dict in batch:
+                    yield fw_dict
+            else:
+                for fw in self._hydrate_fws(batch):
+                    yield fw
+
+    def _iter_fw_batches(self, query, fields, batch_size):
+        """
+        (internal method) Fetch the FireWork documents matching a query in batches, by increasing fw_id
+
+        :return: a generator of lists of FireWork documents
+        """
+        last_id = None
+        while True:
+            m_query = query if query else {}
+            if last_id is not None:
+                m_query = {'$and': [m_query, {'fw_id': {'$gt': last_id}}]}
+            self.load_round_trips += 1
+            batch = list(self.fireworks.find(m_query, fields, sort=[('fw_id', ASCENDING)], limit=batch_size))
+            if batch:
+                yield batch
+            if len(batch) < batch_size:
+                return
+            last_id = batch[-1]['fw_id']
+
+    def run_exists(self, fworker=None):
         """
         Checks to see if the database contains any FireWorks that are ready to run
+        :param fworker: only consider the FireWorks matching the query of this FWorker
         :return: (T/F)
         """
-        return bool(self.fireworks.find_one(self._decorate_query({}), fields={'fw_id': 1}))
+        m_query = dict(fworker.query) if fworker else {}
+        return bool(self.fireworks.find_one(self._decorate_query(m_query), fields={'fw_id': 1}))
+
+    def wait_for_ready(self, fworker=None, timeout=60):
+        """
+        Block until a FireWork is ready to run. Instead of polling run_exists(), this waits for READY events, which \
+        are logged in the events collection whenever FireWorks become READY. FireWorks whose lease expires do not \
+        log events; they are found when the timeout runs out.
+
+        :param fworker: only consider the FireWorks matching the query of this FWorker
+        :param timeout: the maximum number of seconds to wait
+        :return: (T/F) whether a FireWork is ready to run
+        """
+        deadline = time.time() + timeout
+        while True:
+            # events are logged after the FireWorks become READY, so no transition is missed between the two queries
+            next_seq = self.fw_id_assigner.find_one({}, {'next_event_seq': 1}).get('next_event_seq', 0)
+            if self.run_exists(fworker):
+                return True
+            if time.time() >= deadline:
+                return False
+            self.backend.wait_for_document(self.events, {'seq': {'$gte': next_seq}, 'state': 'READY',
+                                                         'launch_id': None}, deadline - time.time())
+
+    def events_since(self, seq=0):
+        """
+        Iterate over the FireWork and Launch state transitions logged after a given event, in order. FireWork \
+        events have a launch_id of None. Events are dicts of seq (the sequence number), fw_id, launch_id, \
+        old_state (None for new FireWorks and Launches), state, time and worker (the name of the FWorker, if any). \
+        Transitions that happen without a write (leases that expire) are not logged.
+
+        Sequence numbers are taken just before the events are written, so an event may still be in flight when a \
+        later one can be read. Iteration stops at such a gap in the sequence, unless the gap is older than \
+        FWConfig().EVENT_GAP_SECS (e.g. because the events were lost). If the events after seq were already \
+        dropped from the capped collection, iteration resumes from the oldest event that is kept.
+
+        :param seq: the sequence number of the last event that was already read (0 to read all events)
+        :return: a generator of event dicts
+        """
+        gap_cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=FWConfig().EVENT_GAP_SECS)
+        oldest = self.events.find_one({}, {'seq': 1}, sort=[('seq', ASCENDING)])
+        if oldest and oldest['seq'] > seq + 1:
+            seq = oldest['seq'] - 1  # resync: the events in between are gone
+        for event in self.events.find({'seq': {'$gt': seq}}, {'_id': 0}, sort=[('seq', ASCENDING)]):
+            if event['seq'] != seq + 1 and event['time'] > gap_cutoff:
+                return
+            seq = event['seq']
+            yield event
+
+    def archive_completed(self, older_than=FWConfig().ARCHIVE_AFTER_SECS, batch_size=FWConfig().ITER_BATCH_SIZE):
+        """
+        Move the finished (COMPLETED or DEFUSED) Workflows that have not been updated for a while from the \
+        fireworks, launches and links collections to the archived_fireworks, archived_launches and archived_links \
+        collections, so that they no longer slow down the queries on the active Workflows. Each batch of Workflows \
+        takes one bulk insert and one bulk remove per collection. Archived Workflows can still be read with \
+        get_fw_by_id(), get_launch_by_id() and get_wf_by_fw_id(), but they are not found by queries (e.g. \
+        get_fw_ids()) and their FireWorks are no longer candidates of the duplicate checks.
+
+        :param older_than: (secs) only archive the Workflows that finished more than this long ago
+        :param batch_size: the number of Workflows moved at once
+        :return: a list with the smallest fw id of each archived Workflow
+        """
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=older_than)
+        query = {'state': {'$in': ['COMPLETED', 'DEFUSED']}, 'updated_on': {'$lte': cutoff}}
+        archived_ids = []
+        while True:
+            links_dicts = list(self.links.find(query, limit=batch_size))
+            if not links_dicts:
+                return archived_ids
+            fw_ids = [fw_id for links_dict in links_dicts for fw_id in links_dict['nodes']]
+            fw_dicts = list(self.fireworks.find({'fw_id': {'$in': fw_ids}}))
+            launch_ids = [l_id for fw_dict in fw_dicts for l_id in fw_dict['launches']]
+            launch_dicts = list(self.launches.find({'launch_id': {'$in': launch_ids}}))
+
+            # copy first, so that the Workflows stay readable if this is interrupted (and can be archived again)
+            for (collection, archive, key, ids, docs) in [
+                    (self.launches, self.archived_launches, 'launch_id', launch_ids, launch_dicts),
+                    (self.fireworks, self.archived_fireworks, 'fw_id', fw_ids, fw_dicts),
+                    (self.links, self.archived_links, '_id', [l['_id'] for l in links_dicts], links_dicts)]:
+                if docs:
+                    archive.remove({key: {'$in': ids}}, **self._write_options['state'])
+                    archive.insert(docs, **self._write_options['state'])
+            self.links.remove({'_id': {'$in': [l['_id'] for l in links_dicts]}}, **self._write_options['state'])
+            self.fireworks.remove({'fw_id': {'$in': fw_ids}}, **self._write_options['state'])
+            if launch_ids:
+                self.launches.remove({'launch_id': {'$in': launch_ids}}, **self._write_options['state'])
+
+            archived_ids.extend([min(links_dict['nodes']) for links_dict in links_dicts])
+            self.m_logger.info('Archived {} Workflows'.format(len(links_dicts)))
 
     def _update_indices(self):
         self.fireworks.ensure_index('fw_id', unique=True)
         self.fireworks.ensure_index('state')
+        self.fireworks.ensure_index([('state', ASCENDING), ('lease_expires', ASCENDING)])
+        # checkouts sort by priority; completions, unreserve() and mark_fizzled() look FireWorks up by Launch
+        self.fireworks.ensure_index([('state', ASCENDING), ('spec._priority', DESCENDING)])
+        self.fireworks.ensure_index('launches')
 
         self.launches.ensure_index('launch_id', unique=True)
+        self.launches.ensure_index('fw_id')  # get_wf_summary() aggregates the Launches of a Workflow
         self.launches.ensure_index('state')
         self.launches.ensure_index('start')
         self.launches.ensure_index('end')
         self.launches.ensure_index('host')
         self.launches.ensure_index('ip')
+        # range scans of detect_fizzled() and detect_unreserved()
+        self.launches.ensure_index([('state', ASCENDING), ('last_pinged', ASCENDING)])
+        self.launches.ensure_index([('state', ASCENDING), ('time_reserved', ASCENDING)])
+
+        self.links.ensure_index('nodes')  # Workflows are looked up by any of their FireWork ids
+        self.links.ensure_index('state')
+
+        self.archived_fireworks.ensure_index('fw_id', unique=True)
+        self.archived_launches.ensure_index('launch_id', unique=True)
+        self.archived_links.ensure_index('nodes')
+
+        self.events.ensure_index('seq')
+
+    def _update_launch_times(self):
+        """
+        (internal method) store the last_pinged and time_reserved of the active Launches as native datetimes, \
+        for databases written by older versions of FireWorks
+        """
+        for m_launch in self.launches.find({'state': {'$in': ['RUNNING', 'RESERVED']}}):
+            if not isinstance(m_launch.get('last_pinged' if m_launch['state'] == 'RUNNING' else 'time_reserved'),
+                              datetime.datetime):
+                self.launches.update({'launch_id': m_launch['launch_id']}, Launch.from_dict(m_launch).to_db_dict(),
+                                     **self._write_options['history'])
+
+    def _update_wf_states(self):
+        """
+        (internal method) add the state, state_counts and updated_on of the Workflows to their links documents, \
+        for databases written by older versions of FireWorks
+        """
+        for links_dict in self.links.find({'state': {'$exists': False}}, {'nodes': 1}):
+            wf = self.get_wf_by_fw_id(links_dict['nodes'][0])
+            self.links.update({'_id': links_dict['_id']}, wf.to_db_dict(), **self._write_options['state'])
 
     def _restart_ids(self, next_fw_id, next_launch_id):
         """
@@ -218,117 +681,294 @@ class LaunchPad(FWSerializable):
         :param next_fw_id: id to give next FireWork (int)
         :param next_launch_id: id to give next Launch (int)
         """
-        self.fw_id_assigner.remove()
-        self.fw_id_assigner.insert({"next_fw_id": next_fw_id, "next_launch_id": next_launch_id})
+        self.fw_id_assigner.remove(**self._write_options['state'])
+        self.fw_id_assigner.insert({"next_fw_id": next_fw_id, "next_launch_id": next_launch_id,
+                                    "next_event_seq": 1}, **self._write_options['state'])
+        self._next_launch_id = None  # discard any cached block of launch ids
         self.m_logger.debug('RESTARTED fw_id, launch_id to ({}, {})'.format(next_fw_id, next_launch_id))
 
     def _decorate_query(self, query):
         """
-        (internal method) - takes a query and restricts to only those FireWorks that are able to run
+        (internal method) - takes a query and restricts to only those FireWorks that are able to run (READY, or \
+        RESERVED or RUNNING with a lease that has expired)
         :param query:
         :return:
         """
         m_query = dict(query)  # defensive copy
-        m_query['state'] = 'READY'
+        ready_query = {'$or': [{'state': 'READY'},
+                               {'state': {'$in': self.LEASED_STATES},
+                                'lease_expires': {'$lte': datetime.datetime.utcnow()}}]}
+        if '$or' in m_query:
+            return {'$and': [m_query, ready_query]}
+        m_query.update(ready_query)
         return m_query
 
-    def _check_fw_for_uniqueness(self, m_fw):
-        # check if there are duplicates
+    def _check_fw_for_uniqueness(self, m_fw, old_state, fworker):
+        """
+        (internal method) check if a FireWork that was just reserved or checked out has duplicates. If so, the \
+        FireWork takes over their Launches (and is READY again until its Workflow is refreshed).
+
+        :param m_fw: the FireWork
+        :param old_state: the state of the FireWork before it was reserved or checked out
+        :param fworker: the FWorker that reserved or checked out the FireWork
+        :return: (bool) whether the FireWork is unique
+        """
+        # check if there are duplicates, using the FireWork as it was before the reservation
         self.m_logger.debug('Trying out FW with id: {}'.format(m_fw.fw_id))
+        state = m_fw.state
+        m_fw.state = 'READY'
         if not self._steal_launches(m_fw):
+            m_fw.state = state
             return True
 
         self._upsert_fws([m_fw])  # update the DB with the new launches
+        if old_state != 'READY':
+            self._log_events([{'fw_id': m_fw.fw_id, 'old_state': old_state, 'state': 'READY',
+                               'worker': fworker.name}])
         self._refresh_wf(self.get_wf_by_fw_id(m_fw.fw_id),
                          m_fw.fw_id)  # since we updated a state, we need to refresh the WF again
 
         return False
 
-    def _get_a_fw_to_run(self, fworker, fw_id=None):
-        m_query = self._decorate_query(dict(fworker.query))  # make a copy of the query
+    def _get_run_query(self, fworker, fw_id=None):
+        """
+        (internal method) Get the query matching FireWorks that the FWorker may run
 
+        :param fworker: a FWorker object
+        :param fw_id: only match this FireWork id
+        """
         # Override query if fw_id defined
         # Note for later: We want to return None if this specific FW doesn't exist anymore
         # This is because our queue params might have been tailored to this FW
         if fw_id:
-            m_query = {"fw_id": fw_id, "state": {'$in': ['READY', 'RESERVED']}}
+            return {"fw_id": fw_id, "state": {'$in': ['READY', 'RESERVED']}}
+        return self._decorate_query(dict(fworker.query))  # make a copy of the query
+
+    def _get_a_fw_to_run(self, fworker, fw_id=None):
+        m_query = self._get_run_query(fworker, fw_id)
 
         while True:
-            # check out the matching firework, depending on the query set by the FWorker
-            m_fw = self.fireworks.find_and_modify(query=m_query, update={'$set': {'state': 'RESERVED'}},
+            # check out the matching firework, depending on the query set by the FWorker. The reservation is a
+            # lease: if the queue job never starts, the FireWork can be checked out again once it expires
+            lease_expires = datetime.datetime.utcnow() + datetime.timedelta(
+                seconds=FWConfig().RESERVATION_EXPIRATION_SECS)
+            m_fw = self.fireworks.find_and_modify(query=m_query,
+                                                  update={'$set': {'state': 'RESERVED', 'lease_expires': lease_expires},
+                                                          '$unset': {'lease_owner': 1}},
                                                   sort=[("spec._priority", DESCENDING)])
             if not m_fw:
                 return None, None
+            self._supersede_launches([m_fw])
+            old_state = m_fw['state']
+            # FireWorks that were READY (or leased, see checkout_many()) are checked for duplicates
+            check_dupes = old_state == 'READY' or 'lease_owner' in m_fw
             m_fw = self.get_fw_by_id(m_fw['fw_id'])
 
-            if self._check_fw_for_uniqueness(m_fw):
+            if not check_dupes or self._check_fw_for_uniqueness(m_fw, old_state, fworker):
+                self._log_events([{'fw_id': m_fw.fw_id, 'old_state': old_state, 'state': 'RESERVED',
+                                   'worker': fworker.name}])
                 return m_fw, None
 
+    def checkout_many(self, fworker, n, lease_secs=FWConfig().LEASE_EXPIRATION_SECS):
+        """
+        Lease up to n FireWorks that are ready to run and match the FWorker's query, so that they can be run back \
+        to back (e.g. by launch_rocket() with their fw_id) without polling the DB for each one. Leased FireWorks \
+        are RESERVED until they are checked out, released with release_leases(), or until the lease expires (after \
+        which they can be checked out by anyone).
+
+        :param fworker: a FWorker object
+        :param n: the maximum number of FireWorks to lease
+        :param lease_secs: the number of seconds before the lease expires
+        :return: a list of the leased fw_ids, by decreasing priority
+        """
+        m_query = self._decorate_query(dict(fworker.query))
+        fw_dicts = OrderedDict([(fw['fw_id'], fw) for fw in self.fireworks.find(
+            m_query, {'fw_id': 1, 'state': 1, 'launches': 1, 'lease_owner': 1, 'lease_expires': 1},
+            sort=[("spec._priority", DESCENDING)], limit=n)])
+        fw_ids = fw_dicts.keys()
+        if not fw_ids:
+            return []
+
+        m_query = {'$and': [m_query, {'fw_id': {'$in': fw_ids}}]}  # make sure nobody took them in the meantime
+        lease_expires = datetime.datetime.utcnow() + datetime.timedelta(seconds=lease_secs)
+        self.fireworks.update(m_query, {'$set': {'state': 'RESERVED', 'lease_owner': self._lease_owner,
+                                                 'lease_expires': lease_expires}}, multi=True,
+                              **self._write_options['state'])
+
+        leased_ids = set([fw['fw_id'] for fw in self.fireworks.find({'fw_id': {'$in': fw_ids},
+                                                                     'lease_owner': self._lease_owner,
+                                                                     'lease_expires': lease_expires}, {'fw_id': 1})])
+        leased_ids = [fw_id for fw_id in fw_ids if fw_id in leased_ids]
+        self._supersede_launches([fw_dicts[fw_id] for fw_id in leased_ids])
+        self._log_events([{'fw_id': fw_id, 'old_state': fw_dicts[fw_id]['state'], 'state': 'RESERVED',
+                           'worker': fworker.name} for fw_id in leased_ids])
+        self.m_logger.debug('Leased FWs with ids: {}'.format(leased_ids))
+        return leased_ids
+
+    def release_leases(self, fw_ids):
+        """
+        Release FireWorks leased with checkout_many() that were not run, making them READY again.
+
+        :param fw_ids: a list of leased fw_ids
+        """
+        if fw_ids:
+            m_query = {'fw_id': {'$in': list(fw_ids)}, 'state': 'RESERVED', 'lease_owner': self._lease_owner}
+            leased_ids = [fw['fw_id'] for fw in self.fireworks.find(m_query, {'fw_id': 1})]
+            self.fireworks.update(m_query, {'$set': {'state': 'READY'}, '$unset': self.LEASE_FIELDS}, multi=True,
+                                  **self._write_options['state'])
+            self._log_events([{'fw_id': fw_id, 'old_state': 'RESERVED', 'state': 'READY'} for fw_id in leased_ids])
+            self.m_logger.debug('Released leases of FWs with ids: {}'.format(leased_ids))
+
     def _reserve_fw(self, fworker, launch_dir, host=None, ip=None):
         m_fw, lid = self._get_a_fw_to_run(fworker)
         if not m_fw:
             return None, None
             # create a launch
-        # TODO: this code is duplicated with checkout_fw with minimal mods, should refactor this!!
-        launch_id = self.get_new_launch_id()
+        launch_id = self._get_launch_id()
         m_launch = Launch('RESERVED', launch_dir, fworker, host, ip, launch_id=launch_id, fw_id=m_fw.fw_id)
-        self.launches.insert(m_launch.to_db_dict())
+        self.launches.insert(m_launch.to_db_dict(), **self._write_options['state'])
 
-        # add launch to FW
+        # add launch to FW (it is already RESERVED, with its lease)
         m_fw.launches.append(m_launch)
         m_fw.state = 'RESERVED'
-        self._upsert_fws([m_fw])
+        self.fireworks.update({'fw_id': m_fw.fw_id}, {'$push': {'launches': launch_id}},
+                              **self._write_options['state'])
+        self._log_events([{'fw_id': m_fw.fw_id, 'launch_id': launch_id, 'state': 'RESERVED', 'worker': fworker.name}])
         self.m_logger.debug('Reserved FW with id: {}'.format(m_fw.fw_id))
 
         return m_fw, launch_id
 
     def unreserve(self, launch_id):
-        self.launches.update({'launch_id': launch_id}, {'$set': {'state': 'READY'}})
-        self.fireworks.update({'launches': launch_id, 'state': 'RESERVED'}, {'$set': {'state': 'READY'}}, multi=True)
+        """
+        Make reserved FireWorks READY again. Launches that are no longer RESERVED, and FireWorks whose last Launch \
+        is not one of them (e.g. because their expired reservation was taken over), are left alone.
+
+        :param launch_id: the id of the RESERVED Launch, or a list of ids
+        """
+        launch_ids = launch_id if isinstance(launch_id, list) else [launch_id]
+        events = [{'fw_id': l['fw_id'], 'launch_id': l['launch_id'], 'old_state': 'RESERVED', 'state': 'READY'}
+                  for l in self.launches.find({'launch_id': {'$in': launch_ids}, 'state': 'RESERVED'},
+                                              {'fw_id': 1, 'launch_id': 1})]
+        launch_ids = [event['launch_id'] for event in events]
+        if not launch_ids:
+            return
+        # only the FireWorks that are still reserved by these Launches, not those reserved again since
+        fw_ids = [fw['fw_id'] for fw in self.fireworks.find({'launches': {'$in': launch_ids}, 'state': 'RESERVED'},
+                                                            {'fw_id': 1, 'launches': 1})
+                  if fw['launches'][-1] in launch_ids]
+        events.extend([{'fw_id': fw_id, 'old_state': 'RESERVED', 'state': 'READY'} for fw_id in fw_ids])
+        self.launches.update({'launch_id': {'$in': launch_ids}}, {'$set': {'state': 'READY'}}, multi=True,
+                             **self._write_options['state'])
+        self.fireworks.update({'fw_id': {'$in': fw_ids}, 'state': 'RESERVED'}, {'$set': {'state': 'READY'}},
+                              multi=True, **self._write_options['state'])
+        self._log_events(events)
 
     def detect_unreserved(self, expiration_secs=FWConfig().RESERVATION_EXPIRATION_SECS, fix=False):
-        bad_launch_ids = []
-        now_time = datetime.datetime.utcnow()
-        cutoff_timestr = (now_time - datetime.timedelta(seconds=expiration_secs)).isoformat()
-        bad_launch_data = self.launches.find({'state': 'RESERVED', 'state_history': {
-        '$elemMatch': {'state': 'RESERVED', 'updated_on': {'$lte': cutoff_timestr}}}}, {'launch_id': 1})
-        for ld in bad_launch_data:
-            bad_launch_ids.append(ld['launch_id'])
-        if fix:
-            for lid in bad_launch_ids:
-                self.unreserve(lid)
+        """
+        Find the Launches that have been RESERVED (in a queue) for too long, with a range scan of the \
+        (state, time_reserved) index
+
+        :param expiration_secs: how long a Launch may stay reserved
+        :param fix: unreserve the Launches (in bulk)
+        :return: the ids of the Launches
+        """
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=expiration_secs)
+        bad_launch_ids = [ld['launch_id'] for ld in self.launches.find(
+            {'state': 'RESERVED', 'time_reserved': {'$lte': cutoff}}, {'launch_id': 1})]
+        if fix and bad_launch_ids:
+            self.unreserve(bad_launch_ids)
         return bad_launch_ids
 
     def mark_fizzled(self, launch_id):
-        self.launches.update({'launch_id': launch_id}, {'$set': {'state': 'FIZZLED'}})
-        for fw_data in self.fireworks.find({'launches': launch_id}, {'fw_id': 1}):
-            fw_id = fw_data['fw_id']
-            wf = self.get_wf_by_fw_id(fw_id)
-            self._refresh_wf(wf, fw_id)
+        """
+        Mark Launches as FIZZLED and refresh their Workflows (each Workflow is loaded and refreshed once)
+
+        :param launch_id: the id of the Launch, or a list of ids
+        """
+        launch_ids = launch_id if isinstance(launch_id, list) else [launch_id]
+        events = [{'fw_id': l['fw_id'], 'launch_id': l['launch_id'], 'old_state': l['state'], 'state': 'FIZZLED'}
+                  for l in self.launches.find({'launch_id': {'$in': launch_ids}},
+                                              {'fw_id': 1, 'launch_id': 1, 'state': 1})]
+        self.launches.update({'launch_id': {'$in': launch_ids}}, {'$set': {'state': 'FIZZLED'}}, multi=True,
+                             **self._write_options['state'])
+        self._log_events(events)
+        fw_ids = set([fw_data['fw_id'] for fw_data in self.fireworks.find({'launches': {'$in': launch_ids}},
+                                                                          {'fw_id': 1})])
+        while fw_ids:
+            wf = self.get_wf_by_fw_id(min(fw_ids))
+            wf_fw_ids = sorted(fw_ids.intersection(wf.id_fw))
+            self._refresh_wf(wf, wf_fw_ids)
+            fw_ids.difference_update(wf_fw_ids)
 
     def detect_fizzled(self, expiration_secs=FWConfig().RUN_EXPIRATION_SECS, fix=False):
-        bad_launch_ids = []
-        now_time = datetime.datetime.utcnow()
-        cutoff_timestr = (now_time - datetime.timedelta(seconds=expiration_secs)).isoformat()
-        bad_launch_data = self.launches.find({'state': 'RUNNING', 'state_history': {
-        '$elemMatch': {'state': 'RUNNING', 'updated_on': {'$lte': cutoff_timestr}}}}, {'launch_id': 1})
-        for ld in bad_launch_data:
-            bad_launch_ids.append(ld['launch_id'])
-        if fix:
-            for lid in bad_launch_ids:
-                self.mark_fizzled(lid)
+        """
+        Find the RUNNING Launches that have not pinged for too long, with a range scan of the (state, last_pinged) \
+        index
+
+        :param expiration_secs: how long a Launch may go without pinging
+        :param fix: mark the Launches as FIZZLED (in bulk)
+        :return: the ids of the Launches
+        """
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=expiration_secs)
+        bad_launch_ids = [ld['launch_id'] for ld in self.launches.find(
+            {'state': 'RUNNING', 'last_pinged': {'$lte': cutoff}}, {'launch_id': 1})]
+        if fix and bad_launch_ids:
+            self.mark_fizzled(bad_launch_ids)
         return bad_launch_ids
 
+    def _supersede_launches(self, fw_dicts):
+        """
+        (internal method) FireWorks whose lease expired can be reserved or checked out again (see \
+        _decorate_query()). The Launch that held the expired lease is then superseded: a RESERVED Launch is READY \
+        again (as after unreserve()) and a RUNNING Launch is FIZZLED, so that detect_unreserved() and \
+        detect_fizzled() do not reset the FireWork that is now held by the new lease. If the Launch was never \
+        inserted (the Rocket died during _checkout_fw()), its id is removed from the FireWork instead.
+
+        :param fw_dicts: FireWork documents (with the state, launches and lease fields) from before they were \
+        reserved or checked out
+        """
+        now_time = datetime.datetime.utcnow()
+        # FireWorks leased with checkout_many() have no Launch for their lease
+        lease_fw_ids = dict([(fw_dict['launches'][-1], fw_dict['fw_id']) for fw_dict in fw_dicts
+                             if fw_dict['state'] in self.LEASED_STATES and fw_dict['launches'] and
+                             'lease_owner' not in fw_dict and fw_dict.get('lease_expires', now_time) < now_time])
+        if lease_fw_ids:
+            launch_dicts = list(self.launches.find({'launch_id': {'$in': lease_fw_ids.keys()}},
+                                                   {'fw_id': 1, 'launch_id': 1, 'state': 1}))
+            events = []
+            for (old_state, state) in [('RESERVED', 'READY'), ('RUNNING', 'FIZZLED')]:
+                launch_ids = [l['launch_id'] for l in launch_dicts if l['state'] == old_state]
+                if launch_ids:
+                    events.extend([{'fw_id': l['fw_id'], 'launch_id': l['launch_id'], 'old_state': old_state,
+                                    'state': state} for l in launch_dicts if l['launch_id'] in launch_ids])
+                    self.launches.update({'launch_id': {'$in': launch_ids}, 'state': old_state},
+                                         {'$set': {'state': state}}, multi=True, **self._write_options['state'])
+            self._log_events(events)
+            self.m_logger.debug('Superseded Launches with ids: {}'.format([e['launch_id'] for e in events]))
+
+            for l_id in set(lease_fw_ids) - set([l['launch_id'] for l in launch_dicts]):
+                self.fireworks.update({'fw_id': lease_fw_ids[l_id]}, {'$pull': {'launches': l_id}},
+                                      **self._write_options['state'])
+                self.m_logger.debug('Removed the id of a Launch that was never inserted: {}'.format(l_id))
+
     def _set_reservation_id(self, launch_id, reservation_id):
         m_launch = self.get_launch_by_id(launch_id)
         m_launch.set_reservation_id(reservation_id)
-        self.launches.update({'launch_id': launch_id}, m_launch.to_db_dict())
+        self.launches.update({'launch_id': launch_id}, m_launch.to_db_dict(), **self._write_options['history'])
 
 
     def _checkout_fw(self, fworker, launch_dir, fw_id=None, host=None, ip=None):
         """
         (internal method) Finds a FireWork that's ready to be run, marks it as running,
         and returns it to the caller. The caller is responsible for running the FireWork.
+
+        A single find_and_modify marks the FireWork as RUNNING and adds the new launch id (taken from the block of \
+        ids cached by this LaunchPad), and the Launch is then inserted with the id of the FireWork, so an idle poll \
+        costs a single query. The checkout is a lease that the heartbeat renews: if the Rocket dies (even before \
+        inserting its Launch), the FireWork can be checked out again once the lease expires (after \
+        RUN_EXPIRATION_SECS), without running detect_fizzled(); the taken-over Launch is then superseded (see \
+        _supersede_launches()). FireWorks with a _dupefinder need a few more queries to check for duplicates. Note \
+        that the returned FireWork only contains the new Launch, not any previous ones.
         
         :param fworker: A FWorker instance
         :param host: the host making the request (for creating a Launch object)
@@ -336,28 +976,42 @@ class LaunchPad(FWSerializable):
         :param launch_dir: the dir the FW will be run in (for creating a Launch object)
         :return: a FireWork, launch_id tuple
         """
+        m_query = self._get_run_query(fworker, fw_id)
 
-        m_fw, prev_launch_id = self._get_a_fw_to_run(fworker, fw_id)
-        if not m_fw:
-            return None, None
-            # create or update a launch
-        l_id = prev_launch_id if prev_launch_id else self.get_new_launch_id()
-        m_launch = Launch('RUNNING', launch_dir, fworker, host, ip, launch_id=l_id, fw_id=m_fw.fw_id)
-        self.launches.update({'launch_id': l_id}, m_launch.to_db_dict(), upsert=True)
-        self.m_logger.debug('Created/updated Launch with launch_id: {}'.format(l_id))
-
-        # add launch to FW
-        if not prev_launch_id:
-            # we're appending a new FireWork
+        while True:
+            l_id = self._get_launch_id(consume=False)
+            lease_expires = datetime.datetime.utcnow() + datetime.timedelta(seconds=FWConfig().RUN_EXPIRATION_SECS)
+            m_update = {'$set': {'state': 'RUNNING', 'lease_expires': lease_expires}, '$push': {'launches': l_id},
+                        '$unset': {'lease_owner': 1}}
+            fw_dict = self.fireworks.find_and_modify(query=m_query, update=m_update,
+                                                     sort=[("spec._priority", DESCENDING)])
+            if not fw_dict:
+                return None, None
+            self._get_launch_id()
+            self._supersede_launches([fw_dict])
+            old_state = fw_dict['state']
+
+            # FireWorks reserved in a queue were already checked for duplicates by _get_a_fw_to_run()
+            if '_dupefinder' in fw_dict['spec'] and (fw_dict['state'] == 'READY' or 'lease_owner' in fw_dict):
+                thief_fw = self._hydrate_fws([dict(fw_dict)])[0]
+                # the upsert of a duplicate removes the new launch id from the FireWork
+                if not self._check_fw_for_uniqueness(thief_fw, old_state, fworker):
+                    continue
+
+            m_launch = Launch('RUNNING', launch_dir, fworker, host, ip, launch_id=l_id, fw_id=fw_dict['fw_id'])
+            self.launches.insert(m_launch.to_db_dict(), **self._write_options['state'])
+            self._log_events([{'fw_id': m_launch.fw_id, 'old_state': old_state, 'state': 'RUNNING',
+                               'worker': fworker.name},
+                              {'fw_id': m_launch.fw_id, 'launch_id': l_id, 'state': 'RUNNING', 'worker': fworker.name}])
+            self.m_logger.debug('Created Launch with launch_id: {}'.format(l_id))
+
+            fw_dict['launches'] = []
+            fw_dict['state'] = 'RUNNING'
+            m_fw = FireWork.from_dict(fw_dict)
             m_fw.launches.append(m_launch)
-        else:
-            # we're updating an existing launch
-            m_fw.launches = [m_launch if l.launch_id == m_launch.launch_id else l for l in m_fw.launches]
-        m_fw.state = 'RUNNING'
-        self._upsert_fws([m_fw])
-        self.m_logger.debug('Checked out FW with id: {}'.format(m_fw.fw_id))
+            self.m_logger.debug('Checked out FW with id: {}'.format(m_fw.fw_id))
 
-        return m_fw, l_id
+            return m_fw, l_id
 
     def _complete_launch(self, launch_id, action, state='COMPLETED'):
         """
@@ -367,31 +1021,90 @@ class LaunchPad(FWSerializable):
         """
         # update the launch data to COMPLETED, set end time, etc
         m_launch = self.get_launch_by_id(launch_id)
+        old_state = m_launch.state
         m_launch.state = state
         m_launch.action = action
-        self.launches.update({'launch_id': launch_id}, m_launch.to_db_dict())
+        launch_dict = m_launch.to_db_dict()
+        if launch_dict['action']:
+            # large values go to blobs, so that reading the Launch does not load them
+            for field in ['stored_data', 'mod_spec']:
+                offload_values(launch_dict['action'][field], self.backend, FWConfig().BLOB_THRESHOLD_BYTES)
+        self.launches.update({'launch_id': launch_id}, launch_dict, **self._write_options['state'])
+        self._log_events([{'fw_id': m_launch.fw_id, 'launch_id': launch_id, 'old_state': old_state, 'state': state,
+                           'worker': m_launch.fworker.name}])
 
         # find all the fws that have this launch
         for fw in self.fireworks.find({'launches': launch_id}, {'fw_id': 1}):
             fw_id = fw['fw_id']
             self._refresh_wf(self.get_wf_by_fw_id(fw_id), fw_id)
 
+    def _load_blobs_lazily(self, m_launch):
+        """
+        (internal method) make the values of the FWAction of a Launch that were offloaded to blobs (see \
+        _complete_launch()) load when they are accessed
+
+        :param m_launch: a Launch object created from a Launch document
+        :return: the Launch
+        """
+        if m_launch.action:
+            for field in ['stored_data', 'mod_spec']:
+                m_dict = getattr(m_launch.action, field)
+                if any([is_blob_ref(v) for v in m_dict.itervalues()]):
+                    setattr(m_launch.action, field, LazyBlobDict(
+                        m_dict, self.backend, lambda key, value, field=field: FWAction.decode_value(field, key, value)))
+        return m_launch
+
     def _ping_launch(self, launch_id):
-        m_launch = self.get_launch_by_id(launch_id)
-        m_launch.touch_history()
-        self.launches.update({'launch_id': launch_id}, m_launch.to_db_dict())
+        self._ping_launches([launch_id])
+
+    def _ping_launches(self, launch_ids):
+        """
+        (internal method) ping that the Launches are still alive, with a single update
 
-    def get_new_fw_id(self):
+        :param launch_ids: ids of the running Launches
+        """
+        # single field updates, so the cost of a heartbeat does not depend on the size of the Launch
+        now_time = datetime.datetime.utcnow()
+        self.launches.update({'launch_id': {'$in': list(launch_ids)}, 'state': 'RUNNING'},
+                             {'$set': {'last_pinged': now_time}}, multi=True, **self._write_options['heartbeat'])
+        # renew the leases of the running FireWorks
+        lease_expires = now_time + datetime.timedelta(seconds=FWConfig().RUN_EXPIRATION_SECS)
+        self.fireworks.update({'launches': {'$in': list(launch_ids)}, 'state': 'RUNNING'},
+                              {'$set': {'lease_expires': lease_expires}}, multi=True,
+                              **self._write_options['heartbeat'])
+
+    def get_new_fw_id(self, quantity=1):
         """
         Checkout the next FireWork id
+
+        :param quantity: number of ids to reserve at once; the first id of the contiguous block is returned
         """
-        return self.fw_id_assigner.find_and_modify(query={}, update={'$inc': {'next_fw_id': 1}})['next_fw_id']
+        return self.backend.increment_counter('fw_id_assigner', 'next_fw_id', quantity)
 
-    def get_new_launch_id(self):
+    def get_new_launch_id(self, quantity=1):
         """
         Checkout the next Launch id
+
+        :param quantity: number of ids to reserve at once; the first id of the contiguous block is returned
         """
-        return self.fw_id_assigner.find_and_modify(query={}, update={'$inc': {'next_launch_id': 1}})['next_launch_id']
+        return self.backend.increment_counter('fw_id_assigner', 'next_launch_id', quantity)
+
+    def _get_launch_id(self, consume=True):
+        """
+        (internal method) Get a new launch id from the block of ids cached by this LaunchPad. A new block of \
+        LAUNCH_ID_BLOCK_SIZE ids is reserved in the DB whenever the cached block runs out.
+
+        :param consume: if False, the id is returned but stays available for the next call
+        """
+        if self._next_launch_id is None or self._next_launch_id >= self._launch_id_block_end:
+            block_size = FWConfig().LAUNCH_ID_BLOCK_SIZE
+            self._next_launch_id = self.get_new_launch_id(block_size)
+            self._launch_id_block_end = self._next_launch_id + block_size
+
+        launch_id = self._next_launch_id
+        if consume:
+            self._next_launch_id += 1
+        return launch_id
 
     def _upsert_fws(self, fws):
         old_new = {} # mapping between old and new FireWork ids
@@ -400,7 +1113,7 @@ class LaunchPad(FWSerializable):
                 new_id = self.get_new_fw_id()
                 old_new[fw.fw_id] = new_id
                 fw.fw_id = new_id
-            self.fireworks.update({'fw_id': fw.fw_id}, fw.to_db_dict(), upsert=True)
+            self.fireworks.update({'fw_id': fw.fw_id}, fw.to_db_dict(), upsert=True, **self._write_options['state'])
 
         return old_new
 
@@ -409,25 +1122,55 @@ class LaunchPad(FWSerializable):
         """
         Update the FW state of all jobs in workflow
         :param wf: a Workflow object
-        :param fw_id: the parent fw_id - children will be refreshed
+        :param fw_id: the parent fw_id - children will be refreshed (or a list of fw_ids of the Workflow)
         """
         # TODO: time how long it took to refresh the WF!
         # TODO: need a try-except here, high probability of failure if incorrect action supplied
 
-        updated_ids = wf.refresh(fw_id)
+        fw_ids = fw_id if isinstance(fw_id, list) else [fw_id]
+        old_states = dict([(m_fw_id, m_fw.state) for (m_fw_id, m_fw) in wf.id_fw.iteritems()])
+        old_links = wf.links.to_db_dict()
+        old_state_counts = wf.state_counts()
+        updated_ids = set()
+        for m_fw_id in fw_ids:
+            updated_ids = wf.refresh(m_fw_id, updated_ids)
         updated_fws = [wf.id_fw[fid] for fid in updated_ids]
         old_new = self._upsert_fws(updated_fws)
         wf._reassign_ids(old_new)
-        # redo the links
-        self.links.update({'nodes': fw_id}, wf.to_db_dict())
+        # update only what changed in the links document: the links that FWActions added, and the state summary
+        m_update = wf.links.db_update(old_links)
+        state_dict = wf.state_db_dict()
+        if m_update or state_dict['state_counts'] != old_state_counts:
+            m_update.setdefault('$set', {}).update(state_dict)
+            self.links.update({'nodes': fw_ids[0]}, m_update, **self._write_options['state'])
+        # new FireWorks (added by FWActions) were not in old_states
+        self._log_events([{'fw_id': fw.fw_id, 'old_state': old_states.get(fw.fw_id), 'state': fw.state}
+                          for fw in updated_fws if fw.state != old_states.get(fw.fw_id)])
+
+    def _log_events(self, events):
+        """
+        (internal method) append state transitions to the events collection, with consecutive sequence numbers. \
+        This must be called after the states are updated (see wait_for_ready()).
+
+        :param events: a list of dicts with the fw_id, launch_id (for Launches), old_state, state and worker of \
+        each transition (missing keys are None)
+        """
+        if events:
+            seq = self.backend.increment_counter('fw_id_assigner', 'next_event_seq', len(events))
+            now_time = datetime.datetime.utcnow()
+            self.events.insert([dict([(key, event.get(key)) for key in self.EVENT_KEYS], seq=seq + i, time=now_time)
+                                for (i, event) in enumerate(events)], **self._write_options['history'])
 
     def _steal_launches(self, thief_fw):
         stolen = False
         if thief_fw.state == 'READY' and '_dupefinder' in thief_fw.spec:
-            m_dupefinder = load_object(thief_fw.spec['_dupefinder'])
+            m_dupefinder = thief_fw.spec['_dupefinder']
+            if not isinstance(m_dupefinder, DupeFinderBase):
+                m_dupefinder = load_object(m_dupefinder)
             # get the query that will limit the number of results to check as duplicates
             m_query = m_dupefinder.query(thief_fw.spec)
             m_query['launches'] = {'$ne': []}
+            m_query['fw_id'] = {'$ne': thief_fw.fw_id}
             # iterate through all potential duplicates in the DB
             for potential_match in self.fireworks.find(m_query):
                 spec1 = dict(thief_fw.to_dict()['spec'])  # defensive copy
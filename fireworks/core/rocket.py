@@ -19,10 +19,71 @@ __email__ = 'ajain@lbl.gov'
 __date__ = 'Feb 7, 2013'
 
 
-def ping_launch(launchpad, launch_id, stop_event):
-    while not stop_event.is_set():
-        launchpad._ping_launch(launch_id)
-        stop_event.wait(FWConfig().PING_TIME_SECS)
+class HeartbeatService(object):
+    """
+    Pings the LaunchPad that the Launches of the running Rockets of a process are still alive. A single thread \
+    sends one (bulk) update per LaunchPad every FWConfig().PING_TIME_SECS, however many Rockets are running.
+    """
+
+    def __init__(self):
+        self._launches = {}  # LaunchPad to the set of ids of its running Launches
+        self._condition = threading.Condition()
+        self._thread = None
+        self._pid = os.getpid()
+
+    def register(self, launchpad, launch_id):
+        """
+        Start pinging a Launch. Its first ping is at most PING_TIME_SECS away (a Launch is checked out as pinged).
+
+        :param launchpad: the LaunchPad of the Launch
+        :param launch_id: the id of the running Launch
+        """
+        if self._pid != os.getpid():
+            # the thread of the parent process does not exist in a forked process
+            self.__init__()
+        with self._condition:
+            self._launches.setdefault(launchpad, set()).add(launch_id)
+            if not self._thread:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+
+    def unregister(self, launchpad, launch_id):
+        """
+        Stop pinging a Launch.
+
+        :param launchpad: the LaunchPad of the Launch
+        :param launch_id: the id of the Launch
+        """
+        with self._condition:
+            launch_ids = self._launches.get(launchpad, set())
+            launch_ids.discard(launch_id)
+            if not launch_ids:
+                self._launches.pop(launchpad, None)
+            if not self._launches:
+                self._condition.notify()  # lets the thread exit
+
+    def _run(self):
+        next_ping = time.time() + FWConfig().PING_TIME_SECS
+        while True:
+            with self._condition:
+                while self._launches and time.time() < next_ping:
+                    self._condition.wait(next_ping - time.time())
+                if not self._launches:
+                    self._thread = None
+                    return
+                pings = [(launchpad, list(launch_ids)) for launchpad, launch_ids in self._launches.items()]
+
+            for launchpad, launch_ids in pings:
+                try:
+                    launchpad._ping_launches(launch_ids)
+                except Exception:
+                    launchpad.m_logger.error('Could not ping launches {}:\n{}'.format(launch_ids,
+                                                                                  traceback.format_exc()))
+            next_ping = time.time() + FWConfig().PING_TIME_SECS
+
+
+HEARTBEAT_SERVICE = HeartbeatService()
 
 
 class Rocket():
@@ -68,26 +129,25 @@ class Rocket():
         # TODO: support stored_dict update() rather than overwrite
 
         # set up heartbeat (pinging the server that we're still alive)
-        ping_stop = threading.Event()
-        ping_thread = threading.Thread(target=ping_launch,  args=(lp, launch_id, ping_stop))
-        ping_thread.start()
-
-        for my_task in m_fw.tasks:
-            try:
-                m_action = my_task.run_task(m_fw.spec)
-                # TODO: allow a program to write the decision to a file...
-                # TODO: allow a BREAK action to modify flow
-                if not m_action:
-                    m_action = FWAction('CONTINUE')
-
-                if m_action.command != 'CONTINUE':
-                    break;
-            except:
-                m_action = FWAction('BREAK', {'_message': 'runtime error during task', '_task': my_task.to_dict(), '_exception': traceback.format_exc()})
-                lp._complete_launch(launch_id, m_action, 'FIZZLED')
-                return
+        HEARTBEAT_SERVICE.register(lp, launch_id)
+        state = 'COMPLETED'
+        try:
+            for my_task in m_fw.tasks:
+                try:
+                    m_action = my_task.run_task(m_fw.spec)
+                    # TODO: allow a program to write the decision to a file...
+                    # TODO: allow a BREAK action to modify flow
+                    if not m_action:
+                        m_action = FWAction('CONTINUE')
+
+                    if m_action.command != 'CONTINUE':
+                        break;
+                except:
+                    m_action = FWAction('BREAK', {'_message': 'runtime error during task', '_task': my_task.to_dict(), '_exception': traceback.format_exc()})
+                    state = 'FIZZLED'
+                    break
+        finally:
+            HEARTBEAT_SERVICE.unregister(lp, launch_id)
 
         # perform finishing operation
-        ping_stop.set()
-        lp._complete_launch(launch_id, m_action)
-
+        lp._complete_launch(launch_id, m_action, state)
@@ -26,7 +26,8 @@ def launch_rocket(launchpad, fworker=None, logdir=None, strm_lvl=None, fw_id=Non
     l_logger.info('Rocket finished')
 
 
-def rapidfire(launchpad, fworker=None, m_dir=None, logdir=None, strm_lvl=None, nlaunches=0, sleep_time=60, max_loops=-1):
+def rapidfire(launchpad, fworker=None, m_dir=None, logdir=None, strm_lvl=None, nlaunches=0, sleep_time=60, max_loops=-1,
+              prefetch=0):
     """
     Keeps running Rockets in m_dir until we reach an error. Automatically creates subdirectories for each Rocket.
     Usually stops when we run out of FireWorks from the LaunchPad.
@@ -35,6 +36,8 @@ def rapidfire(launchpad, fworker=None, m_dir=None, logdir=None, strm_lvl=None, n
     :param fworker: a FWorker object
     :param m_dir: the directory in which to loop Rocket running
     :param nlaunches: 0 means 'until completion', -1 means 'infinity'
+    :param prefetch: if > 0, lease this many FireWorks at a time and run them back to back, instead of checking for \
+    a FireWork to run before every launch. Leases that were not used are released when the batch exits.
     """
     curdir = m_dir if m_dir else os.getcwd()
     fworker = fworker if fworker else FWorker()
@@ -47,20 +50,32 @@ def rapidfire(launchpad, fworker=None, m_dir=None, logdir=None, strm_lvl=None, n
     num_launched = 0
     num_loops = 0
     while num_loops != max_loops:
-        while launchpad.run_exists():
-            os.chdir(curdir)
-            launcher_dir = create_datestamp_dir(curdir, l_logger, prefix='launcher_')
-            os.chdir(launcher_dir)
-            launch_rocket(launchpad, fworker, logdir, strm_lvl)
-            num_launched += 1
-            if num_launched == nlaunches:
+        while True:
+            if prefetch > 0:
+                n_lease = prefetch if nlaunches <= 0 else min(prefetch, nlaunches - num_launched)
+                fw_ids = launchpad.checkout_many(fworker, n_lease)
+            else:
+                fw_ids = [None] if launchpad.run_exists() else []
+            if not fw_ids:
                 break
-            time.sleep(0.1)  # add a small amount of buffer breathing time for DB to refresh, etc.
+
+            try:
+                while fw_ids and (nlaunches <= 0 or num_launched < nlaunches):
+                    os.chdir(curdir)
+                    launcher_dir = create_datestamp_dir(curdir, l_logger, prefix='launcher_')
+                    os.chdir(launcher_dir)
+                    launch_rocket(launchpad, fworker, logdir, strm_lvl, fw_ids.pop(0))
+                    num_launched += 1
+            finally:
+                launchpad.release_leases([fw_id for fw_id in fw_ids if fw_id])
+
+            if 0 < nlaunches <= num_launched:
+                break
+            if not prefetch:
+                time.sleep(0.1)  # add a small amount of buffer breathing time for DB to refresh, etc.
         if num_launched == nlaunches or nlaunches == 0:
             break
-        l_logger.info('Sleeping for {} secs'.format(sleep_time))
-        time.sleep(sleep_time)
+        l_logger.info('Waiting up to {} secs for FWs to become ready'.format(sleep_time))
+        launchpad.wait_for_ready(fworker, sleep_time)
         num_loops += 1
         l_logger.info('Checking for FWs to run...'.format(sleep_time))
-
-
@@ -1,5 +1,7 @@
 from StringIO import StringIO
-from collections import defaultdict
+from collections import deque
+import datetime
+from heapq import heappush, heappop
 import tarfile
 from fireworks.core.firework import FireWork
 from fireworks.utilities.dict_mods import apply_mod
@@ -14,8 +16,197 @@ __date__ = 'Feb 27, 2013'
 
 
 class Workflow(FWSerializable):
-    # TODO: if performance of parent_links is an issue, override delitem/setitem to ensure it's always updated
     class Links(dict, FWSerializable):
+        """
+        A dict of parent FireWork id to a list of child FireWork ids. The reverse (child to parents) links, the \
+        root ids and the topological ranks (once computed) are updated whenever links are set or deleted, or a list \
+        of children is modified in-place, so they never need to be rebuilt from scratch.
+        """
+
+        class ChildList(list):
+            """
+            The list of children of a FireWork, which updates the reverse links of the Links it belongs to when it \
+            is modified in-place. It is detached (becomes a plain list) once it is replaced in the Links.
+            """
+
+            def __init__(self, links, parent, children):
+                list.__init__(self, children)
+                self._links = links
+                self._parent = parent
+
+            def _modify(self, method, *args):
+                old_children = list(self)
+                result = method(self, *args)
+                if self._links is not None:
+                    self._links._relink(self._parent, old_children, self)
+                return result
+
+            def append(self, child):
+                self._modify(list.append, child)
+
+            def extend(self, children):
+                self._modify(list.extend, children)
+
+            def insert(self, index, child):
+                self._modify(list.insert, index, child)
+
+            def remove(self, child):
+                self._modify(list.remove, child)
+
+            def pop(self, *args):
+                return self._modify(list.pop, *args)
+
+            def __setitem__(self, index, child):
+                self._modify(list.__setitem__, index, child)
+
+            def __delitem__(self, index):
+                self._modify(list.__delitem__, index)
+
+            def __setslice__(self, i, j, children):
+                self._modify(list.__setslice__, i, j, children)
+
+            def __delslice__(self, i, j):
+                self._modify(list.__delslice__, i, j)
+
+            def __iadd__(self, children):
+                self._modify(list.extend, children)
+                return self
+
+            def __imul__(self, n):
+                return self._modify(list.__imul__, n)
+
+            def __reduce__(self):
+                # copies are plain lists, not attached to any Links
+                return list, (list(self),)
+
+        def __init__(self, *args, **kwargs):
+            dict.__init__(self)
+            self._parent_links = {}  # child id to list of parent ids
+            self._root_ids = set()
+            self._ranks = None  # fw_id to topological rank, see get_rank()
+            self.update(*args, **kwargs)
+
+        def __setitem__(self, parent, children):
+            if parent in self:
+                self._detach(parent)
+            elif parent not in self._parent_links:
+                self._root_ids.add(parent)
+
+            children = self.ChildList(self, parent, children)
+            dict.__setitem__(self, parent, children)
+            self._link(parent, children)
+
+        def __delitem__(self, parent):
+            self._detach(parent)
+            self._root_ids.discard(parent)
+            dict.__delitem__(self, parent)
+
+        def update(self, *args, **kwargs):
+            for (parent, children) in dict(*args, **kwargs).iteritems():
+                self[parent] = children
+
+        def setdefault(self, parent, children=None):
+            if parent not in self:
+                self[parent] = children if children else []
+            return self[parent]
+
+        def pop(self, parent, *args):
+            if parent not in self and args:
+                return args[0]
+            children = self[parent]
+            del self[parent]
+            return children
+
+        def popitem(self):
+            parent = next(self.iterkeys())
+            return parent, self.pop(parent)
+
+        def clear(self):
+            for parent in self:
+                dict.__getitem__(self, parent)._links = None
+            dict.clear(self)
+            self._parent_links = {}
+            self._root_ids = set()
+            self._ranks = None
+
+        def __reduce__(self):
+            # rebuild the reverse links on copy rather than copying them
+            return self.__class__, (dict(self),)
+
+        def _link(self, parent, children):
+            """
+            (internal method) add the reverse links from children to a parent
+            """
+            for child in children:
+                self._parent_links.setdefault(child, []).append(parent)
+                self._root_ids.discard(child)
+            if self._ranks is not None:
+                self._update_ranks(parent)
+
+        def _unlink(self, parent, children):
+            """
+            (internal method) remove the reverse links from children to a parent
+            """
+            for child in children:
+                parents = self._parent_links[child]
+                parents.remove(parent)
+                if not parents:
+                    del self._parent_links[child]
+                    if child in self:
+                        self._root_ids.add(child)
+
+        def _relink(self, parent, old_children, children):
+            """
+            (internal method) update the reverse links after the children of a parent were modified in-place
+            """
+            self._unlink(parent, old_children)
+            self._link(parent, children)
+
+        def _detach(self, parent):
+            """
+            (internal method) remove the reverse links of a parent whose list of children is being replaced
+            """
+            children = dict.__getitem__(self, parent)
+            children._links = None
+            self._unlink(parent, children)
+
+        def get_rank(self, fw_id):
+            """
+            The topological rank of a FireWork: every FireWork has a higher rank than all of its parents. The ranks \
+            are computed for the whole Workflow the first time they are needed, and updated when links are added.
+
+            :param fw_id: the id of a FireWork
+            :return: (int) the rank
+            """
+            if self._ranks is None:
+                ranks = dict([(node, 0) for node in self._root_ids])
+                n_pending = dict([(child, len(parents)) for (child, parents) in self._parent_links.iteritems()])
+                queue = deque(self._root_ids)
+                while queue:
+                    parent = queue.popleft()
+                    rank = ranks[parent] + 1
+                    for child in self.get(parent, ()):
+                        if ranks.get(child, 0) < rank:
+                            ranks[child] = rank
+                        n_pending[child] -= 1
+                        if not n_pending[child]:
+                            queue.append(child)
+                self._ranks = ranks
+            return self._ranks[fw_id]
+
+        def _update_ranks(self, parent):
+            """
+            (internal method) raise the ranks of the descendants of a parent whose children changed, until every \
+            child again has a higher rank than its parents (removed links leave the ranks valid)
+            """
+            self._ranks.setdefault(parent, 0)
+            stack = [parent]
+            while stack:
+                node = stack.pop()
+                for child in self.get(node, []):
+                    if self._ranks.get(child, -1) <= self._ranks[node]:
+                        self._ranks[child] = self._ranks[node] + 1
+                        stack.append(child)
 
         @property
         def nodes(self):
@@ -23,23 +214,58 @@ class Workflow(FWSerializable):
 
         @property
         def parent_links(self):
-            d = defaultdict(list)
-            for (parent, children) in self.iteritems():
-                # add the parents
-                for child in children:
-                    d[child].append(parent)
-            return dict(d)
+            """
+            :return: a dict of child id to a list of parent ids. This is the cached copy, do not modify it!
+            """
+            return self._parent_links
+
+        @property
+        def root_ids(self):
+            """
+            :return: (set) ids of the FireWorks without any parents. This is the cached copy, do not modify it!
+            """
+            return self._root_ids
 
         def to_dict(self):
-            return dict(self)
+            return dict([(k, list(v)) for (k, v) in self.iteritems()])
 
         def to_db_dict(self):
             # convert to str form for Mongo, which cannot have int keys
             m_dict = {'links': dict([(str(k), list(v)) for (k, v) in self.iteritems()]),
-                      'parent_links': dict([(str(k), v) for (k, v) in self.parent_links.iteritems()]),
+                      'parent_links': dict([(str(k), list(v)) for (k, v) in self.parent_links.iteritems()]),
                       'nodes': self.nodes}
             return m_dict
 
+        def db_update(self, old_db_dict):
+            """
+            :param old_db_dict: the to_db_dict() of the Links before they were changed
+            :return: a Mongo update that turns the stored old_db_dict into to_db_dict(), by setting (or unsetting) \
+            only the changed entries of links and parent_links and adding the new nodes; {} if nothing changed
+            """
+            new_db_dict = self.to_db_dict()
+            m_set, m_unset = {}, {}
+            for field in ['links', 'parent_links']:
+                old_links, new_links = old_db_dict[field], new_db_dict[field]
+                for (k, v) in new_links.iteritems():
+                    if k not in old_links or sorted(old_links[k]) != sorted(v):
+                        m_set['{}.{}'.format(field, k)] = v
+                for k in old_links:
+                    if k not in new_links:
+                        m_unset['{}.{}'.format(field, k)] = 1
+
+            m_update = {}
+            old_nodes = set(old_db_dict['nodes'])
+            new_nodes = [n for n in new_db_dict['nodes'] if n not in old_nodes]
+            if len(old_nodes) + len(new_nodes) != len(new_db_dict['nodes']):
+                m_set['nodes'] = new_db_dict['nodes']  # nodes were removed
+            elif new_nodes:
+                m_update['$addToSet'] = {'nodes': {'$each': new_nodes}}
+            if m_set:
+                m_update['$set'] = m_set
+            if m_unset:
+                m_update['$unset'] = m_unset
+            return m_update
+
         @classmethod
         def from_dict(cls, m_dict):
             m_dict = dict([(int(k), list(v)) for (k, v) in m_dict.iteritems()])
@@ -65,10 +291,10 @@ class Workflow(FWSerializable):
             if fw.fw_id not in links_dict:
                 links_dict[fw.fw_id] = []
 
-            # transform any non-iterable values to iterables
-            for k, v in links_dict.iteritems():
-                if not isinstance(v, list):
-                    links_dict[k] = [v]
+        # transform any non-iterable values to iterables
+        for k, v in links_dict.iteritems():
+            if not isinstance(v, list):
+                links_dict[k] = [v]
 
         self.links = Workflow.Links(links_dict)
 
@@ -99,7 +325,7 @@ class Workflow(FWSerializable):
 
         if action.command == 'CREATE':
             create_fw = action.mod_spec['create_fw']
-            self.links[fw_id].append(create_fw.fw_id)
+            self.links[fw_id] = self.links[fw_id] + [create_fw.fw_id]
             self.links[create_fw.fw_id] = []  # TODO: allow this to be children of original FW
             self.id_fw[create_fw.fw_id] = create_fw
             updated_ids.append(create_fw.fw_id)
@@ -108,16 +334,48 @@ class Workflow(FWSerializable):
         return updated_ids
 
     def refresh(self, fw_id, updated_ids=None):
-        #TODO: document this better
+        """
+        Refresh the state of a FireWork and, if its state changed, of its descendants. Only the children of \
+        FireWorks whose state changed (including children added by their FWActions) are refreshed, in order of \
+        their topological rank (see Links.get_rank()), so every FireWork's state is recomputed at most once and \
+        after all of its parents (even in diamond-shaped Workflows). The cost depends on the number of FireWorks \
+        that change, not on the size of the Workflow, and no recursion is needed for long chains.
+
+        :param fw_id: the id of the FireWork to start refreshing from
+        :param updated_ids: (set) ids that are already known to be updated
+        :return: (set) ids of all the FireWorks that were updated
+        """
+
+        updated_ids = set(updated_ids) if updated_ids else set()
+
+        queue = [(self.links.get_rank(fw_id), fw_id)]
+        queued_ids = set([fw_id])
+        while queue:
+            parent_id = heappop(queue)[1]
+            if self._refresh_fw(parent_id, updated_ids):
+                for child_id in self.links[parent_id]:
+                    if child_id not in queued_ids:
+                        queued_ids.add(child_id)
+                        heappush(queue, (self.links.get_rank(child_id), child_id))
+
+        return updated_ids
+
+    def _refresh_fw(self, fw_id, updated_ids):
+        """
+        (internal method) Recompute the state of a single FireWork from the states of its parents and its Launches, \
+        applying the FWAction of the FireWork if it just COMPLETED.
 
-        updated_ids = updated_ids if updated_ids else set()
+        :param fw_id: the id of the FireWork to refresh
+        :param updated_ids: (set) ids of updated FireWorks, modified in place
+        :return: (bool) whether the state of the FireWork changed
+        """
 
         fw = self.id_fw[fw_id]
         prev_state = fw.state
 
         # if we're defused, just skip altogether
         if fw.state == 'DEFUSED':
-            return updated_ids
+            return False
 
         # what are the parent states?
         parent_states = [self.id_fw[p].state for p in self.links.parent_links.get(fw_id, [])]
@@ -141,23 +399,48 @@ class Workflow(FWSerializable):
 
         fw.state = m_state
 
-        if m_state != prev_state:
-            if m_state == 'COMPLETED':
-                updated_ids = updated_ids.union(self.apply_action(m_action, fw.fw_id))
+        if m_state == prev_state:
+            return False
 
-            updated_ids.add(fw_id)
-            # refresh all the children
-            for child_id in self.links[fw_id]:
-                updated_ids = updated_ids.union(self.refresh(child_id, updated_ids))
+        if m_state == 'COMPLETED':
+            updated_ids.update(self.apply_action(m_action, fw.fw_id))
 
-        return updated_ids
+        updated_ids.add(fw_id)
+        return True
 
     @property
     def root_fw_ids(self):
-        all_ids = set(self.links.nodes)
-        child_ids = set(self.links.parent_links.keys())
-        root_ids = all_ids.difference(child_ids)
-        return list(root_ids)
+        return list(self.links.root_ids)
+
+    def state_counts(self):
+        """
+        :return: a dict of state to the number of FireWorks in that state
+        """
+        counts = {}
+        for fw in self.id_fw.itervalues():
+            counts[fw.state] = counts.get(fw.state, 0) + 1
+        return counts
+
+    @property
+    def state(self):
+        """
+        :return: (str) the overall state of the Workflow: COMPLETED once every FireWork is COMPLETED (or DEFUSED/\
+        CANCELED), FIZZLED if any FireWork FIZZLED, RUNNING if any FireWork was started, otherwise READY if any \
+        FireWork is READY, DEFUSED if all FireWorks are DEFUSED/CANCELED, or else WAITING
+        """
+        states = set(self.state_counts())
+        stopped = set(['DEFUSED', 'CANCELED'])
+        if 'COMPLETED' in states and states <= stopped | set(['COMPLETED']):
+            return 'COMPLETED'
+        if 'FIZZLED' in states:
+            return 'FIZZLED'
+        if states & set(['RESERVED', 'RUNNING', 'COMPLETED']):
+            return 'RUNNING'
+        if 'READY' in states:
+            return 'READY'
+        if states <= stopped:
+            return 'DEFUSED'
+        return 'WAITING'
 
     def _reassign_ids(self, old_new):
         # update id_fw
@@ -174,13 +457,22 @@ class Workflow(FWSerializable):
         self.links = Workflow.Links(new_l)
 
     def to_dict(self):
-        return {'fws': [f.to_dict() for f in self.id_fw.itervalues()], 'links': self.links, 'metadata': self.metadata}
+        return {'fws': [f.to_dict() for f in self.id_fw.itervalues()], 'links': self.links.to_dict(),
+                'metadata': self.metadata}
 
     def to_db_dict(self):
         m_dict = self.links.to_db_dict()
         m_dict['metadata'] = self.metadata
+        m_dict.update(self.state_db_dict())
         return m_dict
 
+    def state_db_dict(self):
+        """
+        :return: the fields of the links document that summarize the states, denormalized so that Workflows can \
+        be queried by state without loading their FireWorks
+        """
+        return {'state': self.state, 'state_counts': self.state_counts(), 'updated_on': datetime.datetime.utcnow()}
+
     @classmethod
     def from_dict(cls, m_dict):
         return Workflow([FireWork.from_dict(f) for f in m_dict['fws']], Workflow.Links.from_dict(m_dict['links']))
@@ -143,8 +143,13 @@ def rapidfire(queue_params, launch_dir='.', njobs_queue=10, njobs_block=500, str
 
             if num_launched == nlaunches or nlaunches == 0:
                 break
-            l_logger.info('Finished a round of launches, sleeping for {} secs'.format(sleep_time))
-            time.sleep(sleep_time)
+            if launchpad and not jobs_exist:
+                l_logger.info('Finished a round of launches, waiting up to {} secs for FWs to become ready'.format(
+                    sleep_time))
+                launchpad.wait_for_ready(fworker, sleep_time)
+            else:
+                l_logger.info('Finished a round of launches, sleeping for {} secs'.format(sleep_time))
+                time.sleep(sleep_time)
             l_logger.info('Checking for Rockets to run...'.format(sleep_time))
 
     except:
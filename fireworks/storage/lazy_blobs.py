@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+"""
+Large values of documents (e.g. the stdout stored by a ScriptTask) are offloaded to the blobs of the storage \
+backend (GridFS for MongoDB), and replaced by small references that are loaded again only when they are accessed.
+"""
+import json
+
+__author__ = 'Anubhav Jain'
+__copyright__ = 'Copyright 2013, The Materials Project'
+__version__ = '0.1'
+__maintainer__ = 'Anubhav Jain'
+__email__ = 'ajain@lbl.gov'
+__date__ = 'Oct 18, 2026'
+
+BLOB_KEY = '_blob_id'  # a dict with this key is a reference to a blob, see offload_values()
+
+
+def is_blob_ref(value):
+    """
+    :param value: a value of a document
+    :return: (bool) whether the value is a reference to a blob
+    """
+    return isinstance(value, dict) and BLOB_KEY in value
+
+
+def offload_values(m_dict, backend, threshold):
+    """
+    Replace the values of a dict whose JSON is larger than a threshold by references to blobs, in place.
+
+    :param m_dict: a (serialized) dict, e.g. the stored_data of a Launch document
+    :param backend: the StorageBackend that stores the blobs
+    :param threshold: (bytes) the largest value that is kept in the dict
+    :return: the ids of the new blobs
+    """
+    blob_ids = []
+    for key, value in m_dict.items():
+        if is_blob_ref(value):
+            continue
+        data = json.dumps(value)
+        if len(data) > threshold:
+            blob_ids.append(backend.put_blob(data))
+            m_dict[key] = {BLOB_KEY: blob_ids[-1], 'size': len(data)}
+    return blob_ids
+
+
+class LazyBlobDict(dict):
+    """
+    A dict whose values may be references to blobs (see offload_values()). A referenced value is loaded from the \
+    storage backend the first time it is accessed with [] or get(). Iterating over the items or values gives the \
+    references, so that the dict is serialized (e.g. written back to the database) without the large values.
+    """
+
+    def __init__(self, m_dict, backend, decode=None):
+        """
+        :param m_dict: a dict that may contain references to blobs
+        :param backend: the StorageBackend that stores the blobs
+        :param decode: a function of (key, value) that deserializes a loaded value (default: the JSON value as is)
+        """
+        dict.__init__(self, m_dict)
+        self._backend = backend
+        self._decode = decode if decode else lambda key, value: value
+        self._loaded = {}  # key to the loaded value of a reference
+
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if not is_blob_ref(value):
+            return value
+        if key not in self._loaded:
+            self._loaded[key] = self._decode(key, json.loads(self._backend.get_blob(value[BLOB_KEY])))
+        return self._loaded[key]
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __setitem__(self, key, value):
+        self._loaded.pop(key, None)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self._loaded.pop(key, None)
+        dict.__delitem__(self, key)
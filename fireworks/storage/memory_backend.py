@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+
+"""
+A pure-Python, in-memory storage backend. It needs no database server, so it can be used for tests, benchmarks and \
+single-process pipelines, and it measures the time spent in FireWorks itself (rather than in the database).
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from fireworks.storage.query_engine import copy_doc, match_query, equality_conditions, sort_docs, project, \
+    apply_update, upsert_doc, is_replacement, index_values, aggregate_docs, ResultCursor
+from fireworks.storage.storage_backend import StorageBackend, StorageCollection, DuplicateKeyError
+
+__author__ = 'Anubhav Jain'
+__copyright__ = 'Copyright 2013, The Materials Project'
+__version__ = '0.1'
+__maintainer__ = 'Anubhav Jain'
+__email__ = 'ajain@lbl.gov'
+__date__ = 'Oct 18, 2026'
+
+
+class MemoryCollection(StorageCollection):
+    """
+    A collection of documents held in memory. Equality and $in conditions on indexed keys are looked up in hash \
+    indexes; all other conditions are checked by scanning the documents. All operations are atomic.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.RLock()
+        self.inserted = threading.Condition(self.lock)  # notified whenever documents are inserted
+        self._docs = OrderedDict()  # _id to document, in insertion order
+        self._indexes = {'_id': {}}  # key to {value: set of _ids}
+        self._unique_keys = set(['_id'])
+        self._order = {}  # _id to insertion number
+        self._next_id = 1
+        self.max_size = None  # see cap()
+        self._sizes = {}  # _id to the size of each document of a capped collection
+        self._size = 0
+
+    def find(self, spec=None, fields=None, skip=0, limit=0, sort=None, **kwargs):
+        with self.lock:
+            return ResultCursor(self._find_docs(spec), fields, skip, limit, sort, self.lock,
+                                lambda: self._explain(spec))
+
+    def find_one(self, spec_or_id=None, fields=None, **kwargs):
+        if spec_or_id is not None and not isinstance(spec_or_id, dict):
+            spec_or_id = {'_id': spec_or_id}
+        for doc in self.find(spec_or_id, fields, limit=1, sort=kwargs.get('sort')):
+            return doc
+        return None
+
+    def find_and_modify(self, query=None, update=None, upsert=False, sort=None, fields=None, new=False,
+                        remove=False, **kwargs):
+        with self.lock:
+            docs = self._find_docs(query)
+            sort_docs(docs, sort)
+            if not docs:
+                if upsert and not remove:
+                    doc = upsert_doc(query, update)
+                    self._insert_doc(doc)
+                    return project(doc, fields) if new else None
+                return None
+
+            doc = docs[0]
+            if remove:
+                self._remove_doc(doc)
+                return project(doc, fields)
+            old_doc = project(doc, fields)
+            self._update_doc(doc, update)
+            return project(doc, fields) if new else old_doc
+
+    def update(self, spec, document, upsert=False, multi=False, **kwargs):
+        with self.lock:
+            docs = self._find_docs(spec)
+            if not multi:
+                docs = docs[:1]
+            if multi and docs and is_replacement(document):
+                raise ValueError('multi update only works with $ operators')
+            for doc in docs:
+                self._update_doc(doc, document)
+            if not docs and upsert:
+                self._insert_doc(upsert_doc(spec, document))
+            return {'ok': 1.0, 'err': None, 'n': len(docs) or int(upsert), 'updatedExisting': bool(docs)}
+
+    def insert(self, doc_or_docs, **kwargs):
+        with self.lock:
+            docs = doc_or_docs if isinstance(doc_or_docs, list) else [doc_or_docs]
+            ids = []
+            for doc in docs:
+                m_doc = copy_doc(doc)
+                self._insert_doc(m_doc)
+                doc['_id'] = m_doc['_id']  # pymongo also adds the _id to the inserted documents
+                ids.append(m_doc['_id'])
+            self._trim()
+            return ids if isinstance(doc_or_docs, list) else ids[0]
+
+    def remove(self, spec_or_id=None, **kwargs):
+        with self.lock:
+            if spec_or_id is not None and not isinstance(spec_or_id, dict):
+                spec_or_id = {'_id': spec_or_id}
+            docs = self._find_docs(spec_or_id)
+            for doc in docs:
+                self._remove_doc(doc)
+            return {'ok': 1.0, 'err': None, 'n': len(docs)}
+
+    def ensure_index(self, key_or_list, **kwargs):
+        # compound indexes are only used for their first key
+        key = key_or_list if isinstance(key_or_list, basestring) else key_or_list[0][0]
+        with self.lock:
+            if key not in self._indexes:
+                index = {}
+                for _id, doc in self._docs.iteritems():
+                    for value in index_values(doc, key):
+                        if kwargs.get('unique') and index.get(value):
+                            raise DuplicateKeyError('Duplicate key for unique index {}: {}'.format(key, value))
+                        index.setdefault(value, set()).add(_id)
+                self._indexes[key] = index
+            if kwargs.get('unique'):
+                self._unique_keys.add(key)
+            return '{}_1'.format(key)
+
+    def cap(self, max_size):
+        with self.lock:
+            if self.max_size is None:
+                self._sizes = dict([(_id, self._doc_size(doc)) for (_id, doc) in self._docs.iteritems()])
+                self._size = sum(self._sizes.itervalues())
+            self.max_size = max_size
+            self._trim()
+
+    def aggregate(self, pipeline, **kwargs):
+        with self.lock:
+            # a leading $match can use the indexes
+            if pipeline and '$match' in pipeline[0]:
+                return {'ok': 1.0, 'result': aggregate_docs(self._find_docs(pipeline[0]['$match']), pipeline[1:])}
+            return {'ok': 1.0, 'result': aggregate_docs(self._docs.values(), pipeline)}
+
+    def count(self):
+        return len(self._docs)
+
+    def drop(self):
+        with self.lock:
+            self._docs.clear()
+            self._order.clear()
+            self._indexes = {'_id': {}}
+            self._unique_keys = set(['_id'])
+            self.max_size = None
+            self._sizes = {}
+            self._size = 0
+
+    def _find_docs(self, spec):
+        """
+        (internal method) the stored documents (not copies!) matching a query, in insertion order
+        """
+        candidates = self._candidate_ids(spec)
+        if candidates is None:
+            docs = self._docs.itervalues()
+        else:
+            docs = [self._docs[_id] for _id in sorted(candidates, key=self._order.__getitem__)]
+        return [doc for doc in docs if match_query(doc, spec)]
+
+    def _explain(self, spec):
+        """
+        (internal method) the query plan of a query, see ResultCursor.explain()
+        """
+        with self.lock:
+            candidates = self._candidate_ids(spec)
+            if candidates is None:
+                return {'cursor': 'BasicCursor', 'nscannedObjects': len(self._docs)}
+            return {'cursor': 'BtreeCursor', 'nscannedObjects': len(candidates)}
+
+    def _candidate_ids(self, spec):
+        """
+        (internal method) use the indexes to find the _ids of the documents that might match a query
+
+        :return: a set of _ids, or None if the indexes cannot narrow down the documents
+        """
+        candidates = None
+        for key, values in equality_conditions(spec).iteritems():
+            if key in self._indexes:
+                ids = set()
+                for value in values:
+                    try:
+                        ids.update(self._indexes[key].get(value, ()))
+                    except TypeError:
+                        ids = None  # unhashable value, fall back to a scan
+                        break
+                if ids is not None and (candidates is None or len(ids) < len(candidates)):
+                    candidates = ids
+
+        for sub_spec in (spec or {}).get('$and', []):
+            ids = self._candidate_ids(sub_spec)
+            if ids is not None:
+                candidates = ids if candidates is None else candidates & ids
+
+        if '$or' in (spec or {}):
+            # every clause must be narrowed down, otherwise all documents might match
+            or_ids = [self._candidate_ids(sub_spec) for sub_spec in spec['$or']]
+            if None not in or_ids:
+                ids = set().union(*or_ids)
+                candidates = ids if candidates is None else candidates & ids
+        return candidates
+
+    def _check_unique(self, doc, _id):
+        for key in self._unique_keys:
+            for value in index_values(doc, key):
+                if self._indexes[key].get(value, set()) - set([_id]):
+                    raise DuplicateKeyError('Duplicate key for unique index {}: {}'.format(key, value))
+
+    def _add_to_indexes(self, doc):
+        for key, index in self._indexes.iteritems():
+            for value in index_values(doc, key):
+                index.setdefault(value, set()).add(doc['_id'])
+
+    def _remove_from_indexes(self, doc):
+        for key, index in self._indexes.iteritems():
+            for value in index_values(doc, key):
+                ids = index.get(value)
+                if ids:
+                    ids.discard(doc['_id'])
+                    if not ids:
+                        del index[value]
+
+    def _insert_doc(self, doc):
+        if '_id' not in doc:
+            while self._next_id in self._docs:
+                self._next_id += 1
+            doc['_id'] = self._next_id
+        self._check_unique(doc, doc['_id'])
+        self._docs[doc['_id']] = doc
+        self._order[doc['_id']] = self._next_id
+        self._next_id += 1
+        self._add_to_indexes(doc)
+        if self.max_size is not None:
+            self._sizes[doc['_id']] = self._doc_size(doc)
+            self._size += self._sizes[doc['_id']]
+        self.inserted.notify_all()
+
+    def _update_doc(self, doc, update):
+        new_doc = copy_doc(doc)
+        apply_update(new_doc, update)
+        self._check_unique(new_doc, doc['_id'])
+        self._remove_from_indexes(doc)
+        doc.clear()
+        doc.update(new_doc)
+        self._add_to_indexes(doc)
+
+    def _remove_doc(self, doc):
+        self._remove_from_indexes(doc)
+        del self._docs[doc['_id']]
+        del self._order[doc['_id']]
+        self._size -= self._sizes.pop(doc['_id'], 0)
+
+    def _trim(self):
+        # remove the oldest documents of a capped collection until it fits in max_size
+        while self.max_size is not None and self._size > self.max_size:
+            self._remove_doc(next(self._docs.itervalues()))
+
+    @staticmethod
+    def _doc_size(doc):
+        return len(json.dumps(doc, default=str))
+
+
+class MemoryBackend(StorageBackend):
+    """
+    Stores the collections in memory. LaunchPads (of the same process) with the same database name share the same \
+    collections, e.g. a LaunchPad loaded with LaunchPad.from_file() sees the FireWorks added by another one.
+    """
+
+    _databases = {}  # database name to {collection name: MemoryCollection}
+    _databases_lock = threading.Lock()
+
+    def __init__(self, name='fireworks', **kwargs):
+        """
+        :param name: name of the database
+        :param kwargs: other connection parameters (host, port, etc.) are ignored
+        """
+        self.name = name
+        with MemoryBackend._databases_lock:
+            self._collections = MemoryBackend._databases.setdefault(name, {})
+
+    def get_collection(self, name):
+        with MemoryBackend._databases_lock:
+            if name not in self._collections:
+                self._collections[name] = MemoryCollection(name)
+            return self._collections[name]
+
+    def wait_for_document(self, collection, spec, timeout):
+        deadline = time.time() + timeout
+        with collection.lock:
+            while True:
+                doc = collection.find_one(spec)
+                if doc or time.time() >= deadline:
+                    return doc
+                collection.inserted.wait(max(deadline - time.time(), 0))
+
+    def drop(self):
+        with MemoryBackend._databases_lock:
+            for collection in self._collections.itervalues():
+                collection.drop()
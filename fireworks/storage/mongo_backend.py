@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+"""
+The MongoDB storage backend (the default).
+"""
+import os
+import threading
+import time
+import weakref
+from gridfs import GridFS
+from pymongo.errors import CollectionInvalid
+from pymongo.mongo_client import MongoClient
+from fireworks.core.fw_config import FWConfig
+from fireworks.storage.storage_backend import StorageBackend, DESCENDING
+
+__author__ = 'Anubhav Jain'
+__copyright__ = 'Copyright 2013, The Materials Project'
+__version__ = '0.1'
+__maintainer__ = 'Anubhav Jain'
+__email__ = 'ajain@lbl.gov'
+__date__ = 'Oct 18, 2026'
+
+
+class MongoClientRegistry(object):
+    """
+    Hands out MongoClients that are shared by all the MongoBackends (i.e. LaunchPads) of a process that connect to \
+    the same server with the same credentials, so that a process opens one connection pool per server rather than \
+    one per LaunchPad. A client is re-created in a forked process, and a client that is no longer used is closed \
+    once it has been idle for FWConfig().MONGO_IDLE_TIMEOUT_SECS.
+    """
+
+    def __init__(self, client_class=MongoClient):
+        """
+        :param client_class: the class of the clients (MongoClient)
+        """
+        self.client_class = client_class
+        self._entries = {}  # (host, port, username, password) to dict of client, pid, users, released_on
+        self._lock = threading.RLock()  # re-entrant, as users may be garbage-collected while the lock is held
+
+    def get_client(self, user, host, port, username=None, password=None):
+        """
+        :param user: the object that uses the client (e.g. a MongoBackend). The client is released when the user is \
+        garbage-collected
+        :param host: MongoDB host
+        :param port: MongoDB port
+        :param username: username for the database (None if no authentication is needed)
+        :param password: password for the database
+        :return: a (shared) MongoClient
+        """
+        key = (host, port, username, password)
+        with self._lock:
+            self.close_idle_clients()
+            entry = self._entries.get(key)
+            if not entry or entry['pid'] != os.getpid():
+                # a client must not be used by both sides of a fork, so a forked process makes its own
+                client = self.client_class(host, port, j=True, max_pool_size=FWConfig().MONGO_POOL_SIZE)
+                entry = {'client': client, 'pid': os.getpid(), 'users': set(), 'released_on': None}
+                self._entries[key] = entry
+            entry['users'].add(weakref.ref(user, lambda ref: self._release(entry, ref)))
+            entry['released_on'] = None
+            return entry['client']
+
+    def close_idle_clients(self, idle_secs=None):
+        """
+        Close the clients that have not been used by anyone for a while.
+
+        :param idle_secs: how long (secs) a client must have been unused, FWConfig().MONGO_IDLE_TIMEOUT_SECS if None
+        """
+        idle_secs = FWConfig().MONGO_IDLE_TIMEOUT_SECS if idle_secs is None else idle_secs
+        with self._lock:
+            for key, entry in self._entries.items():
+                if entry['pid'] != os.getpid():
+                    # inherited from the parent process, whose client it still is
+                    del self._entries[key]
+                elif not entry['users'] and time.time() - entry['released_on'] >= idle_secs:
+                    entry['client'].close()
+                    del self._entries[key]
+
+    def _release(self, entry, ref):
+        with self._lock:
+            entry['users'].discard(ref)
+            if not entry['users']:
+                entry['released_on'] = time.time()
+
+
+CLIENT_REGISTRY = MongoClientRegistry()
+
+
+class MongoBackend(StorageBackend):
+    """
+    Stores the collections in a MongoDB database. The collections are pymongo collections. The MongoClient is \
+    shared with the other MongoBackends of the process that use the same server and credentials (see \
+    MongoClientRegistry).
+    """
+
+    def __init__(self, host='localhost', port=27017, name='fireworks', username=None, password=None):
+        """
+        :param host: MongoDB host
+        :param port: MongoDB port
+        :param name: name of the database
+        :param username: username for the database (None if no authentication is needed)
+        :param password: password for the database
+        """
+        self.name = name
+        self.connection = CLIENT_REGISTRY.get_client(self, host, port, username, password)
+        self.database = self.connection[name]
+        if username:
+            # the credentials are cached by the (shared) client
+            self.database.authenticate(username, password)
+
+    def get_collection(self, name):
+        return self.database[name]
+
+    def put_blob(self, data):
+        return self._get_gridfs().put(data)
+
+    def get_blob(self, blob_id):
+        return self._get_gridfs().get(blob_id).read()
+
+    def remove_blobs(self, blob_ids=None):
+        if blob_ids is None:
+            self.database.drop_collection('blobs.files')
+            self.database.drop_collection('blobs.chunks')
+        else:
+            gridfs = self._get_gridfs()
+            for blob_id in blob_ids:
+                gridfs.delete(blob_id)
+
+    def _get_gridfs(self):
+        # the blobs are stored in the 'blobs.files' and 'blobs.chunks' collections
+        return GridFS(self.database, 'blobs')
+
+    def get_capped_collection(self, name, size):
+        if name not in self.database.collection_names():
+            try:
+                self.database.create_collection(name, capped=True, size=size)
+            except CollectionInvalid:
+                pass  # created by another process in the meantime
+        return self.database[name]
+
+    def wait_for_document(self, collection, spec, timeout):
+        deadline = time.time() + timeout
+        while True:
+            doc = collection.find_one(spec)
+            if doc or time.time() >= deadline:
+                return doc
+            last = list(collection.find(sort=[('$natural', DESCENDING)], limit=1))
+            if not last:
+                # a tailable cursor on an empty collection dies right away
+                time.sleep(min(self.POLL_SECS, max(deadline - time.time(), 0)))
+                continue
+            # tail the (capped) collection, where the server holds the cursor open until documents are inserted.
+            # The cursor also matches the last document, otherwise it would die right away
+            cursor = collection.find({'$or': [spec, {'_id': last[0]['_id']}]}, tailable=True, await_data=True)
+            while cursor.alive and time.time() < deadline:
+                for doc in cursor:
+                    if doc['_id'] != last[0]['_id']:
+                        return doc
+
+    def drop(self):
+        self.connection.drop_database(self.name)
@@ -0,0 +1,547 @@
+#!/usr/bin/env python
+
+"""
+A pure-Python implementation of the subset of the MongoDB query language used by FireWorks (queries, updates, \
+projections, sorts and aggregations), for the storage backends that do not run on MongoDB.
+"""
+import datetime
+import re
+import threading
+from collections import OrderedDict
+
+__author__ = 'Anubhav Jain'
+__copyright__ = 'Copyright 2013, The Materials Project'
+__version__ = '0.1'
+__maintainer__ = 'Anubhav Jain'
+__email__ = 'ajain@lbl.gov'
+__date__ = 'Oct 18, 2026'
+
+_NUMBER_TYPES = (int, long, float)
+
+
+def copy_doc(value):
+    """
+    A (much faster) deepcopy for documents, which only contain dicts, lists and immutable values.
+
+    :param value: a document or a value within a document
+    """
+    if isinstance(value, dict):
+        return dict([(k, copy_doc(v)) for (k, v) in value.iteritems()])
+    if isinstance(value, (list, tuple)):
+        return [copy_doc(v) for v in value]
+    return value
+
+
+def get_values(doc, path):
+    """
+    :param doc: a document
+    :param path: a (dotted) key, e.g. 'spec._priority'
+    :return: a list of all the values at the path. Arrays along the path are traversed, so there can be more than \
+    one value; the list is empty if the path does not exist.
+    """
+    if '.' not in path:
+        return [doc[path]] if isinstance(doc, dict) and path in doc else []
+
+    values = [doc]
+    for key in path.split('.'):
+        new_values = []
+        for value in values:
+            if isinstance(value, dict):
+                if key in value:
+                    new_values.append(value[key])
+            elif isinstance(value, list):
+                if key.isdigit() and int(key) < len(value):
+                    new_values.append(value[int(key)])
+                else:
+                    new_values.extend([v[key] for v in value if isinstance(v, dict) and key in v])
+        values = new_values
+    return values
+
+
+def index_values(doc, key):
+    """
+    :param doc: a document
+    :param key: a (dotted) key
+    :return: (set) the values of the document for an index on the key. Arrays are indexed by element, and dicts \
+    and lists are not indexed (they cannot equal the scalars that are looked up).
+    """
+    values = set()
+    for value in get_values(doc, key):
+        for v in (value if isinstance(value, list) else [value]):
+            try:
+                values.add(v)
+            except TypeError:
+                pass
+    return values
+
+
+def _candidates(values):
+    # a query condition on an array field matches the array itself or any of its elements
+    candidates = []
+    for value in values:
+        candidates.append(value)
+        if isinstance(value, list):
+            candidates.extend(value)
+    return candidates
+
+
+def _is_operator_dict(cond):
+    return isinstance(cond, dict) and len(cond) > 0 and all([k.startswith('$') for k in cond])
+
+
+def _equal(a, b):
+    return a == b and isinstance(a, bool) == isinstance(b, bool)
+
+
+def _equals_any(values, cond):
+    if len(values) == 1:
+        if not isinstance(values[0], list):
+            return _equal(values[0], cond)
+        if cond not in values[0] and values[0] != cond:
+            return False  # quick rejection, the common case when scanning arrays
+    if cond is None:
+        # None also matches missing fields
+        return not values or None in _candidates(values)
+    return any([_equal(c, cond) for c in _candidates(values)])
+
+
+def _comparable(a, b):
+    if isinstance(a, bool) or isinstance(b, bool):
+        return isinstance(a, bool) and isinstance(b, bool)
+    if isinstance(a, _NUMBER_TYPES):
+        return isinstance(b, _NUMBER_TYPES)
+    if isinstance(a, basestring):
+        return isinstance(b, basestring)
+    return type(a) == type(b)
+
+
+_COMPARISONS = {'$gt': lambda a, b: a > b, '$gte': lambda a, b: a >= b,
+                '$lt': lambda a, b: a < b, '$lte': lambda a, b: a <= b}
+
+
+def _match_operator(values, op, arg):
+    if op == '$eq':
+        return _equals_any(values, arg)
+    if op == '$ne':
+        return not _equals_any(values, arg)
+    if op == '$in':
+        return any([_equals_any(values, a) for a in arg])
+    if op == '$nin':
+        return not any([_equals_any(values, a) for a in arg])
+    if op in _COMPARISONS:
+        return any([_comparable(c, arg) and _COMPARISONS[op](c, arg) for c in _candidates(values)])
+    if op == '$exists':
+        return bool(values) == bool(arg)
+    if op == '$all':
+        return all([_equals_any(values, a) for a in arg])
+    if op == '$size':
+        return any([isinstance(v, list) and len(v) == arg for v in values])
+    if op == '$not':
+        return not all([_match_operator(values, o, a) for (o, a) in arg.iteritems()])
+    if op == '$regex':
+        return any([isinstance(c, basestring) and re.search(arg, c) is not None for c in _candidates(values)])
+    if op == '$elemMatch':
+        for value in values:
+            if isinstance(value, list):
+                for elem in value:
+                    if _is_operator_dict(arg) and not any([k in arg for k in ['$or', '$and', '$nor']]):
+                        if all([_match_operator([elem], o, a) for (o, a) in arg.iteritems()]):
+                            return True
+                    elif isinstance(elem, dict) and match_query(elem, arg):
+                        return True
+        return False
+    raise ValueError('Unsupported query operator: {}'.format(op))
+
+
+def match_query(doc, query):
+    """
+    :param doc: a document
+    :param query: a MongoDB query (None or {} match all documents)
+    :return: (bool) whether the document matches the query
+    """
+    for key, cond in (query or {}).iteritems():
+        if key == '$or':
+            if not any([match_query(doc, q) for q in cond]):
+                return False
+        elif key == '$and':
+            if not all([match_query(doc, q) for q in cond]):
+                return False
+        elif key == '$nor':
+            if any([match_query(doc, q) for q in cond]):
+                return False
+        elif key.startswith('$'):
+            raise ValueError('Unsupported query operator: {}'.format(key))
+        else:
+            values = get_values(doc, key)
+            if _is_operator_dict(cond):
+                if not all([_match_operator(values, op, arg) for (op, arg) in cond.iteritems()]):
+                    return False
+            elif not _equals_any(values, cond):
+                return False
+    return True
+
+
+def equality_conditions(query):
+    """
+    :param query: a MongoDB query
+    :return: a dict of the top-level (dotted) keys of the query that must equal one of a list of values, e.g. \
+    {'fw_id': [1, 2]} for {'fw_id': {'$in': [1, 2]}, 'state': {'$ne': 'READY'}}. Used to narrow down the \
+    documents to check with indexes.
+    """
+    conditions = {}
+    for key, cond in (query or {}).iteritems():
+        if key.startswith('$'):
+            continue
+        if _is_operator_dict(cond):
+            if '$in' in cond and None not in cond['$in']:
+                conditions[key] = list(cond['$in'])
+            elif '$eq' in cond and cond['$eq'] is not None:
+                conditions[key] = [cond['$eq']]
+        elif cond is not None and not isinstance(cond, (dict, list)):
+            conditions[key] = [cond]
+    return conditions
+
+
+def _sort_key(values):
+    # MongoDB sort order: missing/None < numbers < strings < objects < arrays < booleans < dates
+    if not values or values[0] is None:
+        return 0, None
+    value = values[0]
+    if isinstance(value, bool):
+        return 6, value
+    if isinstance(value, _NUMBER_TYPES):
+        return 1, value
+    if isinstance(value, basestring):
+        return 2, value
+    if isinstance(value, dict):
+        return 3, value
+    if isinstance(value, list):
+        return 4, value
+    if isinstance(value, datetime.datetime):
+        return 7, value
+    return 5, value
+
+
+def sort_docs(docs, sort):
+    """
+    Sort documents in place.
+
+    :param docs: a list of documents
+    :param sort: a list of (key, direction) tuples, e.g. [('spec._priority', -1)]; documents that compare equal \
+    keep their original order
+    """
+    for key, direction in reversed(list(sort or [])):
+        docs.sort(key=lambda doc: _sort_key(get_values(doc, key)), reverse=(direction < 0))
+
+
+def _project_path(src, dst, keys):
+    key = keys[0]
+    if key not in src:
+        return
+    if len(keys) == 1:
+        dst[key] = copy_doc(src[key])
+    elif isinstance(src[key], dict):
+        _project_path(src[key], dst.setdefault(key, {}), keys[1:])
+    elif isinstance(src[key], list):
+        sub_docs = [v for v in src[key] if isinstance(v, dict)]
+        dst_docs = dst.setdefault(key, [{} for _ in sub_docs])
+        for (sub_doc, dst_doc) in zip(sub_docs, dst_docs):
+            _project_path(sub_doc, dst_doc, keys[1:])
+
+
+def _exclude_path(doc, keys):
+    if len(keys) == 1:
+        doc.pop(keys[0], None)
+    elif isinstance(doc.get(keys[0]), dict):
+        _exclude_path(doc[keys[0]], keys[1:])
+    elif isinstance(doc.get(keys[0]), list):
+        for v in doc[keys[0]]:
+            if isinstance(v, dict):
+                _exclude_path(v, keys[1:])
+
+
+def project(doc, fields=None):
+    """
+    :param doc: a document
+    :param fields: a MongoDB projection, i.e. a list of (dotted) keys to include, or a dict of keys to include \
+    (value 1) or to exclude (value 0). The _id is included unless it is excluded explicitly.
+    :return: a copy of the document with only the requested fields
+    """
+    if fields is None:
+        return copy_doc(doc)
+    if not isinstance(fields, dict):
+        fields = dict([(f, 1) for f in fields])
+
+    keys = [k for k in fields if k != '_id']
+    if any([fields[k] for k in keys]):
+        m_doc = {}
+        for key in keys:
+            _project_path(doc, m_doc, key.split('.'))
+    else:
+        m_doc = copy_doc(doc)
+        for key in keys:
+            _exclude_path(m_doc, key.split('.'))
+
+    if fields.get('_id', 1) and '_id' in doc:
+        m_doc['_id'] = doc['_id']
+    else:
+        m_doc.pop('_id', None)
+    return m_doc
+
+
+def _resolve(doc, path, create):
+    # get the container and the key/index of a dotted path
+    keys = path.split('.')
+    container = doc
+    for key in keys[:-1]:
+        if isinstance(container, list):
+            container = container[int(key)]
+        elif key in container:
+            container = container[key]
+        elif create:
+            container = container.setdefault(key, {})
+        else:
+            return None, None
+    key = keys[-1]
+    if isinstance(container, list):
+        key = int(key)
+    return container, key
+
+
+def _get(container, key, default=None):
+    if isinstance(container, list):
+        return container[key] if key < len(container) else default
+    return container.get(key, default)
+
+
+def _each(value):
+    return list(value['$each']) if isinstance(value, dict) and '$each' in value else [value]
+
+
+def _pull_matches(elem, cond):
+    if _is_operator_dict(cond):
+        return all([_match_operator([elem], op, arg) for (op, arg) in cond.iteritems()])
+    if isinstance(cond, dict) and isinstance(elem, dict):
+        return match_query(elem, cond)
+    return _equal(elem, cond)
+
+
+def is_replacement(update):
+    """
+    :param update: a MongoDB update
+    :return: (bool) whether the update replaces the entire document (i.e. has no update operators)
+    """
+    return not any([k.startswith('$') for k in update])
+
+
+def apply_update(doc, update, inserting=False):
+    """
+    Apply a MongoDB update to a document in place. Supported operators are $set, $setOnInsert, $unset, $inc, \
+    $push, $pushAll, $addToSet, $pull and $pop; an update without operators replaces the document (keeping its _id).
+
+    :param doc: a document
+    :param update: a MongoDB update
+    :param inserting: whether the document is being inserted by an upsert (to apply $setOnInsert)
+    """
+    if is_replacement(update):
+        _id = doc.get('_id')
+        doc.clear()
+        doc.update(copy_doc(update))
+        if _id is not None:
+            doc['_id'] = _id
+        return
+
+    for op, fields in update.iteritems():
+        if op == '$setOnInsert' and not inserting:
+            continue
+        for path, value in fields.iteritems():
+            container, key = _resolve(doc, path, create=op not in ['$unset', '$pull', '$pop'])
+            if container is None:
+                continue
+            if op in ['$set', '$setOnInsert']:
+                container[key] = copy_doc(value)
+            elif op == '$unset':
+                if isinstance(container, dict):
+                    container.pop(key, None)
+            elif op == '$inc':
+                container[key] = _get(container, key, 0) + value
+            elif op in ['$push', '$pushAll', '$addToSet']:
+                if _get(container, key) is None:
+                    container[key] = []
+                new_values = value if op == '$pushAll' else _each(value)
+                for v in new_values:
+                    if op != '$addToSet' or not any([_equal(e, v) for e in container[key]]):
+                        container[key].append(copy_doc(v))
+            elif op == '$pull':
+                if isinstance(_get(container, key), list):
+                    container[key] = [e for e in container[key] if not _pull_matches(e, value)]
+            elif op == '$pop':
+                if _get(container, key):
+                    container[key].pop(0 if value < 0 else -1)
+            else:
+                raise ValueError('Unsupported update operator: {}'.format(op))
+
+
+def upsert_doc(query, update):
+    """
+    :param query: the MongoDB query of an upsert
+    :param update: the MongoDB update of the upsert
+    :return: the document inserted by an upsert that matched no documents
+    """
+    doc = {}
+    if not is_replacement(update):
+        # the equality conditions of the query become fields of the new document
+        for key, cond in (query or {}).iteritems():
+            if not key.startswith('$') and not _is_operator_dict(cond):
+                container, m_key = _resolve(doc, key, create=True)
+                container[m_key] = copy_doc(cond)
+    apply_update(doc, update, inserting=True)
+    return doc
+
+
+def _evaluate(doc, expr):
+    # a '$field' path, a dict of expressions or a constant
+    if isinstance(expr, basestring) and expr.startswith('$'):
+        value = doc
+        for key in expr[1:].split('.'):
+            if not isinstance(value, dict) or key not in value:
+                return None
+            value = value[key]
+        return value
+    if isinstance(expr, dict):
+        return dict([(k, _evaluate(doc, v)) for (k, v) in expr.iteritems()])
+    return expr
+
+
+def _accumulate(op, values):
+    # values are the evaluated expressions of a group's documents, in order
+    numbers = [v for v in values if isinstance(v, _NUMBER_TYPES) and not isinstance(v, bool)]
+    present = [v for v in values if v is not None]
+    if op == '$sum':
+        return sum(numbers)
+    if op == '$avg':
+        return float(sum(numbers)) / len(numbers) if numbers else None
+    if op == '$min':
+        return min(present, key=lambda v: _sort_key([v])) if present else None
+    if op == '$max':
+        return max(present, key=lambda v: _sort_key([v])) if present else None
+    if op == '$push':
+        return [copy_doc(v) for v in present]
+    if op == '$addToSet':
+        unique = []
+        for v in present:
+            if not any([_equal(u, v) for u in unique]):
+                unique.append(copy_doc(v))
+        return unique
+    if op == '$first':
+        return copy_doc(values[0]) if values else None
+    if op == '$last':
+        return copy_doc(values[-1]) if values else None
+    raise ValueError('Unsupported group accumulator: {}'.format(op))
+
+
+def _group(docs, spec):
+    groups = OrderedDict()  # group _id (as a hashable key) to (_id, documents)
+    for doc in docs:
+        _id = _evaluate(doc, spec['_id'])
+        groups.setdefault(repr(_id), (_id, []))[1].append(doc)
+
+    results = []
+    for (_id, group_docs) in groups.itervalues():
+        result = {'_id': copy_doc(_id)}
+        for field, acc in spec.iteritems():
+            if field != '_id':
+                ((op, expr),) = acc.items()
+                result[field] = _accumulate(op, [_evaluate(doc, expr) for doc in group_docs])
+        results.append(result)
+    return results
+
+
+def aggregate_docs(docs, pipeline):
+    """
+    Run a MongoDB aggregation pipeline on documents. Supported stages are $match, $group (with the $sum, $avg, \
+    $min, $max, $push, $addToSet, $first and $last accumulators), $sort, $skip and $limit.
+
+    :param docs: a list of documents (which are not modified)
+    :param pipeline: a list of stages
+    :return: the list of output documents
+    """
+    for stage in pipeline:
+        ((op, arg),) = stage.items()
+        if op == '$match':
+            docs = [doc for doc in docs if match_query(doc, arg)]
+        elif op == '$group':
+            docs = _group(docs, arg)
+        elif op == '$sort':
+            docs = list(docs)
+            sort_docs(docs, arg.items())
+        elif op == '$skip':
+            docs = docs[arg:]
+        elif op == '$limit':
+            docs = docs[:arg]
+        else:
+            raise ValueError('Unsupported aggregation stage: {}'.format(op))
+    return [copy_doc(doc) for doc in docs]
+
+
+class ResultCursor(object):
+    """
+    The result of a find() on a collection that is not in MongoDB. Like a pymongo Cursor, it can be sorted, \
+    skipped and limited before it is iterated.
+    """
+
+    def __init__(self, docs, fields=None, skip=0, limit=0, sort=None, lock=None, explain=None):
+        """
+        :param docs: the matching documents (copied and projected only when the cursor is iterated)
+        :param fields: a MongoDB projection
+        :param skip: number of documents to skip
+        :param limit: maximum number of documents to return (0 for no limit)
+        :param sort: a list of (key, direction) tuples
+        :param lock: a lock to hold while copying the documents, if they can be modified by other threads
+        :param explain: a function that returns the query plan, see explain()
+        """
+        self._docs = docs
+        self._fields = fields
+        self._skip = skip
+        self._limit = limit
+        self._sort = list(sort) if sort else []
+        self._lock = lock if lock else threading.RLock()
+        self._explain = explain
+        self._results = None
+
+    def sort(self, key_or_list, direction=1):
+        self._sort = [(key_or_list, direction)] if isinstance(key_or_list, basestring) else list(key_or_list)
+        return self
+
+    def skip(self, skip):
+        self._skip = skip
+        return self
+
+    def limit(self, limit):
+        self._limit = limit
+        return self
+
+    def count(self, with_limit_and_skip=False):
+        if not with_limit_and_skip:
+            return len(self._docs)
+        n = max(len(self._docs) - self._skip, 0)
+        return min(n, self._limit) if self._limit else n
+
+    def explain(self):
+        """
+        :return: the query plan in the format of MongoDB 2.x: the 'cursor' is 'BasicCursor' if the query scans the \
+        whole collection, or 'BtreeCursor' if an index narrows down the documents
+        """
+        return self._explain() if self._explain else {'cursor': 'BasicCursor'}
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        if self._results is None:
+            with self._lock:
+                docs = list(self._docs)
+                sort_docs(docs, self._sort)
+                docs = docs[self._skip:self._skip + self._limit] if self._limit else docs[self._skip:]
+                self._results = iter([project(doc, self._fields) for doc in docs])
+        return next(self._results)
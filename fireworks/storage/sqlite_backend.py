@@ -0,0 +1,477 @@
+#!/usr/bin/env python
+
+"""
+A storage backend on a SQLite database file, for running FireWorks on a single node without a MongoDB server. \
+Several processes (e.g. rapidfire Rocket launchers) on the same node can share the database.
+"""
+import datetime
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from fireworks.storage.query_engine import copy_doc, match_query, equality_conditions, sort_docs, project, \
+    apply_update, upsert_doc, is_replacement, index_values, aggregate_docs, ResultCursor
+from fireworks.storage.storage_backend import StorageBackend, StorageCollection, DuplicateKeyError
+
+__author__ = 'Anubhav Jain'
+__copyright__ = 'Copyright 2013, The Materials Project'
+__version__ = '0.1'
+__maintainer__ = 'Anubhav Jain'
+__email__ = 'ajain@lbl.gov'
+__date__ = 'Oct 18, 2026'
+
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def _encode(obj):
+    # JSON has no dates; store them as {"$date": "..."} (like MongoDB's extended JSON)
+    if isinstance(obj, datetime.datetime):
+        return {'$date': obj.strftime(DATE_FORMAT)}
+    raise TypeError('{} is not JSON serializable'.format(repr(obj)))
+
+
+def _decode(m_dict):
+    if len(m_dict) == 1 and '$date' in m_dict:
+        return datetime.datetime.strptime(m_dict['$date'], DATE_FORMAT)
+    return m_dict
+
+
+def _sql_literal(value):
+    """
+    :return: the SQL literal for a value that can be looked up in an index, or None if the value cannot be
+    """
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, (int, long)):
+        return str(value)
+    if isinstance(value, float):
+        return repr(value)
+    if isinstance(value, basestring):
+        return u"'" + value.replace("'", "''") + u"'"
+    return None
+
+
+def _json_path(key):
+    return '$' + ''.join(['."{}"'.format(k.replace('"', '""')) for k in key.split('.')])
+
+
+class SQLiteCollection(StorageCollection):
+    """
+    A collection stored in two tables: <name> holds the documents as JSON (with the _id as the integer primary \
+    key), and <name>__index holds one (key, value, _id) row for every value of every indexed key (array values \
+    get one row per element), so that equality and $in conditions on indexed keys are looked up with SQL. The \
+    other conditions are checked in Python. Writes hold the database write lock (BEGIN IMMEDIATE) from the query \
+    to the update, so e.g. find_and_modify() is atomic even between processes.
+    """
+
+    def __init__(self, backend, name):
+        self.backend = backend
+        self.name = name
+        self._table = '"{}"'.format(name)
+        self._index_table = '"{}__index"'.format(name)
+
+    def create_tables(self, conn):
+        conn.execute('CREATE TABLE IF NOT EXISTS {} (_id INTEGER PRIMARY KEY, doc TEXT NOT NULL)'.format(self._table))
+        conn.execute('CREATE TABLE IF NOT EXISTS {} (key TEXT NOT NULL, value, _id INTEGER NOT NULL)'.format(
+            self._index_table))
+        conn.execute('CREATE INDEX IF NOT EXISTS "{0}__index_key_value" ON {1} (key, value)'.format(
+            self.name, self._index_table))
+        conn.execute('CREATE INDEX IF NOT EXISTS "{0}__index_id" ON {1} (_id)'.format(self.name, self._index_table))
+
+    def find(self, spec=None, fields=None, skip=0, limit=0, sort=None, **kwargs):
+        with self.backend.transaction() as conn:
+            docs = self._find_docs(conn, spec, sort, skip + limit if limit else 0)
+        return ResultCursor(docs[skip:], fields, limit=limit, explain=lambda: self._explain(spec))
+
+    def find_one(self, spec_or_id=None, fields=None, **kwargs):
+        if spec_or_id is not None and not isinstance(spec_or_id, dict):
+            spec_or_id = {'_id': spec_or_id}
+        for doc in self.find(spec_or_id, fields, limit=1, sort=kwargs.get('sort')):
+            return doc
+        return None
+
+    def find_and_modify(self, query=None, update=None, upsert=False, sort=None, fields=None, new=False,
+                        remove=False, **kwargs):
+        with self.backend.transaction(write=True) as conn:
+            docs = self._find_docs(conn, query, sort, 1)
+            if not docs:
+                if upsert and not remove:
+                    doc = upsert_doc(query, update)
+                    self._insert_doc(conn, doc)
+                    return project(doc, fields) if new else None
+                return None
+
+            doc = docs[0]
+            if remove:
+                self._remove_doc(conn, doc)
+                return project(doc, fields)
+            new_doc = self._update_doc(conn, doc, update)
+            return project(new_doc if new else doc, fields)
+
+    def update(self, spec, document, upsert=False, multi=False, **kwargs):
+        with self.backend.transaction(write=True, durable=kwargs.get('j', False)) as conn:
+            docs = self._find_docs(conn, spec, limit=0 if multi else 1)
+            if multi and docs and is_replacement(document):
+                raise ValueError('multi update only works with $ operators')
+            for doc in docs:
+                self._update_doc(conn, doc, document)
+            if not docs and upsert:
+                self._insert_doc(conn, upsert_doc(spec, document))
+            return {'ok': 1.0, 'err': None, 'n': len(docs) or int(upsert), 'updatedExisting': bool(docs)}
+
+    def insert(self, doc_or_docs, **kwargs):
+        with self.backend.transaction(write=True, durable=kwargs.get('j', False)) as conn:
+            docs = doc_or_docs if isinstance(doc_or_docs, list) else [doc_or_docs]
+            size = 0
+            for doc in docs:
+                size += self._insert_doc(conn, doc)  # also adds the _id to the document, like pymongo
+            self._trim(conn, size)
+            ids = [doc['_id'] for doc in docs]
+            return ids if isinstance(doc_or_docs, list) else ids[0]
+
+    def remove(self, spec_or_id=None, **kwargs):
+        with self.backend.transaction(write=True, durable=kwargs.get('j', False)) as conn:
+            if spec_or_id is None:
+                n = conn.execute('DELETE FROM {}'.format(self._table)).rowcount
+                conn.execute('DELETE FROM {}'.format(self._index_table))
+                return {'ok': 1.0, 'err': None, 'n': n}
+            if not isinstance(spec_or_id, dict):
+                spec_or_id = {'_id': spec_or_id}
+            docs = self._find_docs(conn, spec_or_id)
+            for doc in docs:
+                self._remove_doc(conn, doc)
+            # recount the size of a capped collection
+            conn.execute('UPDATE _capped SET size = (SELECT COALESCE(SUM(LENGTH(doc)), 0) FROM {}) '
+                         'WHERE collection = ?'.format(self._table), (self.name,))
+            return {'ok': 1.0, 'err': None, 'n': len(docs)}
+
+    def ensure_index(self, key_or_list, **kwargs):
+        # compound indexes are only used for their first key
+        key = key_or_list if isinstance(key_or_list, basestring) else key_or_list[0][0]
+        unique = bool(kwargs.get('unique'))
+        with self.backend.transaction(write=True) as conn:
+            indexes = self._get_indexes(conn)
+            if key != '_id' and key not in indexes:
+                for (_id, doc) in conn.execute('SELECT _id, doc FROM {}'.format(self._table)).fetchall():
+                    doc = json.loads(doc, object_hook=_decode)
+                    self._add_index_rows(conn, _id, key, doc)
+            if key != '_id' and (key not in indexes or (unique and not indexes[key])):
+                if unique and conn.execute('SELECT 1 FROM {} WHERE key = ? GROUP BY value HAVING COUNT(*) > 1 '
+                                           'LIMIT 1'.format(self._index_table), (key,)).fetchone():
+                    raise DuplicateKeyError('Duplicate key for unique index {}'.format(key))
+                conn.execute('INSERT OR REPLACE INTO _indexes (collection, key, is_unique) VALUES (?, ?, ?)',
+                             (self.name, key, unique or indexes.get(key, False)))
+        return '{}_1'.format(key)
+
+    def cap(self, max_size):
+        # the maximum and current size of capped collections are kept in the database, for all processes
+        with self.backend.transaction(write=True) as conn:
+            if not conn.execute('SELECT 1 FROM _capped WHERE collection = ?', (self.name,)).fetchone():
+                conn.execute('INSERT INTO _capped (collection, max_size, size) SELECT ?, ?, COALESCE(SUM(LENGTH(doc)), '
+                             '0) FROM {}'.format(self._table), (self.name, max_size))
+            conn.execute('UPDATE _capped SET max_size = ? WHERE collection = ?', (max_size, self.name))
+            self._trim(conn)
+
+    def aggregate(self, pipeline, **kwargs):
+        # a leading $match is narrowed down in SQL
+        spec = pipeline[0]['$match'] if pipeline and '$match' in pipeline[0] else None
+        with self.backend.transaction() as conn:
+            docs = self._find_docs(conn, spec)
+        return {'ok': 1.0, 'result': aggregate_docs(docs, pipeline[1:] if spec is not None else pipeline)}
+
+    def drop(self):
+        with self.backend.transaction(write=True) as conn:
+            conn.execute('DELETE FROM {}'.format(self._table))
+            conn.execute('DELETE FROM {}'.format(self._index_table))
+            conn.execute('DELETE FROM _indexes WHERE collection = ?', (self.name,))
+            conn.execute('DELETE FROM _capped WHERE collection = ?', (self.name,))
+
+    def count(self):
+        with self.backend.transaction() as conn:
+            return conn.execute('SELECT COUNT(*) FROM {}'.format(self._table)).fetchone()[0]
+
+    def _get_indexes(self, conn):
+        """
+        (internal method) the indexed keys of this collection; they are read from the database every time, since \
+        other processes may add indexes
+
+        :return: a dict of indexed key to whether the index is unique
+        """
+        return dict([(key, bool(is_unique)) for (key, is_unique) in conn.execute(
+            'SELECT key, is_unique FROM _indexes WHERE collection = ?', (self.name,))])
+
+    def _where(self, spec, indexes):
+        """
+        (internal method) translate the conditions of a query that SQL can check into a SQL expression. The \
+        expression may match more rows than the query, never fewer; the query is always checked in Python as well.
+
+        :return: a SQL expression, or None if no condition can be checked by SQL
+        """
+        clauses = []
+        for key, values in equality_conditions(spec).iteritems():
+            literals = [_sql_literal(v) for v in values]
+            if None in literals:
+                continue
+            literals = ', '.join(literals)  # (% formatting, since literals may be non-ASCII unicode)
+            if key == '_id':
+                clauses.append('_id IN (%s)' % literals)
+            elif key in indexes:
+                clauses.append('_id IN (SELECT _id FROM %s WHERE key = %s AND value IN (%s))' % (
+                    self._index_table, _sql_literal(key), literals))
+            elif '.' not in key and self.backend.json1:
+                # the value of the key, or any element of it if it is an array, must match
+                clauses.append('EXISTS (SELECT 1 FROM json_each(doc, %s) WHERE value IN (%s))' % (
+                    _sql_literal(_json_path(key)), literals))
+
+        for sub_spec in (spec or {}).get('$and', []):
+            clause = self._where(sub_spec, indexes)
+            if clause:
+                clauses.append(clause)
+
+        if '$or' in (spec or {}):
+            # every clause must be checked by SQL, otherwise all rows might match
+            or_clauses = [self._where(sub_spec, indexes) for sub_spec in spec['$or']]
+            if None not in or_clauses:
+                clauses.append('(%s)' % ' OR '.join(['(%s)' % c for c in or_clauses]))
+
+        return ' AND '.join(clauses) if clauses else None
+
+    def _explain(self, spec):
+        """
+        (internal method) the query plan of a query (see ResultCursor.explain()), from SQLite's plan of the SQL that \
+        narrows down the rows
+        """
+        with self.backend.transaction() as conn:
+            sql = 'SELECT _id, doc FROM {}'.format(self._table)
+            where = self._where(spec, self._get_indexes(conn))
+            if where:
+                sql += ' WHERE ' + where
+            plan = [row[-1] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql)]
+        scan = re.compile(r'SCAN (TABLE )?{}\b'.format(re.escape(self.name)))
+        return {'cursor': 'BasicCursor' if any([scan.match(detail) for detail in plan]) else 'BtreeCursor',
+                'plan': plan}
+
+    def _find_docs(self, conn, spec, sort=None, limit=0):
+        """
+        (internal method) the documents matching a query. SQL narrows down (and, if possible, sorts) the rows, \
+        which are then checked in Python, until enough documents are found.
+
+        :param limit: the maximum number of documents (0 for no limit)
+        """
+        sql = 'SELECT _id, doc FROM {}'.format(self._table)
+        where = self._where(spec, self._get_indexes(conn))
+        if where:
+            sql += ' WHERE ' + where
+        sql_sort = sort and self.backend.json1
+        if sql_sort:
+            # SQL sorts NULL (missing) values first, like MongoDB
+            sql += ' ORDER BY ' + ', '.join(['json_extract(doc, %s) %s' % (
+                _sql_literal(_json_path(key)), 'DESC' if direction < 0 else 'ASC') for (key, direction) in sort])
+            sql += ', _id'
+        else:
+            sql += ' ORDER BY _id'
+
+        docs = []
+        for (_id, doc) in conn.execute(sql):
+            doc = json.loads(doc, object_hook=_decode)
+            doc['_id'] = _id
+            if match_query(doc, spec):
+                docs.append(doc)
+                if limit and (sql_sort or not sort) and len(docs) == limit:
+                    break
+
+        if sort and not sql_sort:
+            sort_docs(docs, sort)
+        return docs[:limit] if limit else docs
+
+    def _add_index_rows(self, conn, _id, key, doc):
+        rows = [(key, value, _id) for value in index_values(doc, key) if _sql_literal(value) is not None]
+        conn.executemany('INSERT INTO {} (key, value, _id) VALUES (?, ?, ?)'.format(self._index_table), rows)
+
+    def _check_unique(self, conn, _id, doc, indexes):
+        for key, unique in indexes.iteritems():
+            if unique:
+                for value in index_values(doc, key):
+                    if conn.execute('SELECT 1 FROM {} WHERE key = ? AND value = ? AND _id != ? LIMIT 1'.format(
+                            self._index_table), (key, value, _id)).fetchone():
+                        raise DuplicateKeyError('Duplicate key for unique index {}: {}'.format(key, value))
+
+    def _dumps(self, doc):
+        return json.dumps(dict([(k, v) for (k, v) in doc.iteritems() if k != '_id']), default=_encode,
+                          separators=(',', ':'))
+
+    def _insert_doc(self, conn, doc):
+        """
+        :return: the size of the stored document
+        """
+        _id = doc.get('_id')
+        if _id is not None and not isinstance(_id, (int, long)):
+            raise ValueError('The SQLite backend only supports integer _ids, not: {}'.format(_id))
+        indexes = self._get_indexes(conn)
+        self._check_unique(conn, _id if _id is not None else -1, doc, indexes)
+        data = self._dumps(doc)
+        try:
+            doc['_id'] = conn.execute('INSERT INTO {} (_id, doc) VALUES (?, ?)'.format(self._table),
+                                      (_id, data)).lastrowid
+        except sqlite3.IntegrityError:
+            raise DuplicateKeyError('Duplicate key for unique index _id: {}'.format(_id))
+        for key in indexes:
+            self._add_index_rows(conn, doc['_id'], key, doc)
+        return len(data)
+
+    def _update_doc(self, conn, doc, update):
+        """
+        :return: the updated document (doc is not modified)
+        """
+        new_doc = copy_doc(doc)
+        apply_update(new_doc, update)
+        new_doc['_id'] = doc['_id']
+        indexes = self._get_indexes(conn)
+        self._check_unique(conn, doc['_id'], new_doc, indexes)
+        conn.execute('UPDATE {} SET doc = ? WHERE _id = ?'.format(self._table), (self._dumps(new_doc), doc['_id']))
+        for key in indexes:
+            if index_values(doc, key) != index_values(new_doc, key):
+                conn.execute('DELETE FROM {} WHERE _id = ? AND key = ?'.format(self._index_table), (doc['_id'], key))
+                self._add_index_rows(conn, doc['_id'], key, new_doc)
+        return new_doc
+
+    def _remove_doc(self, conn, doc):
+        conn.execute('DELETE FROM {} WHERE _id = ?'.format(self._table), (doc['_id'],))
+        conn.execute('DELETE FROM {} WHERE _id = ?'.format(self._index_table), (doc['_id'],))
+
+    def _trim(self, conn, added=0):
+        """
+        (internal method) if this is a capped collection, add the size of newly inserted documents and remove the \
+        oldest documents (with the lowest _ids) until the collection fits in its maximum size
+
+        :param added: the size of the inserted documents
+        """
+        row = conn.execute('SELECT max_size, size FROM _capped WHERE collection = ?', (self.name,)).fetchone()
+        if not row:
+            return
+        max_size, size = row[0], row[1] + added
+        if size > max_size:
+            last_id = None
+            cursor = conn.execute('SELECT _id, LENGTH(doc) FROM {} ORDER BY _id'.format(self._table))
+            for (_id, length) in cursor:
+                if size <= max_size:
+                    break
+                size -= length
+                last_id = _id
+            cursor.close()
+            conn.execute('DELETE FROM {} WHERE _id <= ?'.format(self._table), (last_id,))
+            conn.execute('DELETE FROM {} WHERE _id <= ?'.format(self._index_table), (last_id,))
+        conn.execute('UPDATE _capped SET size = ? WHERE collection = ?', (size, self.name))
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Stores the collections in the SQLite database file <name>.sqlite, in write-ahead logging (WAL) mode so that \
+    reads don't block writes. Every thread and process uses its own connection to the file.
+    """
+
+    POLL_SECS = 0.05  # how often wait_for_document() checks whether other connections changed the database
+
+    def __init__(self, name='fireworks', timeout=60, **kwargs):
+        """
+        :param name: name of the database, or path to the database file (if it has an extension)
+        :param timeout: seconds to wait for the database write lock held by other connections
+        :param kwargs: other connection parameters (host, port, etc.) are ignored
+        """
+        self.name = name
+        self.path = os.path.abspath(name if os.path.splitext(name)[1] else name + '.sqlite')
+        self.timeout = timeout
+        self.json1 = True  # whether SQLite has the JSON functions, updated when connecting
+        self._collections = {}
+        self._collections_lock = threading.Lock()
+        self._local = threading.local()
+
+    def get_collection(self, name):
+        with self._collections_lock:
+            if name not in self._collections:
+                self._collections[name] = SQLiteCollection(self, name)
+                with self.transaction(write=True) as conn:
+                    self._collections[name].create_tables(conn)
+            return self._collections[name]
+
+    @contextmanager
+    def transaction(self, write=False, durable=False):
+        """
+        A transaction on the connection of the current thread. Write transactions take the write lock of the \
+        database right away, so that no other connection can write between their reads and writes.
+
+        :param write: whether the transaction writes to the database
+        :param durable: whether the commit must be synced to disk (the 'j' write concern). Otherwise, in WAL mode, \
+        a commit survives crashes of the process but not of the operating system.
+        """
+        conn = self._connection()
+        if self._local.depth:
+            yield conn  # already in a transaction
+            return
+        if write and durable != self._local.durable:
+            conn.execute('PRAGMA synchronous={}'.format('FULL' if durable else 'NORMAL'))
+            self._local.durable = durable
+        conn.execute('BEGIN IMMEDIATE' if write else 'BEGIN')
+        self._local.depth += 1
+        try:
+            yield conn
+        except:
+            self._local.depth -= 1
+            conn.execute('ROLLBACK')
+            raise
+        self._local.depth -= 1
+        conn.execute('COMMIT')
+
+    def wait_for_document(self, collection, spec, timeout):
+        # the data_version of a connection changes when other connections commit, so it can be polled cheaply
+        deadline = time.time() + timeout
+        conn = self._connection()
+        version = None
+        while True:
+            new_version = conn.execute('PRAGMA data_version').fetchone()[0]
+            if new_version != version:
+                version = new_version
+                doc = collection.find_one(spec)
+                if doc:
+                    return doc
+            if time.time() >= deadline:
+                return None
+            time.sleep(min(self.POLL_SECS, max(deadline - time.time(), 0)))
+
+    def _connection(self):
+        """
+        (internal method) the connection of the current thread, opened if needed (e.g. in a forked process)
+        """
+        if getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            try:
+                conn.execute("SELECT json('1')")
+            except sqlite3.OperationalError:
+                self.json1 = False
+            conn.execute('CREATE TABLE IF NOT EXISTS _indexes (collection TEXT NOT NULL, key TEXT NOT NULL, '
+                         'is_unique INTEGER NOT NULL, PRIMARY KEY (collection, key))')
+            conn.execute('CREATE TABLE IF NOT EXISTS _capped (collection TEXT PRIMARY KEY, max_size INTEGER NOT NULL, '
+                         'size INTEGER NOT NULL)')
+            for collection in self._collections.values():
+                collection.create_tables(conn)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            self._local.depth = 0
+            self._local.durable = False
+        return self._local.conn
+
+    def drop(self):
+        """
+        Delete the database file. Connections of other threads are not closed.
+        """
+        if getattr(self._local, 'pid', None) == os.getpid():
+            self._local.conn.close()
+        self._local.pid = None
+        for suffix in ['', '-wal', '-shm']:
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
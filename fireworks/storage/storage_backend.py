@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+
+"""
+A StorageBackend holds the collections of the LaunchPad ('fireworks', 'launches', 'links', 'fw_id_assigner' and \
+'events'), and the blobs that are too large to be stored in documents.
+"""
+import importlib
+import time
+
+__author__ = 'Anubhav Jain'
+__copyright__ = 'Copyright 2013, The Materials Project'
+__version__ = '0.1'
+__maintainer__ = 'Anubhav Jain'
+__email__ = 'ajain@lbl.gov'
+__date__ = 'Oct 18, 2026'
+
+ASCENDING = 1
+DESCENDING = -1
+
+# the keyword arguments of writes for each durability tier. MongoDB writes are journaled by default; backends that \
+# don't support a write concern (e.g. w=0) use the closest one they do support
+WRITE_CONCERN_TIERS = {'unacknowledged': {'w': 0},
+                       'acknowledged': {'w': 1},
+                       'journaled': {'w': 1, 'j': True},
+                       'majority': {'w': 'majority', 'j': True}}
+
+# the backends that can be chosen by name, e.g. LaunchPad(backend='memory')
+STORAGE_BACKENDS = {'mongo': 'fireworks.storage.mongo_backend.MongoBackend',
+                    'memory': 'fireworks.storage.memory_backend.MemoryBackend',
+                    'sqlite': 'fireworks.storage.sqlite_backend.SQLiteBackend'}
+
+
+class DuplicateKeyError(ValueError):
+    """
+    Raised by backends other than MongoDB when a write would violate a unique index
+    """
+    pass
+
+
+class StorageBackend(object):
+    """
+    A StorageBackend provides the collections used by the LaunchPad. The collections must support the subset of \
+    the pymongo (2.x) Collection API described by StorageCollection; a MongoDB backend can simply return pymongo \
+    collections. Backends are constructed with the connection parameters of the LaunchPad (host, port, name, \
+    username, password), and may ignore those that they do not need.
+    """
+
+    POLL_SECS = 1  # how often wait_for_document() checks for new documents
+
+    def get_collection(self, name):
+        """
+        :param name: name of the collection, e.g. 'fireworks'
+        :return: a StorageCollection
+        """
+        raise NotImplementedError('get_collection() not implemented for this storage backend!')
+
+    def increment_counter(self, collection_name, counter, amount=1):
+        """
+        Atomically increment a counter stored in the (single) document of a collection.
+
+        :param collection_name: name of the collection holding the counter, e.g. 'fw_id_assigner'
+        :param counter: name of the counter, e.g. 'next_fw_id'
+        :param amount: the amount to add to the counter
+        :return: the value of the counter before it was incremented
+        """
+        return self.get_collection(collection_name).find_and_modify(query={}, update={'$inc': {counter: amount}}).get(
+            counter, 0)
+
+    def get_capped_collection(self, name, size):
+        """
+        A collection that only keeps (about) the last size bytes of documents, e.g. a log of events. This \
+        implementation caps an ordinary collection (see StorageCollection.cap()); MongoDB has capped collections.
+
+        :param name: name of the collection, e.g. 'events'
+        :param size: the maximum size of the collection in bytes
+        :return: a StorageCollection
+        """
+        collection = self.get_collection(name)
+        collection.cap(size)
+        return collection
+
+    def wait_for_document(self, collection, spec, timeout):
+        """
+        Block until a document matching the query spec is in the collection (e.g. after another process inserted \
+        it), or until the timeout. This implementation polls the collection every POLL_SECS; backends that can be \
+        notified of inserts should override it.
+
+        :param collection: a StorageCollection of this backend
+        :param spec: a query
+        :param timeout: the maximum number of seconds to wait
+        :return: the first matching document, or None if there was none before the timeout
+        """
+        deadline = time.time() + timeout
+        while True:
+            doc = collection.find_one(spec)
+            if doc or time.time() >= deadline:
+                return doc
+            time.sleep(min(self.POLL_SECS, max(deadline - time.time(), 0)))
+
+    def put_blob(self, data):
+        """
+        Store a large string outside of the documents. This implementation stores it in a document of the 'blobs' \
+        collection; backends with a file store (e.g. GridFS) should override put_blob(), get_blob() and \
+        remove_blobs().
+
+        :param data: (str) the data
+        :return: the id of the blob
+        """
+        return self.get_collection('blobs').insert({'data': data})
+
+    def get_blob(self, blob_id):
+        """
+        :param blob_id: the id returned by put_blob()
+        :return: (str) the data of the blob
+        """
+        doc = self.get_collection('blobs').find_one({'_id': blob_id})
+        if not doc:
+            raise ValueError('No blob exists with id: {}'.format(blob_id))
+        return doc['data']
+
+    def remove_blobs(self, blob_ids=None):
+        """
+        :param blob_ids: the ids of the blobs to remove (None to remove all blobs)
+        """
+        self.get_collection('blobs').remove({'_id': {'$in': list(blob_ids)}} if blob_ids is not None else None)
+
+    def drop(self):
+        """
+        Delete all the data of this backend (e.g. drop the MongoDB database)
+        """
+        raise NotImplementedError('drop() not implemented for this storage backend!')
+
+
+class StorageCollection(object):
+    """
+    The collection operations used by FireWorks. The arguments and return values follow pymongo 2.x; queries, \
+    updates, projections ('fields') and sorts are given in the MongoDB language. Extra keyword arguments (e.g. \
+    write concerns) may be ignored by backends that don't support them.
+    """
+
+    def find(self, spec=None, fields=None, skip=0, limit=0, sort=None, **kwargs):
+        """
+        :return: a cursor over the documents matching the query spec, which can be sorted, skipped, limited and \
+        explained like a pymongo Cursor (see ResultCursor)
+        """
+        raise NotImplementedError('find() not implemented for this collection!')
+
+    def find_one(self, spec_or_id=None, fields=None, **kwargs):
+        """
+        :return: the first document matching the query spec, or None
+        """
+        raise NotImplementedError('find_one() not implemented for this collection!')
+
+    def find_and_modify(self, query=None, update=None, upsert=False, sort=None, fields=None, new=False,
+                        remove=False, **kwargs):
+        """
+        Atomically update (or remove) the first document matching the query.
+
+        :return: the document before the update (or after it, if new is True), or None
+        """
+        raise NotImplementedError('find_and_modify() not implemented for this collection!')
+
+    def update(self, spec, document, upsert=False, multi=False, **kwargs):
+        """
+        Update (or replace) the first document, or all documents if multi is True, matching the query spec.
+        """
+        raise NotImplementedError('update() not implemented for this collection!')
+
+    def insert(self, doc_or_docs, **kwargs):
+        """
+        Insert a document, or a list of documents.
+        """
+        raise NotImplementedError('insert() not implemented for this collection!')
+
+    def remove(self, spec_or_id=None, **kwargs):
+        """
+        Remove all documents matching the query spec (all documents if spec_or_id is None).
+        """
+        raise NotImplementedError('remove() not implemented for this collection!')
+
+    def ensure_index(self, key_or_list, **kwargs):
+        """
+        Create an index if it does not exist yet; the 'unique' keyword makes it a unique index.
+        """
+        raise NotImplementedError('ensure_index() not implemented for this collection!')
+
+    def cap(self, max_size):
+        """
+        Make this a capped collection: whenever documents are inserted, the oldest documents are removed until the \
+        documents (as JSON) take at most max_size bytes. Like in MongoDB, the documents of a capped collection \
+        should not grow when they are updated.
+        """
+        raise NotImplementedError('cap() not implemented for this collection!')
+
+    def aggregate(self, pipeline, **kwargs):
+        """
+        Run an aggregation pipeline on the server. Backends that are not MongoDB support the $match, $group, \
+        $sort, $skip and $limit stages.
+
+        :return: a dict whose 'result' is the list of output documents (like pymongo 2.x)
+        """
+        raise NotImplementedError('aggregate() not implemented for this collection!')
+
+    def drop(self):
+        """
+        Remove all documents and indexes of the collection.
+        """
+        raise NotImplementedError('drop() not implemented for this collection!')
+
+
+def get_storage_backend(backend='mongo', **kwargs):
+    """
+    :param backend: the name of a backend in STORAGE_BACKENDS, or a StorageBackend object (which is returned as-is)
+    :param kwargs: the connection parameters passed to the backend (host, port, name, username, password)
+    :return: a StorageBackend
+    """
+    if isinstance(backend, StorageBackend):
+        return backend
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError('Unknown storage backend: {}; choose from {}'.format(backend, sorted(STORAGE_BACKENDS)))
+
+    # backends are imported only when used, e.g. so that pymongo is not needed for the in-memory backend
+    modname, classname = STORAGE_BACKENDS[backend].rsplit('.', 1)
+    return getattr(importlib.import_module(modname), classname)(**kwargs)
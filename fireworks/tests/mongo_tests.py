@@ -1,12 +1,18 @@
+import datetime
 import os
 import shutil
 import glob
+import threading
 import unittest
 import time
-from fireworks.core.firework import FireWork
+from fireworks.core.firework import FireWork, FWAction
+from fireworks.core.fw_config import FWConfig
+from fireworks.core.fworker import FWorker
 from fireworks.core.launchpad import LaunchPad
+from fireworks.core.rocket import HeartbeatService
 from fireworks.core.rocket_launcher import launch_rocket, rapidfire
 from fireworks.core.workflow import Workflow
+from fireworks.user_objects.dupefinders.dupefinder_exact import DupeFinderExact
 from fireworks.user_objects.firetasks.script_task import ScriptTask
 from fw_tutorials.dynamic_wf.fibadd_task import FibonacciAdderTask
 from fw_tutorials.firetask.addition_task import AdditionTask
@@ -30,11 +36,13 @@ MODULE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)))
 
 class MongoTests(unittest.TestCase):
 
+    BACKEND = 'mongo'
+
     @classmethod
     def setUpClass(cls):
         cls.lp = None
         try:
-            cls.lp = LaunchPad(name=TESTDB_NAME, strm_lvl='ERROR')
+            cls.lp = LaunchPad(name=TESTDB_NAME, strm_lvl='ERROR', backend=cls.BACKEND)
             cls.lp.reset(password=None, require_password=False)
         except:
             raise unittest.SkipTest('MongoDB is not running in localhost:27017! Skipping tests.')
@@ -93,6 +101,356 @@ class MongoTests(unittest.TestCase):
 
         self.assertFalse(self.lp.run_exists())
 
+    def test_add_wfs(self):
+        fw1 = FireWork(AdditionTask(), {'input_array': [1, 2]}, fw_id=-1)
+        fw2 = FireWork(AdditionTask(), {'input_array': [3, 4]}, fw_id=-2)
+        fw3 = FireWork(AdditionTask(), {'input_array': [5, 6]}, fw_id=-1)
+        old_new = self.lp.add_wfs([Workflow([fw1, fw2], {-1: -2}), fw3])
+        self.assertEqual(old_new, [{-1: 1, -2: 2}, {-1: 3}])
+        self.assertEqual(self.lp.get_fw_by_id(1).state, 'READY')
+        self.assertEqual(self.lp.get_fw_by_id(2).state, 'WAITING')
+        self.assertEqual(self.lp.get_fw_by_id(3).state, 'READY')
+        self.assertEqual(self.lp.get_wf_by_fw_id(2).links, {1: [2], 2: []})
+        self.assertEqual(self.lp.get_new_fw_id(), 4)
+
+    def test_batched_wf_load(self):
+        fws = [FireWork(AdditionTask(), {'input_array': [i, i]}, fw_id=-i) for i in range(1, 21)]
+        self.lp.add_wf(Workflow(fws, {-1: range(-20, -1)}))
+        launch_rocket(self.lp)
+        self.lp.load_round_trips = 0
+        wf = self.lp.get_wf_by_fw_id(1)
+        self.assertEqual(self.lp.load_round_trips, 3)  # links, FireWorks and Launches
+        self.assertEqual(len(wf.id_fw), 20)
+        self.assertEqual(wf.id_fw[1].launches[0].action.stored_data['sum'], 2)
+        self.assertEqual(wf.id_fw[2].state, 'READY')
+
+    def test_compact_wf(self):
+        fws = [FireWork(AdditionTask(), {'input_array': [i, i]}, fw_id=-i) for i in range(1, 4)]
+        self.lp.add_wf(Workflow(fws, {-1: [-2, -3]}))
+        launch_rocket(self.lp)
+        compact_wf = self.lp.get_compact_wf_by_fw_id(3)
+        self.assertEqual(compact_wf.root_fw_ids, [1])
+        self.assertEqual(compact_wf.get_fw_ids_by_state('READY'), [2, 3])
+        self.assertEqual(compact_wf.state_counts(), {'COMPLETED': 1, 'READY': 2})
+
+    def test_dupefinder(self):
+        spec = {'input_array': [1, 2], '_dupefinder': DupeFinderExact().to_dict()}
+        self.lp.add_wfs([FireWork(AdditionTask(), dict(spec)), FireWork(AdditionTask(), dict(spec))])
+        launch_rocket(self.lp)
+        self.assertEqual(self.lp._checkout_fw(FWorker(), MODULE_DIR), (None, None))
+        fw = self.lp.get_fw_by_id(2)
+        self.assertEqual(fw.state, 'COMPLETED')
+        self.assertEqual([l.launch_id for l in fw.launches], [1])
+
+    def test_dupefinder_events(self):
+        spec = {'input_array': [1, 2], '_dupefinder': DupeFinderExact().to_dict()}
+        self.lp.add_wfs([FireWork(AdditionTask(), dict(spec)), FireWork(AdditionTask(), dict(spec))])
+        launch_rocket(self.lp)
+        self.assertEqual(self.lp.checkout_many(FWorker(), 1), [2])
+        self.assertEqual(self.lp._checkout_fw(FWorker(), MODULE_DIR, fw_id=2), (None, None))
+        self.assertEqual([(e['old_state'], e['state']) for e in self.lp.events_since() if e['fw_id'] == 2],
+                         [(None, 'READY'), ('READY', 'RESERVED'), ('RESERVED', 'READY'), ('READY', 'COMPLETED')])
+
+    def test_reserve_dupefinder(self):
+        spec = {'input_array': [1, 2], '_dupefinder': DupeFinderExact().to_dict()}
+        self.lp.add_wfs([FireWork(AdditionTask(), dict(spec)), FireWork(AdditionTask(), dict(spec))])
+        launch_rocket(self.lp)
+        self.assertEqual(self.lp._reserve_fw(FWorker(), MODULE_DIR), (None, None))
+        self.assertEqual(self.lp.get_fw_by_id(2).state, 'COMPLETED')
+
+    def test_checkout_launch(self):
+        self.assertEqual(self.lp._checkout_fw(FWorker(), MODULE_DIR), (None, None))
+        self.assertEqual(self.lp.launches.find().count(), 0)
+        self.lp.add_wf(FireWork(AdditionTask(), {'input_array': [1, 2]}))
+        launch_id = self.lp._checkout_fw(FWorker(), MODULE_DIR)[1]
+        self.assertEqual(self.lp.launches.find_one({'launch_id': launch_id})['fw_id'], 1)
+        self.assertEqual([l.launch_id for l in self.lp.get_fw_by_id(1).launches], [launch_id])
+
+    def test_checkout_many(self):
+        self.lp.add_wfs([FireWork(AdditionTask(), {'input_array': [i, i]}) for i in range(3)])
+        self.assertEqual(self.lp.checkout_many(FWorker(), 2), [1, 2])
+        self.assertEqual(self.lp.checkout_many(FWorker(), 2), [3])
+        self.assertFalse(self.lp.run_exists())
+        self.lp.release_leases([1, 2, 3])
+        self.assertEqual(self.lp.get_fw_by_id(2).state, 'READY')
+        self.assertEqual(self.lp.checkout_many(FWorker(), 5, lease_secs=-1), [1, 2, 3])
+        self.assertTrue(self.lp.run_exists())  # the leases have already expired
+
+    def test_prefetch(self):
+        self.lp.add_wfs([FireWork(AdditionTask(), {'input_array': [i, i]}) for i in range(5)])
+        rapidfire(self.lp, m_dir=MODULE_DIR, nlaunches=4, prefetch=3)
+        self.assertEqual(self.lp.get_fw_ids({'state': 'COMPLETED'}), [1, 2, 3, 4])
+        self.assertEqual(self.lp.get_fw_by_id(5).state, 'READY')
+
+    def test_rapidfire_until_completion(self):
+        self.lp.add_wfs([FireWork(AdditionTask(), {'input_array': [i, i]}) for i in range(3)])
+        rapidfire(self.lp, m_dir=MODULE_DIR)
+        self.assertEqual(self.lp.get_fw_ids({'state': 'COMPLETED'}), [1, 2, 3])
+        self.lp.add_wfs([FireWork(AdditionTask(), {'input_array': [i, i]}) for i in range(3)])
+        rapidfire(self.lp, m_dir=MODULE_DIR, prefetch=2)
+        self.assertEqual(self.lp.get_fw_ids({'state': 'COMPLETED'}), [1, 2, 3, 4, 5, 6])
+
+    def test_write_concerns(self):
+        lp = LaunchPad.from_dict(dict(self.lp.to_dict(), write_concerns={'state': 'acknowledged'}))
+        self.assertEqual(lp._write_options['state'], {'w': 1})
+        self.assertEqual(lp._write_options['heartbeat'], {'w': 1})
+        self.assertRaises(ValueError, LaunchPad, name=TESTDB_NAME, backend=self.BACKEND,
+                          write_concerns={'state': 'sometimes'})
+
+    def test_detect_fizzled(self):
+        self.lp.add_wf(FireWork(AdditionTask(), {'input_array': [1, 2]}))
+        m_fw, launch_id = self.lp._checkout_fw(FWorker(), MODULE_DIR)
+        time.sleep(0.1)
+        self.assertEqual(self.lp.detect_fizzled(0.05), [launch_id])
+        self.lp._ping_launch(launch_id)
+        self.assertEqual(self.lp.detect_fizzled(0.05), [])
+        self.assertEqual(self.lp.get_launch_by_id(launch_id).last_pinged,
+                         self.lp.launches.find_one({'launch_id': launch_id})['last_pinged'])
+        time.sleep(0.1)
+        self.lp.detect_fizzled(0.05, fix=True)
+        self.assertEqual(self.lp.get_fw_by_id(1).state, 'FIZZLED')
+
+    def test_fix_workflows_once(self):
+        fw1 = FireWork(AdditionTask(), {'input_array': [1, 2]}, fw_id=-1)
+        fw2 = FireWork(AdditionTask(), {'input_array': [3, 4]}, fw_id=-2)
+        self.lp.add_wf(Workflow([fw1, fw2]))
+        launch_ids = [self.lp._checkout_fw(FWorker(), MODULE_DIR)[1] for _ in range(2)]
+        time.sleep(0.1)
+        round_trips = self.lp.load_round_trips
+        self.lp.get_wf_by_fw_id(1)
+        wf_round_trips = self.lp.load_round_trips - round_trips
+        self.assertEqual(sorted(self.lp.detect_fizzled(0.05, fix=True)), launch_ids)
+        # the Workflow was only loaded once
+        self.assertEqual(self.lp.load_round_trips - round_trips, 2 * wf_round_trips)
+        self.assertEqual(self.lp.get_fw_ids({'state': 'FIZZLED'}), [1, 2])
+
+    def test_detect_unreserved(self):
+        self.lp.add_wf(FireWork(AdditionTask(), {'input_array': [1, 2]}))
+        m_fw, launch_id = self.lp._reserve_fw(FWorker(), MODULE_DIR)
+        self.assertEqual(self.lp.detect_unreserved(60), [])
+        time.sleep(0.1)
+        self.assertEqual(self.lp.detect_unreserved(0.05, fix=True), [launch_id])
+        self.assertEqual(self.lp.get_fw_by_id(1).state, 'READY')
+
+    def test_lease_expiry(self):
+        self.lp.add_wfs([FireWork(AdditionTask(), {'input_array': [i, i]}) for i in range(2)])
+        expiration_secs = (FWConfig().RESERVATION_EXPIRATION_SECS, FWConfig().RUN_EXPIRATION_SECS)
+        FWConfig().RESERVATION_EXPIRATION_SECS, FWConfig().RUN_EXPIRATION_SECS = -1, 0.2
+        try:
+            # an expired reservation can be checked out right away
+            self.assertEqual(self.lp._reserve_fw(FWorker(), MODULE_DIR)[0].fw_id, 1)
+            self.assertEqual(self.lp._checkout_fw(FWorker(), MODULE_DIR)[0].fw_id, 1)
+            self.assertEqual(self.lp._checkout_fw(FWorker(), MODULE_DIR)[0].fw_id, 2)
+            self.assertEqual(self.lp._checkout_fw(FWorker(), MODULE_DIR), (None, None))
+            # the running FireWork whose lease is renewed by the heartbeat is not checked out again
+            time.sleep(0.1)
+            self.lp._ping_launches([3])
+            time.sleep(0.15)
+            m_fw, launch_id = self.lp._checkout_fw(FWorker(), MODULE_DIR)
+            self.assertEqual((m_fw.fw_id, launch_id), (1, 4))
+            self.lp._complete_launch(launch_id, FWAction('CONTINUE'))
+            self.assertNotIn('lease_expires', self.lp.fireworks.find_one({'fw_id': 1}))
+        finally:
+            FWConfig().RESERVATION_EXPIRATION_SECS, FWConfig().RUN_EXPIRATION_SECS = expiration_secs
+
+    def test_lease_takeover(self):
+        self.lp.add_wf(FireWork(AdditionTask(), {'input_array': [1, 1]}))
+        expiration_secs = (FWConfig().RESERVATION_EXPIRATION_SECS, FWConfig().RUN_EXPIRATION_SECS)
+        FWConfig().RESERVATION_EXPIRATION_SECS, FWConfig().RUN_EXPIRATION_SECS = -1, -1
+        try:
+            # the expired reservation is taken over by another queue job
+            l_id1 = self.lp._reserve_fw(FWorker(), MODULE_DIR)[1]
+            l_id2 = self.lp._reserve_fw(FWorker(), MODULE_DIR)[1]
+            self.assertEqual(self.lp.get_launch_by_id(l_id1).state, 'READY')
+            self.lp.unreserve(l_id1)
+            self.assertEqual(self.lp.get_fw_by_id(1).state, 'RESERVED')
+            # the expired checkout is taken over by another Rocket
+            l_id3 = self.lp._checkout_fw(FWorker(), MODULE_DIR)[1]
+            l_id4 = self.lp._checkout_fw(FWorker(), MODULE_DIR)[1]
+            self.assertEqual(self.lp.get_launch_by_id(l_id2).state, 'READY')
+            self.assertEqual(self.lp.get_launch_by_id(l_id3).state, 'FIZZLED')
+            self.assertEqual(self.lp.detect_fizzled(60), [])
+            self.lp.unreserve(l_id2)
+            self.assertEqual(self.lp.get_fw_by_id(1).state, 'RUNNING')
+            self.lp._complete_launch(l_id4, FWAction('CONTINUE'))
+            self.assertEqual(self.lp.get_fw_by_id(1).state, 'COMPLETED')
+        finally:
+            FWConfig().RESERVATION_EXPIRATION_SECS, FWConfig().RUN_EXPIRATION_SECS = expiration_secs
+
+    def test_checkout_crash(self):
+        self.lp.add_wf(FireWork(AdditionTask(), {'input_array': [1, 1]}))
+        run_expiration_secs = FWConfig().RUN_EXPIRATION_SECS
+        FWConfig().RUN_EXPIRATION_SECS = -1
+        try:
+            # the Rocket dies after checking out the FireWork, before inserting its Launch
+            l_id1 = self.lp._checkout_fw(FWorker(), MODULE_DIR)[1]
+            self.lp.launches.remove({'launch_id': l_id1})
+            self.assertEqual(self.lp.get_fw_by_id(1).launches, [])
+            self.assertEqual(self.lp.get_wf_by_fw_id(1).id_fw[1].state, 'RUNNING')
+            l_id2 = self.lp._checkout_fw(FWorker(), MODULE_DIR)[1]
+            self.assertEqual(self.lp.fireworks.find_one({'fw_id': 1})['launches'], [l_id2])
+            self.lp._complete_launch(l_id2, FWAction('CONTINUE'))
+            self.assertEqual(self.lp.get_fw_by_id(1).state, 'COMPLETED')
+        finally:
+            FWConfig().RUN_EXPIRATION_SECS = run_expiration_secs
+
+    def test_wait_for_ready(self):
+        self.assertFalse(self.lp.wait_for_ready(FWorker(), 0.2))
+        timer = threading.Timer(0.3, self.lp.add_wf, [FireWork(AdditionTask(), {'input_array': [1, 2]})])
+        t_start = time.time()
+        timer.start()
+        self.assertTrue(self.lp.wait_for_ready(FWorker(), 30))
+        self.assertLess(time.time() - t_start, 10)
+        timer.join()
+        self.assertEqual([e['fw_id'] for e in self.lp.events.find({'state': 'READY'})], [1])
+
+    def test_events_since(self):
+        self.lp.add_wf(FireWork(AdditionTask(), {'input_array': [1, 2]}))
+        launch_id = self.lp._checkout_fw(FWorker(), MODULE_DIR)[1]
+        self.lp._complete_launch(launch_id, FWAction('CONTINUE'))
+        events = list(self.lp.events_since())
+        self.assertEqual([(e['seq'], e['fw_id'], e['launch_id'], e['old_state'], e['state']) for e in events],
+                         [(1, 1, None, None, 'READY'), (2, 1, None, 'READY', 'RUNNING'),
+                          (3, 1, launch_id, None, 'RUNNING'), (4, 1, launch_id, 'RUNNING', 'COMPLETED'),
+                          (5, 1, None, 'RUNNING', 'COMPLETED')])
+        self.assertEqual(events[1]['worker'], FWorker().name)
+        self.assertEqual([e['seq'] for e in self.lp.events_since(3)], [4, 5])
+        # a recent gap in the sequence is an event that is still being written
+        self.lp.events.insert({'seq': 7, 'fw_id': 1, 'state': 'DEFUSED', 'time': datetime.datetime.utcnow()})
+        self.assertEqual([e['seq'] for e in self.lp.events_since(3)], [4, 5])
+        self.lp.events.insert({'seq': 6, 'fw_id': 1, 'state': 'DEFUSED', 'time': datetime.datetime.utcnow()})
+        self.assertEqual([e['seq'] for e in self.lp.events_since(3)], [4, 5, 6, 7])
+        # events that were dropped from the capped collection are skipped
+        self.lp.events.drop()
+        self.lp.events.insert([{'seq': seq, 'fw_id': 1, 'state': 'DEFUSED', 'time': datetime.datetime.utcnow()}
+                               for seq in [10, 11]])
+        self.assertEqual([e['seq'] for e in self.lp.events_since()], [10, 11])
+        self.assertEqual([e['seq'] for e in self.lp.events_since(3)], [10, 11])
+
+    def test_iter_fws(self):
+        self.lp.add_wfs([FireWork(AdditionTask(), {'input_array': [i, i]}) for i in range(5)])
+        self.lp._checkout_fw(FWorker(), MODULE_DIR, fw_id=3)
+        self.assertEqual(list(self.lp.iter_fw_ids(batch_size=2)), [1, 2, 3, 4, 5])
+        self.assertEqual(list(self.lp.iter_fw_ids({'state': 'READY'}, batch_size=2)), [1, 2, 4, 5])
+        self.assertEqual(list(self.lp.iter_fws({'fw_id': {'$gt': 1}}, {'spec.input_array': 1, '_id': 0}, batch_size=3)),
+                         [{'fw_id': i + 1, 'spec': {'input_array': [i, i]}} for i in range(1, 5)])
+        fws = list(self.lp.iter_fws({'state': 'RUNNING'}, batch_size=1))
+        self.assertEqual([(fw.fw_id, fw.state, len(fw.launches)) for fw in fws], [(3, 'RUNNING', 1)])
+
+    def test_wf_summary(self):
+        fws = [FireWork(AdditionTask(), {'input_array': [i, i]}, fw_id=-i - 1) for i in range(3)]
+        self.lp.add_wf(Workflow(fws, {-1: [-2, -3]}))
+        self.lp.add_wf(FireWork(AdditionTask(), {'input_array': [1, 1]}))
+        m_fw, launch_id = self.lp._checkout_fw(FWorker(), MODULE_DIR, fw_id=1)
+        self.lp._complete_launch(launch_id, FWAction('CONTINUE'))
+
+        counts = self.lp.get_state_counts()
+        self.assertEqual(dict([(state, counts[state]['count']) for state in counts]), {'COMPLETED': 1, 'READY': 3})
+        self.assertNotIn('fw_ids', counts['READY'])  # the ids of all FireWorks may not fit in one result
+        self.assertNotIn('fw_ids', self.lp.get_state_counts({'fw_id': {'$gt': 1}})['READY'])
+        self.assertEqual(self.lp.get_state_counts({'fw_id': {'$gt': 1}}, include_fw_ids=True)['READY']['fw_ids'],
+                         [2, 3, 4])
+        self.assertEqual(self.lp.get_state_counts({'fw_id': {'$gt': 3}}).keys(), ['READY'])
+
+        summary = self.lp.get_wf_summary(2)
+        self.assertEqual(summary['nodes'], 3)
+        self.assertEqual(summary['fireworks']['READY']['fw_ids'], [2, 3])
+        self.assertEqual(summary['launches']['COMPLETED']['count'], 1)
+        self.assertEqual(summary['launches']['COMPLETED']['total_runtime_secs'],
+                         self.lp.get_launch_by_id(launch_id).runtime_secs)
+        self.assertRaises(ValueError, self.lp.get_wf_summary, 100)
+
+    def test_wf_states(self):
+        self.lp.add_wfs([FireWork(AdditionTask(), {'input_array': [i, i]}) for i in range(3)])
+        self.assertEqual(self.lp.get_wf_ids({'state': 'READY'}), [1, 2, 3])
+        launch_ids = [self.lp._checkout_fw(FWorker(), MODULE_DIR, fw_id=fw_id)[1] for fw_id in [1, 2]]
+        self.lp._complete_launch(launch_ids[0], FWAction('CONTINUE'))
+        self.lp._complete_launch(launch_ids[1], FWAction('CONTINUE'), state='FIZZLED')
+        self.assertEqual(self.lp.get_wf_ids({'state': 'COMPLETED'}), [1])
+        self.assertEqual(self.lp.get_wf_ids({'state_counts.FIZZLED': 1}), [2])
+        self.assertEqual(self.lp.get_wf_summary(3)['state'], 'READY')
+
+    def test_refresh_links(self):
+        self.lp.add_wf(FireWork(AdditionTask(), {'input_array': [1, 1]}))
+        launch_id = self.lp._checkout_fw(FWorker(), MODULE_DIR)[1]
+        new_fw = FireWork(AdditionTask(), {'input_array': [2, 2]})
+        self.lp._complete_launch(launch_id, FWAction('CREATE', mod_spec={'create_fw': new_fw}))
+        links_dict = self.lp.links.find_one({'nodes': 1})
+        self.assertEqual(sorted(links_dict['nodes']), [1, 2])
+        self.assertEqual((links_dict['links'], links_dict['parent_links']), ({'1': [2], '2': []}, {'2': [1]}))
+        self.assertEqual(links_dict['state_counts'], {'COMPLETED': 1, 'READY': 1})
+        self.assertEqual(self.lp.get_wf_by_fw_id(2).links, {1: [2], 2: []})
+        # nothing changed, so the links document is not written
+        self.lp._refresh_wf(self.lp.get_wf_by_fw_id(1), 1)
+        self.assertEqual(self.lp.links.find_one({'nodes': 1})['updated_on'], links_dict['updated_on'])
+
+    def test_archive_completed(self):
+        self.lp.add_wfs([FireWork(AdditionTask(), {'input_array': [i, i]}) for i in range(3)])
+        launch_id = self.lp._checkout_fw(FWorker(), MODULE_DIR, fw_id=2)[1]
+        self.lp._complete_launch(launch_id, FWAction('CONTINUE'))
+        self.assertEqual(self.lp.archive_completed(60), [])
+        self.assertEqual(self.lp.archive_completed(-1, batch_size=1), [2])
+        self.assertEqual(self.lp.get_fw_ids(), [1, 3])
+        self.assertEqual(self.lp.get_wf_ids(), [1, 3])
+        # archived Workflows are still readable
+        self.assertEqual(self.lp.get_wf_by_fw_id(2).id_fw[2].state, 'COMPLETED')
+        self.assertEqual([l.launch_id for l in self.lp.get_fw_by_id(2).launches], [launch_id])
+        self.assertEqual(self.lp.get_launch_by_id(launch_id).state, 'COMPLETED')
+        self.assertRaises(ValueError, self.lp.get_wf_by_fw_id, 100)
+
+    def test_large_action(self):
+        self.lp.add_wf(FireWork(AdditionTask(), {'input_array': [1, 1]}))
+        launch_id = self.lp._checkout_fw(FWorker(), MODULE_DIR)[1]
+        new_fw = FireWork(AdditionTask(), {'input_array': [2, 2]})
+        action = FWAction('CREATE', {'stdout': 'x' * 1000, 'sum': 2}, {'create_fw': new_fw})
+        threshold = FWConfig().BLOB_THRESHOLD_BYTES
+        FWConfig().BLOB_THRESHOLD_BYTES = 100
+        try:
+            self.lp._complete_launch(launch_id, action)
+        finally:
+            FWConfig().BLOB_THRESHOLD_BYTES = threshold
+        launch_dict = self.lp.launches.find_one({'launch_id': launch_id})
+        self.assertEqual(launch_dict['action']['stored_data']['sum'], 2)
+        self.assertEqual(launch_dict['action']['stored_data']['stdout']['size'], 1002)
+        self.assertIn('_blob_id', launch_dict['action']['mod_spec']['create_fw'])
+        # the new FireWork was created from the blob, and the stored data is loaded when it is accessed
+        self.assertEqual(self.lp.get_wf_by_fw_id(1).links, {1: [2], 2: []})
+        self.assertEqual(self.lp.get_fw_by_id(2).spec['input_array'], [2, 2])
+        m_action = self.lp.get_launch_by_id(launch_id).action
+        self.assertEqual(m_action.stored_data['stdout'], 'x' * 1000)
+        self.assertEqual(m_action.to_dict()['stored_data']['stdout']['size'], 1002)
+
+    def test_check_indexes(self):
+        self.lp.add_wf(FireWork(AdditionTask(), {'input_array': [1, 1]}))
+        self.lp._checkout_fw(FWorker(query={'spec.input_array': 1}), MODULE_DIR)
+        self.assertEqual(self.lp.check_indexes(), [])
+        self.assertTrue(self.lp._is_collection_scan(self.lp.fireworks.find({'spec.input_array': 1}).explain()))
+        self.assertFalse(self.lp._is_collection_scan(self.lp.fireworks.find({'state': 'READY'}).explain()))
+        plan = {'queryPlanner': {'winningPlan': {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN'}},
+                                 'rejectedPlans': [{'stage': 'COLLSCAN'}]}}
+        self.assertFalse(self.lp._is_collection_scan(plan))
+        plan['queryPlanner']['winningPlan']['inputStage']['stage'] = 'COLLSCAN'
+        self.assertTrue(self.lp._is_collection_scan(plan))
+
+    def test_heartbeat(self):
+        self.lp.add_wfs([FireWork(AdditionTask(), {'input_array': [i, i]}) for i in range(2)])
+        launch_ids = [self.lp._checkout_fw(FWorker(), MODULE_DIR)[1] for _ in range(2)]
+        heartbeat = HeartbeatService()
+        ping_time_secs = FWConfig().PING_TIME_SECS
+        FWConfig().PING_TIME_SECS = 0.05
+        try:
+            for launch_id in launch_ids:
+                heartbeat.register(self.lp, launch_id)
+            time.sleep(0.5)
+            self.assertEqual(self.lp.detect_fizzled(0.25), [])
+            for launch_id in launch_ids:
+                heartbeat.unregister(self.lp, launch_id)
+            time.sleep(0.5)
+            self.assertEqual(self.lp.detect_fizzled(0.25), launch_ids)
+            self.assertIsNone(heartbeat._thread)
+        finally:
+            FWConfig().PING_TIME_SECS = ping_time_secs
+
     def tearDown(self):
         self.lp.reset(password=None, require_password=False)
         os.chdir(self.old_wd)
@@ -104,7 +462,24 @@ class MongoTests(unittest.TestCase):
     @classmethod
     def tearDownClass(cls):
         if cls.lp:
-            cls.lp.connection.drop_database(TESTDB_NAME)
+            cls.lp.backend.drop()
+
+
+class MemoryBackendTests(MongoTests):
+    """
+    The same tests, using the in-memory storage backend (no MongoDB server needed)
+    """
+
+    BACKEND = 'memory'
+
+
+class SQLiteBackendTests(MongoTests):
+    """
+    The same tests, using the SQLite storage backend
+    """
+
+    BACKEND = 'sqlite'
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
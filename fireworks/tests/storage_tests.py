@@ -0,0 +1,204 @@
+import datetime
+import multiprocessing
+import os
+import threading
+import time
+import unittest
+from fireworks.storage.memory_backend import MemoryBackend
+from fireworks.storage.mongo_backend import MongoClientRegistry
+from fireworks.storage.sqlite_backend import SQLiteBackend
+from fireworks.storage.storage_backend import DuplicateKeyError, ASCENDING, DESCENDING
+
+__author__ = 'Anubhav Jain'
+__copyright__ = 'Copyright 2013, The Materials Project'
+__version__ = '0.1'
+__maintainer__ = 'Anubhav Jain'
+__email__ = 'ajain@lbl.gov'
+__date__ = 'Oct 18, 2026'
+
+TESTDB_NAME = 'fireworks_storage_unittest'
+
+
+def _run_fws(db_name):
+    # check out FireWorks from a SQLite database until none are left (run in a separate process)
+    fireworks = SQLiteBackend(db_name).get_collection('fireworks')
+    fw_ids = []
+    while True:
+        doc = fireworks.find_and_modify({'state': 'READY'}, {'$set': {'state': 'RUNNING', 'pid': os.getpid()}})
+        if not doc:
+            return fw_ids
+        fw_ids.append(doc['fw_id'])
+
+
+class MemoryBackendTests(unittest.TestCase):
+
+    def get_backend(self):
+        return MemoryBackend(TESTDB_NAME)
+
+    def setUp(self):
+        self.backend = self.get_backend()
+        self.fireworks = self.backend.get_collection('fireworks')
+        self.fireworks.ensure_index('fw_id', unique=True)
+        self.fireworks.insert([{'fw_id': 1, 'state': 'READY', 'spec': {'_priority': 1}, 'launches': []},
+                               {'fw_id': 2, 'state': 'RUNNING', 'spec': {'_priority': 3}, 'launches': [1, 2]},
+                               {'fw_id': 3, 'state': 'READY', 'spec': {}, 'launches': [3]}])
+
+    def _fw_ids(self, query, **kwargs):
+        return [doc['fw_id'] for doc in self.fireworks.find(query, {'fw_id': 1}, **kwargs)]
+
+    def test_queries(self):
+        self.assertEqual(self._fw_ids({'state': 'READY'}), [1, 3])
+        self.assertEqual(self._fw_ids({'launches': 2}), [2])
+        self.assertEqual(self._fw_ids({'launches': {'$ne': []}}), [2, 3])
+        self.assertEqual(self._fw_ids({'fw_id': {'$in': [3, 1, 7]}}), [1, 3])
+        self.assertEqual(self._fw_ids({'spec._priority': {'$gte': 2}}), [2])
+        self.assertEqual(self._fw_ids({'spec._priority': {'$exists': False}}), [3])
+        self.assertEqual(self._fw_ids({'$or': [{'fw_id': 1}, {'state': 'RUNNING'}]}), [1, 2])
+        self.assertEqual(self._fw_ids({}, sort=[('spec._priority', DESCENDING)], limit=2), [2, 1])
+
+    def test_elem_match(self):
+        launches = self.backend.get_collection('launches')
+        now = datetime.datetime.utcnow()
+        launches.insert({'launch_id': 1, 'state_history': [{'state': 'RUNNING', 'updated_on': now}]})
+        query = {'state_history': {'$elemMatch': {'state': 'RUNNING', 'updated_on': {'$lte': now}}}}
+        self.assertEqual(launches.find(query).count(), 1)
+        query['state_history']['$elemMatch']['state'] = 'COMPLETED'
+        self.assertEqual(launches.find(query).count(), 0)
+
+    def test_updates(self):
+        self.fireworks.update({'state': 'READY'}, {'$set': {'state': 'RESERVED', 'spec.x': 1}}, multi=True)
+        self.assertEqual(self._fw_ids({'state': 'RESERVED', 'spec.x': 1}), [1, 3])
+        self.fireworks.update({'fw_id': 2}, {'$push': {'launches': 4}, '$unset': {'spec': 1}})
+        self.assertEqual(self.fireworks.find_one({'fw_id': 2}, {'_id': 0}),
+                         {'fw_id': 2, 'state': 'RUNNING', 'launches': [1, 2, 4]})
+        self.fireworks.update({'fw_id': 4}, {'$set': {'state': 'WAITING'}}, upsert=True)
+        self.assertEqual(self.fireworks.find_one({'state': 'WAITING'}, {'fw_id': 1, '_id': 0}), {'fw_id': 4})
+
+    def test_find_and_modify(self):
+        doc = self.fireworks.find_and_modify({'state': 'READY'}, {'$set': {'state': 'RUNNING'}},
+                                             sort=[('spec._priority', DESCENDING)])
+        self.assertEqual((doc['fw_id'], doc['state']), (1, 'READY'))
+        doc = self.fireworks.find_and_modify({'state': 'READY'}, {'$inc': {'spec._priority': 1}}, new=True)
+        self.assertEqual((doc['fw_id'], doc['spec']), (3, {'_priority': 1}))
+        self.backend.get_collection('fw_id_assigner').insert({'next_fw_id': 1})
+        self.assertEqual(self.backend.increment_counter('fw_id_assigner', 'next_fw_id', 5), 1)
+        self.assertEqual(self.backend.increment_counter('fw_id_assigner', 'next_fw_id'), 6)
+
+    def test_aggregate(self):
+        result = self.fireworks.aggregate([{'$match': {'fw_id': {'$gt': 1}}},
+                                           {'$group': {'_id': '$state', 'n': {'$sum': 1}, 'fw_ids': {'$push': '$fw_id'},
+                                                       'priority': {'$max': '$spec._priority'}}}])['result']
+        self.assertEqual(sorted(result), [{'_id': 'READY', 'n': 1, 'fw_ids': [3], 'priority': None},
+                                          {'_id': 'RUNNING', 'n': 1, 'fw_ids': [2], 'priority': 3}])
+        result = self.fireworks.aggregate([{'$group': {'_id': None, 'n': {'$sum': 1},
+                                                       'priority': {'$avg': '$spec._priority'}}}])['result']
+        self.assertEqual(result, [{'_id': None, 'n': 3, 'priority': 2.0}])
+
+    def test_unique_index(self):
+        self.assertRaises(DuplicateKeyError, self.fireworks.insert, {'fw_id': 1})
+        self.assertRaises(DuplicateKeyError, self.fireworks.update, {'fw_id': 2}, {'$set': {'fw_id': 3}})
+        self.assertEqual(self._fw_ids({'fw_id': 2}), [2])
+
+    def test_blobs(self):
+        blob_ids = [self.backend.put_blob('x' * 100), self.backend.put_blob('y')]
+        self.assertEqual(self.backend.get_blob(blob_ids[0]), 'x' * 100)
+        self.backend.remove_blobs(blob_ids[:1])
+        self.assertRaises(ValueError, self.backend.get_blob, blob_ids[0])
+        self.assertEqual(self.backend.get_blob(blob_ids[1]), 'y')
+        self.backend.remove_blobs()
+        self.assertRaises(ValueError, self.backend.get_blob, blob_ids[1])
+
+    def test_wait_for_document(self):
+        events = self.backend.get_capped_collection('events', 1024 * 1024)
+        self.assertIsNone(self.backend.wait_for_document(events, {'seq': 1}, 0.1))
+        # insert the event from another thread (with its own connection)
+        timer = threading.Timer(0.2, events.insert, [{'seq': 1, 'state': 'READY'}])
+        t_start = time.time()
+        timer.start()
+        self.assertEqual(self.backend.wait_for_document(events, {'seq': 1}, 30)['state'], 'READY')
+        self.assertLess(time.time() - t_start, 10)
+        timer.join()
+        events.drop()
+        self.assertEqual(events.find().count(), 0)
+
+    def test_capped_collection(self):
+        events = self.backend.get_capped_collection('events', 1000)
+        events.insert([{'seq': seq, 'state': 'READY'} for seq in range(50)])
+        for seq in range(50, 100):
+            events.insert({'seq': seq, 'state': 'READY'})
+        # only the last events are kept
+        seqs = [doc['seq'] for doc in events.find(sort=[('seq', ASCENDING)])]
+        self.assertTrue(10 < len(seqs) < 50)
+        self.assertEqual(seqs, range(100 - len(seqs), 100))
+        events.drop()
+
+    def tearDown(self):
+        self.backend.drop()
+
+
+class SQLiteBackendTests(MemoryBackendTests):
+
+    def get_backend(self):
+        return SQLiteBackend(TESTDB_NAME)
+
+    def test_dates(self):
+        now = datetime.datetime.utcnow()
+        self.fireworks.update({'fw_id': 1}, {'$set': {'lease_expires': now}})
+        self.assertEqual(self.fireworks.find_one({'lease_expires': {'$lte': now}})['lease_expires'], now)
+
+    def test_processes(self):
+        self.fireworks.insert([{'fw_id': fw_id, 'state': 'READY'} for fw_id in range(4, 104)])
+        pool = multiprocessing.Pool(4)
+        fw_ids = pool.map(_run_fws, [TESTDB_NAME] * 4)
+        pool.close()
+        # every FireWork was checked out exactly once
+        self.assertEqual(sorted(sum(fw_ids, [])), [1, 3] + range(4, 104))
+        self.assertEqual(self.fireworks.find({'state': 'READY'}).count(), 0)
+
+
+class _FakeClient(object):
+
+    def __init__(self, host, port, **kwargs):
+        self.address = (host, port)
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class _User(object):
+    pass
+
+
+class MongoClientRegistryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = MongoClientRegistry(_FakeClient)
+
+    def test_shared_clients(self):
+        user1, user2 = _User(), _User()
+        client = self.registry.get_client(user1, 'localhost', 27017)
+        self.assertIs(self.registry.get_client(user2, 'localhost', 27017), client)
+        self.assertIsNot(self.registry.get_client(user2, 'localhost', 27017, 'admin', 'secret'), client)
+        self.assertIsNot(self.registry.get_client(user2, 'otherhost', 27017), client)
+
+    def test_idle_clients(self):
+        user1, user2 = _User(), _User()
+        client = self.registry.get_client(user1, 'localhost', 27017)
+        self.registry.get_client(user2, 'localhost', 27017)
+        del user1
+        self.registry.close_idle_clients(0)
+        self.assertFalse(client.closed)  # still used by user2
+        del user2
+        self.registry.close_idle_clients(60)
+        self.assertFalse(client.closed)
+        self.registry.close_idle_clients(0)
+        self.assertTrue(client.closed)
+        self.assertIsNot(self.registry.get_client(_User(), 'localhost', 27017), client)
+
+    def test_fork(self):
+        user = _User()
+        client = self.registry.get_client(user, 'localhost', 27017)
+        self.registry._entries[('localhost', 27017, None, None)]['pid'] = -1  # as if created before a fork
+        self.assertIsNot(self.registry.get_client(user, 'localhost', 27017), client)
+        self.assertFalse(client.closed)  # the client of the parent process is left alone
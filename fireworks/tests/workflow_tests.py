@@ -0,0 +1,122 @@
+import unittest
+from fireworks.benchmarks.workflow_benchmarks import chain_wf, diamond_wf
+from fireworks.core.compact_workflow import CompactWorkflow, np
+from fireworks.core.firework import FireWork, Launch, FWAction
+from fireworks.core.workflow import Workflow
+from fw_tutorials.firetask.addition_task import AdditionTask
+
+__author__ = 'Anubhav Jain'
+__copyright__ = 'Copyright 2013, The Materials Project'
+__version__ = '0.1'
+__maintainer__ = 'Anubhav Jain'
+__email__ = 'ajain@lbl.gov'
+__date__ = 'Oct 18, 2026'
+
+
+class WorkflowTests(unittest.TestCase):
+
+    def test_refresh_long_chain(self):
+        wf = chain_wf(5000)  # deeper than the default recursion limit
+        self.assertEqual(wf.refresh(1), set(range(1, 5001)))
+        self.assertTrue(all([fw.state == 'COMPLETED' for fw in wf.id_fw.values()]))
+
+    def test_refresh_diamond(self):
+        wf = diamond_wf(3, 4)
+        wf.id_fw[2].launches = []
+        self.assertEqual(wf.refresh(1), set([1, 2, 3, 4, 5]))
+        self.assertEqual(wf.id_fw[2].state, 'READY')
+        self.assertEqual(wf.id_fw[6].state, 'WAITING')
+        self.assertEqual(wf.id_fw[14].state, 'WAITING')
+
+    def test_refresh_create(self):
+        new_fw = FireWork(AdditionTask(), {'input_array': [1, 2]}, fw_id=-2)
+        action = FWAction('CREATE', mod_spec={'create_fw': new_fw})
+        launch = Launch('COMPLETED', '.', host='localhost', ip='127.0.0.1', action=action, launch_id=1, fw_id=-1)
+        fw = FireWork(AdditionTask(), {'input_array': [1, 1]}, [launch], fw_id=-1)
+        wf = Workflow([fw])
+        self.assertEqual(wf.refresh(-1), set([-1, -2]))
+        self.assertEqual(wf.links, {-1: [-2], -2: []})
+        self.assertEqual(wf.id_fw[-2].state, 'READY')
+
+    def test_wf_state(self):
+        wf = diamond_wf(3, 4)
+        self.assertEqual(wf.state, 'WAITING')
+        wf.refresh(1)
+        self.assertEqual(wf.state, 'COMPLETED')
+        wf.id_fw[14].launches[0].state = 'FIZZLED'
+        wf.refresh(14)
+        self.assertEqual(wf.state_counts(), {'COMPLETED': 13, 'FIZZLED': 1})
+        self.assertEqual(wf.state, 'FIZZLED')
+        self.assertEqual(wf.to_db_dict()['state_counts'], {'COMPLETED': 13, 'FIZZLED': 1})
+
+    def test_links_cache(self):
+        links = Workflow.Links({1: [2, 3], 2: [4], 3: [4], 4: []})
+        links[4] = [5]
+        links[5] = []
+        links[1] = links[1] + [5]
+        del links[3]
+        links[6] = [1]
+        links[6] = []
+        expected = {}
+        for parent, children in sorted(links.items()):
+            for child in children:
+                expected.setdefault(child, []).append(parent)
+        self.assertEqual(dict([(k, sorted(v)) for k, v in links.parent_links.items()]), expected)
+        self.assertEqual(links.root_ids, set([1, 6]))
+        self.assertEqual(Workflow.Links(links).parent_links, expected)
+        self.assertEqual(Workflow.Links.from_dict(links.to_db_dict()['links']).root_ids, set([1, 6]))
+
+    def test_links_inplace(self):
+        links = Workflow.Links({1: [2], 2: [], 3: []})
+        links[1].append(3)
+        self.assertEqual(links.parent_links, {2: [1], 3: [1]})
+        self.assertEqual(links.root_ids, set([1]))
+        links[1].remove(2)
+        self.assertEqual(links.parent_links, {3: [1]})
+        self.assertEqual(links.root_ids, set([1, 2]))
+        links[2] += [3]
+        self.assertEqual(links.parent_links, {3: [1, 2]})
+        self.assertEqual(links.get_rank(3), 1)
+        old_children = links[1]
+        links[1] = []
+        old_children.append(2)  # no longer part of the Links
+        self.assertEqual(links.parent_links, {3: [2]})
+        self.assertEqual(links.root_ids, set([1, 2]))
+        self.assertEqual(type(links.to_dict()[2]), list)
+
+    def test_links_db_update(self):
+        links = Workflow.Links({1: [2], 2: []})
+        old_db_dict = links.to_db_dict()
+        self.assertEqual(links.db_update(old_db_dict), {})
+        links[2] = [3]
+        links[3] = []
+        self.assertEqual(links.db_update(old_db_dict),
+                         {'$set': {'links.2': [3], 'links.3': [], 'parent_links.3': [2]},
+                          '$addToSet': {'nodes': {'$each': [3]}}})
+
+    def test_compact_refresh(self):
+        wf = diamond_wf(3, 4)
+        wf.id_fw[3].launches[0].action = FWAction('DEFUSE')
+        compact_wf = CompactWorkflow.from_workflow(wf)
+        self.assertEqual(compact_wf.to_links(), wf.links)
+        self.assertEqual(compact_wf.root_fw_ids, [1])
+        self.assertEqual(compact_wf.get_parents(14), [10, 11, 12, 13])
+        self.assertEqual(compact_wf.refresh(1), wf.refresh(1))
+        self.assertEqual(compact_wf.state_counts(), {'COMPLETED': 5, 'DEFUSED': 4, 'WAITING': 5})
+        for fw_id, fw in wf.id_fw.items():
+            self.assertEqual(compact_wf.get_state(fw_id), fw.state)
+
+    @unittest.skipIf(np is None, 'NumPy is not installed')
+    def test_vectorized_refresh(self):
+        wf = diamond_wf(4, 5)
+        wf.id_fw[4].launches[0].action = FWAction('DEFUSE')
+        wf.id_fw[9].launches = []
+        compact_wf = CompactWorkflow.from_workflow(wf)
+        vectorized_wf = CompactWorkflow.from_workflow(wf)
+        self.assertEqual(vectorized_wf.vectorized_refresh([1]), compact_wf.refresh(1))
+        self.assertEqual(vectorized_wf.states, compact_wf.states)
+        self.assertEqual(vectorized_wf.vectorized_refresh(), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -34,6 +34,9 @@ if __name__ == '__main__':
     reset_parser.add_argument('password', help="Today's date, e.g. 2012-02-25. Required to prevent \
     against accidental initializations.")
 
+    maintain_parser = subparsers.add_parser('maintain', help='create the indexes of a FireWorks database and report '
+                                                             'the queries that scan whole collections')
+
     addwf_parser = subparsers.add_parser('add', help='insert a FWorkflow from file')
     addwf_parser.add_argument('wf_file', help="path to a FireWork or FWorkflow file")
 
@@ -41,9 +44,30 @@ if __name__ == '__main__':
     get_fw_parser.add_argument('fw_id', help="FireWork id", type=int)
     get_fw_parser.add_argument('-f', '--filename', help='output filename', default=None)
 
-    get_fw_ids_parser = subparsers.add_parser('get_fw_ids', help='get FireWork ids by query')
+    get_fw_ids_parser = subparsers.add_parser('get_fw_ids', help='get FireWork ids by query (one per line)')
     get_fw_ids_parser.add_argument('-q', '--query', help='query (as pymongo string, enclose in single-quotes)',
                                    default=None)
+    get_fw_ids_parser.add_argument('--batch_size', help='number of ids fetched at a time',
+                                   default=FWConfig().ITER_BATCH_SIZE, type=int)
+
+    get_wf_ids_parser = subparsers.add_parser('get_wf_ids', help='get Workflows by query on their state or links, '
+                                                                  'as the smallest FireWork id of each (one per line)')
+    get_wf_ids_parser.add_argument('-q', '--query', help="query (as pymongo string, enclose in single-quotes), e.g. "
+                                                         "\"{'state': 'COMPLETED'}\"", default=None)
+
+    get_fws_parser = subparsers.add_parser('get_fws', help='get FireWorks by query (as newline-delimited JSON)')
+    get_fws_parser.add_argument('-q', '--query', help='query (as pymongo string, enclose in single-quotes)',
+                                default=None)
+    get_fws_parser.add_argument('--fields', help='comma-separated fields of the FireWork documents to print, e.g. '
+                                                 'fw_id,state (default: the whole FireWorks)', default=None)
+    get_fws_parser.add_argument('--batch_size', help='number of FireWorks fetched at a time',
+                                default=FWConfig().ITER_BATCH_SIZE, type=int)
+
+    report_parser = subparsers.add_parser('report', help='summarize FireWorks by state (as JSON)')
+    report_parser.add_argument('-q', '--query', help='query (as pymongo string, enclose in single-quotes)',
+                               default=None)
+    report_parser.add_argument('-i', '--fw_id', help='summarize the Workflow containing this FireWork id instead',
+                               default=None, type=int)
 
     reservation_parser = subparsers.add_parser('detect_unreserved', help='Find launches with stale reservations')
     reservation_parser.add_argument('--time', help='expiration time (seconds)', default=FWConfig().RESERVATION_EXPIRATION_SECS, type=int)
@@ -53,6 +77,11 @@ if __name__ == '__main__':
     fizzled_parser.add_argument('--time', help='expiration time (seconds)', default=FWConfig().RUN_EXPIRATION_SECS, type=int)
     fizzled_parser.add_argument('--fix', help='mark fizzled', action='store_true')
 
+    archive_parser = subparsers.add_parser('archive', help='move finished Workflows to the archive collections '
+                                                           '(prints the smallest FireWork id of each, one per line)')
+    archive_parser.add_argument('--time', help='only archive Workflows that finished this long ago (seconds)',
+                                default=FWConfig().ARCHIVE_AFTER_SECS, type=int)
+
     version_parser = subparsers.add_parser('version', help='Print the version of FireWorks installed')
 
     parser.add_argument('-l', '--launchpad_file', help='path to LaunchPad file containing central DB connection info',
@@ -79,6 +108,10 @@ if __name__ == '__main__':
         if args.command == 'reset':
             lp.reset(args.password)
 
+        elif args.command == 'maintain':
+            for (collection, query) in lp.maintain():
+                print 'Query on {} scans the whole collection: {}'.format(collection, query)
+
         elif args.command == 'detect_fizzled':
             # TODO: report when fixed
             print lp.detect_fizzled(args.time, args.fix)
@@ -87,6 +120,10 @@ if __name__ == '__main__':
             # TODO: report when fixed
             print lp.detect_unreserved(args.time, args.fix)
 
+        elif args.command == 'archive':
+            for fw_id in lp.archive_completed(args.time):
+                print json.dumps(fw_id)
+
         elif args.command == 'add':
             # TODO: make this cleaner, e.g. make TAR option explicit
             # fwf = Workflow.from_FireWork(FireWork.from_file(args.wf_file))
@@ -116,4 +153,26 @@ if __name__ == '__main__':
         elif args.command == 'get_fw_ids':
             if args.query:
                 args.query = ast.literal_eval(args.query)
-            print lp.get_fw_ids(args.query)
+            # stream the results, one JSON value per line
+            for fw_id in lp.iter_fw_ids(args.query, args.batch_size):
+                print json.dumps(fw_id)
+
+        elif args.command == 'get_wf_ids':
+            if args.query:
+                args.query = ast.literal_eval(args.query)
+            for fw_id in lp.get_wf_ids(args.query):
+                print json.dumps(fw_id)
+
+        elif args.command == 'get_fws':
+            if args.query:
+                args.query = ast.literal_eval(args.query)
+            fields = dict([(field, 1) for field in args.fields.split(',')] + [('_id', 0)]) if args.fields else None
+            for fw in lp.iter_fws(args.query, fields, args.batch_size):
+                print json.dumps(fw if fields else fw.to_dict(), default=DATETIME_HANDLER)
+
+        elif args.command == 'report':
+            if args.fw_id is not None:
+                report = lp.get_wf_summary(args.fw_id)
+            else:
+                report = lp.get_state_counts(ast.literal_eval(args.query) if args.query else None)
+            print json.dumps(report, default=DATETIME_HANDLER, indent=4)
@@ -32,6 +32,8 @@ if __name__ == '__main__':
 
     rapid_parser.add_argument('--nlaunches', help='num_launches (int or "infinite")')
     rapid_parser.add_argument('--sleep', help='sleep time between loops (secs)', default=60, type=int)
+    rapid_parser.add_argument('--prefetch', help='number of FireWorks to lease and run back to back', default=0,
+                              type=int)
 
     parser.add_argument('-l', '--launchpad_file', help='path to launchpad file', default=None)
     parser.add_argument('-w', '--fworker_file', help='path to fworker file', default=None)
@@ -61,7 +63,8 @@ if __name__ == '__main__':
         fworker = FWorker()
 
     if args.command == 'rapidfire':
-        rapidfire(launchpad, fworker, None, args.logdir, args.loglvl, args.nlaunches, args.sleep)
+        rapidfire(launchpad, fworker, None, args.logdir, args.loglvl, args.nlaunches, args.sleep,
+                  prefetch=args.prefetch)
 
     else:
         launch_rocket(launchpad, fworker, args.logdir, args.loglvl, args.fw_id)
\ No newline at end of file